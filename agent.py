@@ -0,0 +1,420 @@
+"""Headless trading agent that decides and trades without the Streamlit app.
+
+Runs a decision on a schedule and whenever a watched price moves far
+enough on the live feed: it gathers market data, asks the model for a
+TRADE SIGNAL and executes it on its own paper portfolio. The signal's
+stop loss and target rest as OCO exit orders that fill on feed ticks.
+Its state is written to a JSON file that the app shows read-only:
+
+    LLM_API_KEY=... python agent.py --base-url https://api.deepseek.com/v1 --model deepseek-chat \\
+        --symbols BTC ETH --every 300 --move 0.5
+"""
+import argparse
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+import trading
+from consensus import load_models, run_consensus
+from llm import call_ai_api
+from market_data import fetch_symbol_data
+from orders import OrderBook
+from profiler import profiler
+from persistence import DEFAULT_DB_PATH, PortfolioStore
+from prompts import market_overview, recommendation_prompt
+from signals import parse_trade_signal
+from ws_feed import BINANCE_WS, MarketFeed
+
+DEFAULT_STATE_PATH = os.path.join('data', 'agent_state.json')
+
+# How often the state file is rewritten while idle, so the app can tell the agent is alive
+HEARTBEAT_SECONDS = 5.0
+
+
+class TradingAgent:
+    """Event-driven decision loop over one paper portfolio
+
+    Decisions run as asyncio tasks; blocking data and LLM calls run in
+    worker threads. At most `llm_concurrency` model calls are in flight,
+    triggers beyond twice that many pending decisions are dropped, and a
+    decision still unfinished after `latency_budget` seconds is abandoned
+    without trading on stale data.
+    """
+
+    def __init__(self, api_key, base_url, model_name, symbols, max_leverage=5, every=300.0,
+                 move_pct=0.0, latency_budget=30.0, llm_concurrency=2, feed=None,
+                 state_path=DEFAULT_STATE_PATH, portfolio=None, dry_run=False, json_mode=False,
+                 ensemble=None, quorum=None, store=None, account='agent', poll=1.0, trail_pct=None,
+                 metrics_path=None):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.model_name = model_name
+        self.symbols = list(symbols)
+        self.max_leverage = max_leverage
+        self.every = every
+        self.move_pct = move_pct
+        self.latency_budget = latency_budget
+        self.llm_concurrency = llm_concurrency
+        self.feed = feed
+        self.state_path = state_path
+        self.portfolio = portfolio or trading.new_portfolio()
+        self.dry_run = dry_run
+        self.json_mode = json_mode
+        # Extra models that vote with the main one; empty means a single model call
+        self.ensemble = ensemble or []
+        self.quorum = quorum
+        # Durable account the portfolio is recorded to after every fill
+        self.store = store
+        self.account = account
+        self.poll = poll
+        # Exit orders on the agent's positions, resumed from the store; trail_pct adds a trailing
+        # stop to each new position
+        self.orders = OrderBook() if store is None else store.load_orders(account, self.portfolio['positions'])
+        self.trail_pct = trail_pct
+        # Profiler metrics are exported here with every state save
+        self.metrics_path = metrics_path
+
+        self.lock = threading.Lock()
+        self.llm_slots = asyncio.Semaphore(llm_concurrency)
+        self.tasks = set()
+        self.reference_prices = {}
+        self.recent = deque(maxlen=50)
+        self.running = False
+        self.decisions = 0
+        self.skipped = 0
+        self.timeouts = 0
+        self.saved_at = 0.0
+
+    async def run(self, once=False):
+        """Trigger decisions until cancelled, or make a single one with `once`"""
+        self.running = True
+        if self.feed is not None:
+            self.feed.subscribe(self.symbols)
+            self.feed.add_listener(self.on_tick)
+        try:
+            if once:
+                await self.decide('manual')
+                return
+
+            next_run = time.monotonic()
+            while True:
+                reason = None
+                if time.monotonic() >= next_run:
+                    reason = 'schedule'
+                    next_run = time.monotonic() + self.every
+                else:
+                    moved = self._moved_symbol()
+                    if moved:
+                        reason = f"{moved} moved {self.move_pct}%"
+
+                self.sync_store()
+                if self.feed is not None:
+                    self.check_liquidations(self._feed_price)
+
+                if reason and len(self.tasks) < 2 * self.llm_concurrency:
+                    task = asyncio.create_task(self.decide(reason))
+                    self.tasks.add(task)
+                    task.add_done_callback(self.tasks.discard)
+                elif reason:
+                    self.skipped += 1
+
+                if time.monotonic() - self.saved_at >= HEARTBEAT_SECONDS:
+                    self.save_state()
+                await asyncio.sleep(self.poll)
+        finally:
+            if self.feed is not None:
+                self.feed.remove_listener(self.on_tick)
+            for task in self.tasks:
+                task.cancel()
+            self.running = False
+            self.save_state()
+
+    async def decide(self, reason):
+        """Run one decision within the latency budget and record what happened"""
+        record = {'time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'), 'reason': reason}
+        started = time.perf_counter()
+        # Moves are measured from the prices this decision saw
+        self.reference_prices.update(self._feed_prices())
+        timed_out = False
+        try:
+            await asyncio.wait_for(self._decide(record), self.latency_budget)
+        except asyncio.TimeoutError:
+            timed_out = True
+            self.timeouts += 1
+            record['outcome'] = f"Abandoned after the {self.latency_budget:g}s latency budget"
+        record['seconds'] = round(time.perf_counter() - started, 3)
+        profiler.record('agent.decide', time.perf_counter() - started, error=timed_out)
+        self.decisions += 1
+        with self.lock:
+            self.recent.append(record)
+        self.save_state()
+        return record
+
+    async def _decide(self, record):
+        deadline = min(5.0, self.latency_budget / 3)
+        prices, frames = await asyncio.to_thread(fetch_symbol_data, self.symbols, '1h', 100, deadline)
+        context, market_state, _ = market_overview(self.symbols, prices, frames, self._feed_price)
+        if not market_state:
+            record['outcome'] = "No market data"
+            return
+        self.check_liquidations(lambda symbol: market_state.get(symbol, {}).get('price'))
+
+        with self.lock:
+            prompt = recommendation_prompt(context, self.portfolio, self.max_leverage, self.json_mode)
+        llm_started = time.perf_counter()
+        if self.ensemble:
+            response = await self._call_llm(self._consensus, prompt, record)
+        else:
+            response = await self._call_llm(call_ai_api, prompt, self.api_key, self.base_url,
+                                            self.model_name, self.json_mode)
+        record['llm_seconds'] = round(time.perf_counter() - llm_started, 3)
+
+        if response.startswith("Error:") or "API Error:" in response:
+            record['outcome'] = response[:200]
+            return
+        signal = parse_trade_signal(response)
+        record['signal'] = signal.to_dict() if signal else None
+        if signal is None:
+            record['outcome'] = "No trade signal in response"
+            return
+        record['outcome'] = self.execute(signal, market_state)
+
+    async def _call_llm(self, function, *args):
+        """Run a model call in a worker thread once one of the `llm_concurrency` slots is free
+
+        A decision abandoned at its latency budget cannot stop the call's
+        thread, so the slot is only given back when the call returns.
+        """
+        await self.llm_slots.acquire()
+        call = asyncio.ensure_future(asyncio.to_thread(function, *args))
+        call.add_done_callback(self._release_llm_slot)
+        return await asyncio.shield(call)
+
+    def _release_llm_slot(self, call):
+        self.llm_slots.release()
+        if not call.cancelled():
+            # Retrieved so an abandoned call's error is not reported as never retrieved
+            call.exception()
+
+    def _consensus(self, prompt, record):
+        members = [{'name': self.model_name, 'base_url': self.base_url, 'model': self.model_name,
+                    'api_key': self.api_key}] + self.ensemble
+        result = run_consensus(prompt, members, self.quorum, json_mode=self.json_mode,
+                               timeout=self.latency_budget)
+        record['votes'] = result['tally']
+        return result['signal'].to_text() if result['signal'] else "TRADE SIGNAL: HOLD"
+
+    def execute(self, signal, market_state):
+        """Validate and trade a signal at the freshest price available; returns a status message"""
+        price = self._feed_price(signal.symbol) or market_state.get(signal.symbol, {}).get('price')
+        if not price:
+            return f"No price for {signal.symbol}"
+
+        with self.lock:
+            errors = signal.validate(self.max_leverage, self.portfolio['cash'], self.portfolio['positions'],
+                                     self.symbols)
+            if errors:
+                return "Rejected: " + "; ".join(errors)
+            amount, leverage = signal.order(price, self.portfolio['positions'])
+            if self.dry_run:
+                return f"Dry run: would {signal.action} {amount:.6f} {signal.symbol} at ${price:.2f}"
+            closes = signal.closes(self.portfolio['positions'])
+            success, message = trading.execute_trade(self.portfolio, signal.action, signal.symbol, amount,
+                                                     price, leverage)
+            if not success:
+                return message
+            if self.store is not None:
+                self.store.record(self.account, self.portfolio)
+            if closes:
+                self.orders.reconcile(self.portfolio['positions'], signal.symbol)
+            else:
+                _, placed = self.orders.bracket(self.portfolio['positions'], signal.symbol, price,
+                                                signal.stop_loss, signal.target, self.trail_pct)
+                message = "; ".join([message] + placed)
+            self._save_orders()
+        return message
+
+    def on_tick(self, symbol, price):
+        """Fill exit orders the feed's latest price triggers; called on the feed thread"""
+        with self.lock:
+            finished = self.orders.on_price(self.portfolio, symbol, price) if self.orders else []
+            if any(order.status == 'filled' for order in finished) and self.store is not None:
+                self.store.record(self.account, self.portfolio)
+            self._save_orders()
+        for order in finished:
+            self._note('order', f"{order.describe()}: {order.status} · {order.message}")
+
+    def _note(self, reason, outcome):
+        """Add an event to the recent list; called without the lock held, from any thread"""
+        with self.lock:
+            self.recent.append({'time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'), 'reason': reason,
+                                'outcome': outcome, 'seconds': 0.0})
+
+    def check_liquidations(self, get_price):
+        """Mark positions to `get_price` and close any that reached their liquidation price"""
+        with self.lock:
+            if not self.portfolio['positions']:
+                return
+            messages = trading.liquidate(self.portfolio, get_price)
+            if messages:
+                self.orders.reconcile(self.portfolio['positions'])
+                if self.store is not None:
+                    self.store.record(self.account, self.portfolio)
+                self._save_orders()
+        for message in messages:
+            self._note('margin', message)
+
+    def sync_store(self):
+        """Rebase the portfolio on its stored account if another writer appended to it"""
+        if self.store is None:
+            return
+        with self.lock:
+            if not self.store.is_stale(self.account, self.portfolio):
+                return
+            self.portfolio, dropped = self.store.rebase(self.account, self.portfolio)
+            self.orders.reconcile(self.portfolio['positions'])
+            self._save_orders()
+        self._note('store', f"Account changed by another writer; reloaded, {dropped} fill(s) dropped")
+
+    def _save_orders(self):
+        """Store the order book if it changed; called with the lock held"""
+        if self.store is not None:
+            self.store.save_orders(self.account, self.orders)
+
+    def _feed_price(self, symbol):
+        return self.feed.price(symbol) if self.feed is not None else None
+
+    def _feed_prices(self):
+        prices = {symbol: self._feed_price(symbol) for symbol in self.symbols}
+        return {symbol: price for symbol, price in prices.items() if price}
+
+    def _moved_symbol(self):
+        """First symbol whose feed price moved `move_pct` percent since the last decision"""
+        if not self.move_pct:
+            return None
+        for symbol, price in self._feed_prices().items():
+            reference = self.reference_prices.get(symbol)
+            if reference and abs(price / reference - 1) * 100 >= self.move_pct:
+                return symbol
+        return None
+
+    def state(self):
+        with self.lock:
+            ledger = self.portfolio['trade_history']
+            fields = {key: value for key, value in self.portfolio.items() if key != 'trade_history'}
+            portfolio = json.loads(json.dumps(fields, default=str))
+            trade_stats = ledger.stats()
+            recent_trades = json.loads(ledger.tail(20).to_json(orient='records', date_format='iso'))
+            orders = [{**order.to_dict(), 'stop_price': self.orders.stop_price(order)}
+                      for order in self.orders.orders()]
+            recent = list(self.recent)
+        return {
+            'updated': time.time(),
+            'pid': os.getpid(),
+            'running': self.running,
+            'model': self.model_name,
+            'symbols': self.symbols,
+            'every': self.every,
+            'move_pct': self.move_pct,
+            'latency_budget': self.latency_budget,
+            'dry_run': self.dry_run,
+            'decisions': self.decisions,
+            'skipped': self.skipped,
+            'timeouts': self.timeouts,
+            'in_flight': len(self.tasks),
+            'feed': self.feed.stats() if self.feed is not None else None,
+            'portfolio': portfolio,
+            'trade_stats': trade_stats,
+            'recent_trades': recent_trades,
+            'orders': orders,
+            'recent': recent,
+        }
+
+    def save_state(self):
+        if self.metrics_path:
+            profiler.export(self.metrics_path)
+        if not self.state_path:
+            return
+        self.saved_at = time.monotonic()
+        state = self.state()
+        directory = os.path.dirname(self.state_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Write then rename so the app never reads a half-written file
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.state_path)
+
+
+def load_state(path=DEFAULT_STATE_PATH):
+    """The agent's last saved state, or None if it has never run
+
+    The trade history is summarized in `trade_stats` and `recent_trades`;
+    the full history is in the agent's account in the portfolio store.
+    """
+    try:
+        with open(path) as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+    state['portfolio']['start_time'] = datetime.fromisoformat(state['portfolio']['start_time'])
+    return state
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--api-key', default=os.environ.get('LLM_API_KEY'))
+    parser.add_argument('--base-url', required=True)
+    parser.add_argument('--model', required=True)
+    parser.add_argument('--symbols', nargs='+', default=['BTC', 'ETH'])
+    parser.add_argument('--max-leverage', type=int, default=5)
+    parser.add_argument('--every', type=float, default=300, help="Seconds between scheduled decisions")
+    parser.add_argument('--move', type=float, default=0.0,
+                        help="Also decide when a price moves this many percent (needs the live feed)")
+    parser.add_argument('--latency-budget', type=float, default=30, help="Seconds allowed per decision")
+    parser.add_argument('--llm-concurrency', type=int, default=2)
+    parser.add_argument('--state', default=os.environ.get('AGENT_STATE_PATH', DEFAULT_STATE_PATH))
+    parser.add_argument('--ws-url', default=os.environ.get('BINANCE_WS_URL', BINANCE_WS))
+    parser.add_argument('--no-feed', action='store_true', help="Use REST prices only")
+    parser.add_argument('--db', default=os.environ.get('PORTFOLIO_DB_PATH', DEFAULT_DB_PATH))
+    parser.add_argument('--account', default='agent', help="Portfolio store account to trade")
+    parser.add_argument('--fresh', action='store_true', help="Reset the account instead of resuming it")
+    parser.add_argument('--dry-run', action='store_true', help="Log signals without trading")
+    parser.add_argument('--json-mode', action='store_true', help="Ask the model for a JSON signal")
+    parser.add_argument('--models', help="JSON file of extra models that vote with --model (see consensus.py)")
+    parser.add_argument('--quorum', type=int, help="Models that must answer before voting (default: majority)")
+    parser.add_argument('--trailing-stop', type=float,
+                        help="Percent trailing stop to place on every position the agent opens")
+    parser.add_argument('--metrics', default=os.environ.get('METRICS_PATH'),
+                        help="File to export latency metrics to (Prometheus text, or JSON lines for .jsonl)")
+    parser.add_argument('--once', action='store_true', help="Make one decision and exit")
+    args = parser.parse_args()
+    if not args.api_key:
+        parser.error("an API key is required (--api-key or LLM_API_KEY)")
+
+    store = PortfolioStore(args.db)
+    portfolio = store.reset(args.account) if args.fresh else store.load(args.account)
+    feed = None if args.no_feed else MarketFeed(url=args.ws_url).start()
+    agent = TradingAgent(args.api_key, args.base_url, args.model, args.symbols, args.max_leverage,
+                         args.every, args.move, args.latency_budget, args.llm_concurrency, feed,
+                         args.state, portfolio, args.dry_run, args.json_mode,
+                         load_models(args.models) if args.models else None, args.quorum, store, args.account,
+                         trail_pct=args.trailing_stop, metrics_path=args.metrics)
+    try:
+        asyncio.run(agent.run(once=args.once))
+    except KeyboardInterrupt:
+        pass
+    # Snapshot on the way out so the next start replays nothing
+    store.snapshot(args.account, agent.portfolio)
+    store.close()
+    for record in agent.recent:
+        print(f"{record['time']} [{record['reason']}] {record.get('outcome')} ({record['seconds']:.2f}s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,11 +1,28 @@
 import streamlit as st
-import requests
 import pandas as pd
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
-from datetime import datetime, timedelta
-import json
+import numpy as np
+from datetime import datetime
+import os
 import time
+import uuid
+from agent import DEFAULT_STATE_PATH, load_state
+from charting import CHART_WIDTHS, DEFAULT_WIDTH, LOOKBACKS, CandleChart, chart_interval, span_label
+from consensus import DEFAULT_MODELS_PATH, ensemble_stats, load_models, run_consensus
+from data_hub import DataHub
+from indicators import compute, format_for_prompt
+from llm import StreamStats, call_ai_api, stream_ai_api
+from llm_cache import ResponseCache, make_cache_key
+from market_data import PriceSnapshot, fetch_symbol_data
+from orders import OrderBook
+from persistence import DEFAULT_DB_PATH, PortfolioStore
+from profiler import profiler
+from prompts import market_overview, recommendation_prompt
+from signals import TradeSignal, parse_trade_signal
+import trading
+from ws_feed import BINANCE_WS, MarketFeed
+
+# Each stretch of the rerun is recorded as a 'render.*' profiler section
+rerun_timer = profiler.stopwatch('render')
 
 # Page config
 st.set_page_config(
@@ -55,93 +72,134 @@ st.markdown("""
     </style>
 """, unsafe_allow_html=True)
 
-# Initialize session state
-if 'portfolio' not in st.session_state:
-    st.session_state.portfolio = {
-        'cash': 10000.0,
-        'positions': {},
-        'trade_history': [],
-        'pnl_history': [],
-        'start_value': 10000.0,
-        'start_time': datetime.now()
-    }
+@st.cache_resource
+def get_response_cache():
+    """Process-wide LLM response cache shared by every session"""
+    return ResponseCache(path=os.environ.get('LLM_CACHE_PATH'))
 
-# AI API Call Function
-def call_ai_api(prompt, api_key, base_url, model_name):
-    """Call AI API with OpenAI-compatible format"""
-    try:
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {api_key}"
-        }
-        
-        data = {
-            "model": model_name,
-            "messages": [
-                {"role": "system", "content": "You are an elite crypto trading AI based on DeepSeek's winning Alpha Arena strategy."},
-                {"role": "user", "content": prompt}
-            ],
-            "temperature": 0.7,
-            "max_tokens": 2000
-        }
-        
-        response = requests.post(
-            f"{base_url}/chat/completions",
-            headers=headers,
-            json=data,
-            timeout=30
-        )
-        
-        if response.status_code == 200:
-            result = response.json()
-            return result['choices'][0]['message']['content']
-        else:
-            return f"Error: {response.status_code} - {response.text}"
-            
-    except Exception as e:
-        return f"API Error: {str(e)}"
+response_cache = get_response_cache()
+
+@st.cache_resource
+def get_portfolio_store():
+    """Process-wide durable store for paper-trading accounts"""
+    return PortfolioStore(os.environ.get('PORTFOLIO_DB_PATH', DEFAULT_DB_PATH))
+
+portfolio_store = get_portfolio_store()
+
+@st.cache_resource
+def get_market_feed():
+    """Process-wide WebSocket price feed running on a background thread"""
+    return MarketFeed(url=os.environ.get('BINANCE_WS_URL', BINANCE_WS)).start()
+
+@st.cache_resource
+def get_data_hub():
+    """Process-wide market data shared by every session, one upstream fetch per symbol"""
+    return DataHub()
+
+data_hub = get_data_hub()
+if 'session_id' not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+if 'charts' not in st.session_state:
+    st.session_state.charts = {}
+
+# Charts kept per session, so switching back to one only fetches new candles
+MAX_CHARTS = 4
 
 # Helper functions
+def current_snapshot():
+    """This run's batched price snapshot, retaken once older than the hub's price TTL
+
+    Fragment reruns see the globals of the last full run, so without this
+    they would keep showing its prices.
+    """
+    global price_snapshot
+    if time.monotonic() - price_snapshot.taken > data_hub.price_ttl:
+        price_snapshot = PriceSnapshot(snapshot_symbols, feed=market_feed, fetch=data_hub.prices)
+    return price_snapshot
+
 def get_crypto_price(symbol):
-    """Get real-time crypto price from Binance API"""
-    try:
-        url = f"https://api.binance.com/api/v3/ticker/price?symbol={symbol}USDT"
-        response = requests.get(url, timeout=5)
-        data = response.json()
-        return float(data['price'])
-    except:
-        return None
+    """Get crypto price from the current batched price snapshot"""
+    return current_snapshot().get(symbol)
 
 def get_market_data(symbol, interval='1h', limit=100):
-    """Get historical market data"""
-    try:
-        url = f"https://api.binance.com/api/v3/klines?symbol={symbol}USDT&interval={interval}&limit={limit}"
-        response = requests.get(url, timeout=5)
-        data = response.json()
+    """Get historical market data from the shared hub"""
+    return data_hub.klines(symbol, interval, limit)
+
+def get_chart(symbol, lookback_ms, width, style):
+    """This session's chart for the settings, reused across reruns"""
+    interval = chart_interval(symbol, lookback_ms, data_hub.cache.store)
+    key = (symbol, interval, lookback_ms, width, style)
+    charts = st.session_state.charts
+    chart = charts.pop(key, None) or CandleChart(symbol, interval, lookback_ms, width, style)
+    charts[key] = chart
+    for stale in list(charts)[:-MAX_CHARTS]:
+        del charts[stale]
+    return chart
+
+def show_ai_response(prompt, kind, state, json_mode=False):
+    """Render the AI response, from cache or streamed into the page when enabled
+
+    Returns (response, cached); `cached` is True if the answer was served from the response cache.
+    """
+    cache_key = None
+    if use_response_cache:
+        cache_key = make_cache_key(model_name, f"{kind}-json" if json_mode else kind, state,
+                                   cache_tolerance / 100)
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            st.markdown(cached)
+            st.caption("♻️ Served from cache: market unchanged within tolerance")
+            return cached, True
+    
+    started = time.perf_counter()
+    tokens = None
+    if not stream_responses:
+        response = call_ai_api(prompt, api_key, base_url, model_name, json_mode)
+        st.markdown(response)
+    else:
+        placeholder = st.empty()
+        stats = StreamStats()
+        response = ""
+        for token in stream_ai_api(prompt, api_key, base_url, model_name, stats, json_mode):
+            response += token
+            placeholder.markdown(response + "▌")
+        placeholder.markdown(response)
+        tokens = stats.tokens
         
-        df = pd.DataFrame(data, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume', 
-                                         'close_time', 'quote_volume', 'trades', 'taker_buy_base', 
-                                         'taker_buy_quote', 'ignore'])
-        df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
-        df['close'] = df['close'].astype(float)
-        df['volume'] = df['volume'].astype(float)
-        df['high'] = df['high'].astype(float)
-        df['low'] = df['low'].astype(float)
-        return df
-    except:
-        return None
-
-def calculate_portfolio_value():
-    """Calculate current portfolio value"""
-    total = st.session_state.portfolio['cash']
-    
-    for symbol, position in st.session_state.portfolio['positions'].items():
-        current_price = get_crypto_price(symbol)
-        if current_price:
-            position_value = position['amount'] * current_price
-            total += position_value
+        if stats.time_to_first_token is not None:
+            speed = f" · {stats.tokens_per_second:.1f} tokens/s" if stats.tokens_per_second else ""
+            st.caption(f"⚡ First token in {stats.time_to_first_token:.2f}s{speed}")
     
-    return total
+    if cache_key is not None and not response.startswith("Error:") and "API Error:" not in response:
+        response_cache.put(cache_key, response, time.perf_counter() - started, tokens)
+    return response, False
+
+def show_consensus(prompt, json_mode=False):
+    """Ask every ensemble model at once and render the combined signal and per-model results"""
+    result = run_consensus(prompt, consensus_members, consensus_quorum, consensus_method, json_mode)
+    response = result['signal'].to_text() if result['signal'] else "TRADE SIGNAL: HOLD"
+    st.markdown(response.replace("\n", "  \n"))
+    
+    answered = sum(call['status'] == 'ok' for call in result['calls'])
+    votes = ", ".join(f"{choice}: {weight:g}" for choice, weight in result['tally'].items())
+    quorum_note = "" if result['quorum_reached'] else " · quorum not reached"
+    st.caption(f"🗳️ {answered}/{len(result['calls'])} models answered in {result['latency']:.2f}s "
+               f"({votes}){quorum_note}")
+    st.dataframe(pd.DataFrame(result['calls']), hide_index=True)
+    return response
+
+def portfolio_marks():
+    """Mark-to-market of the session portfolio, computed once per price snapshot and fill"""
+    global marks_memo
+    snapshot = current_snapshot()
+    portfolio = st.session_state.portfolio
+    fills = len(portfolio['trade_history'])
+    if marks_memo is None or marks_memo[0] is not snapshot or marks_memo[1] is not portfolio or \
+            marks_memo[2] != fills:
+        marks_memo = (snapshot, portfolio, fills, trading.mark_to_market(portfolio, snapshot.get))
+    return marks_memo[3]
+
+marks_memo = None
 
 def execute_trade(action, symbol, amount, leverage=1.0):
     """Execute a trade (paper trading)"""
@@ -149,77 +207,73 @@ def execute_trade(action, symbol, amount, leverage=1.0):
     if not current_price:
         return False, "Failed to get price"
     
+    success, message = trading.execute_trade(st.session_state.portfolio, action, symbol, amount,
+                                             current_price, leverage)
+    if success and not portfolio_store.record(st.session_state.account, st.session_state.portfolio, wait=True):
+        # Another tab or agent traded on the account first: replay this session's fills on its history
+        st.session_state.portfolio, dropped = portfolio_store.rebase(st.session_state.account,
+                                                                     st.session_state.portfolio)
+        if dropped:
+            success, message = False, "Another session traded on this account first; this trade no longer fits"
+    if success:
+        # Exit orders go with the position they protect
+        st.session_state.order_book.reconcile(st.session_state.portfolio['positions'], symbol)
+    return success, message
+
+def watch_positions():
+    """Close positions past their liquidation price and fill the exit orders current prices trigger
+
+    Changes are recorded to the account and the order book is stored.
+    Notices are kept for the sidebar, and the whole app reruns after a
+    fill or liquidation so everything shows the new portfolio.
+    """
+    portfolio = st.session_state.portfolio
+    order_book = st.session_state.order_book
+    notices = [('error', message) for message in trading.liquidate(portfolio, get_crypto_price)]
+    order_book.reconcile(portfolio['positions'])
+    for symbol in order_book.symbols():
+        tick_price = get_crypto_price(symbol)
+        if tick_price:
+            for order in order_book.on_price(portfolio, symbol, tick_price):
+                level = 'success' if order.status == 'filled' else 'warning'
+                notices.append((level, f"🛡️ {order.describe()} {order.status}: {order.message}"))
+    traded = any(level != 'warning' for level, _ in notices)
+    if traded:
+        portfolio_store.record(st.session_state.account, portfolio)
+    portfolio_store.save_orders(st.session_state.account, order_book)
+    if notices:
+        st.session_state.setdefault('position_notices', []).extend(notices)
+    if traded:
+        st.rerun()
+
+def route_signal(entry):
+    """Validate the stored AI signal and execute it at the current price"""
+    signal = TradeSignal.from_dict(entry['signal'])
     portfolio = st.session_state.portfolio
+    errors = signal.validate(max_leverage, portfolio['cash'], portfolio['positions'], trading_symbols)
+    if errors:
+        return False, "; ".join(errors)
     
-    if action == "BUY":
-        cost = (amount * current_price) / leverage
-        if portfolio['cash'] < cost:
-            return False, "Insufficient funds"
-        
-        portfolio['cash'] -= cost
-        
-        if symbol in portfolio['positions']:
-            old_pos = portfolio['positions'][symbol]
-            new_amount = old_pos['amount'] + amount
-            new_avg_price = ((old_pos['amount'] * old_pos['entry_price']) + (amount * current_price)) / new_amount
-            portfolio['positions'][symbol] = {
-                'amount': new_amount,
-                'entry_price': new_avg_price,
-                'leverage': leverage
-            }
-        else:
-            portfolio['positions'][symbol] = {
-                'amount': amount,
-                'entry_price': current_price,
-                'leverage': leverage
-            }
-        
-        trade_log = {
-            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-            'action': 'BUY',
-            'symbol': symbol,
-            'amount': amount,
-            'price': current_price,
-            'leverage': leverage,
-            'cost': cost
-        }
-        portfolio['trade_history'].append(trade_log)
-        return True, f"Bought {amount:.6f} {symbol} at ${current_price:.2f} (Leverage: {leverage}x)"
-    
-    elif action == "SELL":
-        if symbol not in portfolio['positions']:
-            return False, "No position to sell"
-        
-        position = portfolio['positions'][symbol]
-        if position['amount'] < amount:
-            return False, "Insufficient position size"
-        
-        proceeds = amount * current_price
-        profit = (current_price - position['entry_price']) * amount * position['leverage']
-        
-        portfolio['cash'] += proceeds
-        position['amount'] -= amount
-        
-        if position['amount'] <= 0:
-            del portfolio['positions'][symbol]
-        
-        trade_log = {
-            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-            'action': 'SELL',
-            'symbol': symbol,
-            'amount': amount,
-            'price': current_price,
-            'profit': profit,
-            'proceeds': proceeds
-        }
-        portfolio['trade_history'].append(trade_log)
-        return True, f"Sold {amount:.6f} {symbol} at ${current_price:.2f} (Profit: ${profit:.2f})"
-    
-    return False, "Invalid action"
+    current_price = get_crypto_price(signal.symbol)
+    if not current_price:
+        return False, "Failed to get price"
+    
+    amount, leverage = signal.order(current_price, portfolio['positions'])
+    closes = signal.closes(portfolio['positions'])
+    success, message = execute_trade(signal.action, signal.symbol, amount, leverage)
+    if success:
+        if not closes:
+            # The signal's stop loss and target protect the new position, one cancelling the other
+            _, placed = st.session_state.order_book.bracket(portfolio['positions'], signal.symbol, current_price,
+                                                            signal.stop_loss, signal.target)
+            message = "; ".join([message] + placed)
+        entry['executed'] = message
+    return success, message
 
 # Header
 st.markdown('<h1 class="main-header">🚀 AI Crypto Trading Agent</h1>', unsafe_allow_html=True)
 st.markdown("### Alpha Arena Style - DeepSeek Strategy | Paper Trading with Real-Time Prices")
+rerun_timer.lap('setup')
 
 # Sidebar
 with st.sidebar:
@@ -248,9 +302,56 @@ with st.sidebar:
         base_url = st.text_input("Base URL", placeholder="https://api.example.com/v1")
         model_name = st.text_input("Model Name", placeholder="model-name")
     
+    # Extra OpenAI-compatible endpoints that join the selected provider in consensus mode
+    ensemble_models = load_models(os.environ.get('ENSEMBLE_MODELS_PATH', DEFAULT_MODELS_PATH))
+    consensus_members = [{'name': model_name, 'base_url': base_url, 'model': model_name, 'api_key': api_key}]
+    consensus_members += [model for model in ensemble_models if model['name'] != model_name]
+    use_consensus = st.checkbox("Multi-model consensus", value=False, disabled=not ensemble_models,
+                                help="Ask the selected provider and the models in models.json at once "
+                                     "and combine their signals")
+    consensus_quorum, consensus_method = None, 'vote'
+    if use_consensus:
+        consensus_quorum = st.slider("Quorum", 1, len(consensus_members), len(consensus_members) // 2 + 1,
+                                     help="Answer as soon as this many models have replied")
+        consensus_method = st.selectbox("Aggregation", ["vote", "confidence"],
+                                        help="One vote per model, or votes weighted by stated confidence")
+    
+    stream_responses = st.checkbox("Stream AI responses", value=True,
+                                   help="Show tokens as they arrive instead of waiting for the full answer")
+    use_response_cache = st.checkbox("Cache AI responses", value=True,
+                                     help="Reuse a recent answer while prices stay within the tolerance")
+    cache_tolerance = st.slider("Cache Price Tolerance (%)", 0.1, 2.0, 0.5, 0.1,
+                                disabled=not use_response_cache)
+    
+    with st.expander("♻️ AI Cache Stats"):
+        cache_stats = response_cache.stats()
+        st.metric("Hit Rate", f"{cache_stats['hit_rate']:.0%}",
+                 help=f"{cache_stats['hits']} hits / {cache_stats['misses']} misses")
+        st.metric("Saved Latency", f"{cache_stats['saved_seconds']:.1f}s")
+        st.metric("Saved Tokens", f"{cache_stats['saved_tokens']:,}")
+    
+    model_table = ensemble_stats.table()
+    if model_table:
+        with st.expander("🗳️ Model Comparison"):
+            st.dataframe(pd.DataFrame(model_table), hide_index=True)
+    
     st.divider()
     st.header("⚙️ Trading Parameters")
     
+    account = st.text_input("Paper Account", value="default",
+                            help="Accounts are saved to disk and survive refreshes and restarts")
+    # Load on first use, on switching, or once another tab or agent has traded on the account
+    if st.session_state.get('account') != account:
+        st.session_state.portfolio = portfolio_store.load(account)
+        st.session_state.account = account
+        st.session_state.order_book = portfolio_store.load_orders(account, st.session_state.portfolio['positions'])
+    elif portfolio_store.is_stale(account, st.session_state.portfolio):
+        st.session_state.portfolio, dropped = portfolio_store.rebase(account, st.session_state.portfolio)
+        if dropped:
+            st.warning(f"Another session traded on this account; {dropped} fill(s) of this one were dropped")
+        st.session_state.order_book.reconcile(st.session_state.portfolio['positions'])
+    order_book = st.session_state.order_book
+    
     trading_symbols = st.multiselect(
         "Trading Pairs",
         ["BTC", "ETH", "SOL", "BNB", "DOGE", "XRP", "ADA", "AVAX"],
@@ -266,10 +367,46 @@ with st.sidebar:
         ["Aggressive (Alpha Arena Winner)", "Balanced", "Conservative"]
     )
     
+    json_signals = st.checkbox("JSON-mode signals", value=False,
+                               help="Ask the model for the trade signal as a JSON object for exact parsing")
+    signal_execution = st.radio("AI Signal Execution", ["Manual", "One-click", "Automatic"],
+                                horizontal=True,
+                                help="Automatic executes a valid signal as soon as it is parsed")
+    
+    live_prices = st.checkbox("Live WebSocket prices", value=True,
+                              help="Read prices from a streaming feed instead of polling the REST API")
+    price_refresh = st.select_slider("Price Refresh", options=[0, 1, 2, 5, 10, 30], value=5,
+                                     format_func=lambda seconds: f"{seconds}s" if seconds else "off",
+                                     help="Update the live price panel on its own, without rerunning the page")
+    
+    # One batched request serves every price lookup in this rerun;
+    # with the live feed only symbols it has no fresh price for are fetched,
+    # and the hub shares both with every other session
+    snapshot_symbols = trading_symbols + list(st.session_state.portfolio['positions'])
+    market_feed = get_market_feed() if live_prices else None
+    data_hub.subscribe(st.session_state.session_id, snapshot_symbols, market_feed)
+    price_snapshot = PriceSnapshot(snapshot_symbols, feed=market_feed, fetch=data_hub.prices)
+    
+    if market_feed is not None:
+        feed_stats = market_feed.stats()
+        if feed_stats['connected'] and feed_stats['fresh'] == feed_stats['symbols']:
+            st.caption(f"🟢 Live feed · {feed_stats['messages']:,} updates")
+        elif feed_stats['connected']:
+            st.caption(f"🟡 Live feed · {feed_stats['fresh']}/{feed_stats['symbols']} prices fresh, rest via REST")
+        elif feed_stats['reconnects']:
+            st.caption(f"🔴 Live feed reconnecting ({feed_stats['reconnects']} retries) · using REST")
+        else:
+            st.caption("⚪ Live feed connecting · using REST")
+    
+    # What the price panel's liquidation and exit-order checks did since the last full run
+    for level, message in st.session_state.pop('position_notices', []):
+        getattr(st, level)(message)
+    
     st.divider()
     st.header("📊 Portfolio Status")
     
-    current_value = calculate_portfolio_value()
+    # Marked once here and reused by the Portfolio tab
+    current_value = portfolio_marks()['portfolio_value']
     profit_loss = current_value - st.session_state.portfolio['start_value']
     profit_pct = (profit_loss / st.session_state.portfolio['start_value']) * 100
     
@@ -283,286 +420,409 @@ with st.sidebar:
     st.metric("Trading Hours", f"{hours:.1f}h")
     
     if st.button("🔄 Reset Portfolio", type="secondary"):
-        st.session_state.portfolio = {
-            'cash': 10000.0,
-            'positions': {},
-            'trade_history': [],
-            'pnl_history': [],
-            'start_value': 10000.0,
-            'start_time': datetime.now()
-        }
+        st.session_state.portfolio = portfolio_store.reset(account)
+        st.session_state.order_book = OrderBook()
         st.rerun()
+    
+    # The headless agent (python agent.py) trades on its own; the app only reads its state
+    agent_state = load_state(os.environ.get('AGENT_STATE_PATH', DEFAULT_STATE_PATH))
+    with st.expander("🤖 Autonomous Agent"):
+        if agent_state is None:
+            st.caption("Not running. Start it with `python agent.py --base-url ... --model ...`")
+        else:
+            seen_ago = time.time() - agent_state['updated']
+            if agent_state['running'] and seen_ago < 30:
+                st.success(f"Running · {agent_state['model']} · every {agent_state['every']:.0f}s")
+            else:
+                st.info(f"Stopped · last seen {seen_ago / 60:.0f} min ago")
+            agent_value = trading.calculate_portfolio_value(agent_state['portfolio'], get_crypto_price)
+            st.metric("Agent Portfolio", f"${agent_value:,.2f}",
+                     delta=f"${agent_value - agent_state['portfolio']['start_value']:,.2f}")
+            st.caption(f"{agent_state['trade_stats']['trades']} trades · "
+                       f"realized ${agent_state['trade_stats']['realized_pnl']:,.2f}")
+            st.caption(f"{agent_state['decisions']} decisions · {agent_state['timeouts']} over budget · "
+                       f"{agent_state['skipped']} triggers skipped · "
+                       f"{len(agent_state.get('orders', []))} exit orders resting")
+            for record in reversed(agent_state['recent'][-5:]):
+                st.caption(f"{record['time']} · {record['reason']} · {record.get('outcome')}")
 
-# Main content
-if api_key and trading_symbols and base_url:
+rerun_timer.lap('sidebar')
+
+# Sections of the main page are fragments: a widget inside one reruns only that
+# fragment, with the arguments of the last full run. Anything that changes the
+# portfolio reruns the whole app so the sidebar follows.
+@profiler.timed('render.prices')
+def live_price_panel(symbols):
+    st.markdown("### 💹 Live Market Prices")
+    # Timed reruns of this panel are all an idle tab runs, so they renew its data hub lease
+    data_hub.subscribe(st.session_state.session_id, snapshot_symbols, market_feed)
+    # Positions are marked and exit orders ticked at every refresh's prices, not only on full reruns
+    watch_positions()
+    price_cols = st.columns(len(symbols))
     
-    # Main tabs
-    tab1, tab2, tab3, tab4 = st.tabs([
-        "🎯 AI Trading Dashboard",
-        "📊 Market Analysis", 
-        "💼 Portfolio",
-        "📜 Trade History"
-    ])
+    for idx, symbol in enumerate(symbols):
+        price = get_crypto_price(symbol)
+        if price:
+            with price_cols[idx]:
+                df = get_market_data(symbol, '1h', 24)
+                if df is not None and len(df) > 0:
+                    change_24h = ((price - df['close'].iloc[0]) / df['close'].iloc[0]) * 100
+                    st.metric(symbol, f"${price:,.2f}", f"{change_24h:+.2f}%")
+                else:
+                    st.metric(symbol, f"${price:,.2f}")
+
+@st.fragment
+@profiler.timed('render.recommendation')
+def recommendation_panel(symbols, max_leverage):
+    st.markdown("### 🎯 Quick Actions")
+    if st.button("🚀 Get AI Trade Recommendation", type="primary", use_container_width=True):
+        with st.spinner("AI analyzing markets..."):
+            # Fetch every pair at once; slow pairs are dropped at the deadline
+            prices, frames = fetch_symbol_data(symbols, '1h', 100, deadline=5.0, source=data_hub)
+            # Fall back to this rerun's snapshot if a fresh price missed the deadline
+            market_context, market_state, missing_symbols = market_overview(
+                symbols, prices, frames, get_crypto_price)
+            
+            if missing_symbols:
+                st.warning(f"Market data timed out for: {', '.join(missing_symbols)}")
+            
+            prompt = recommendation_prompt(market_context, st.session_state.portfolio, max_leverage,
+                                           json_signals)
+            
+            recommendation_state = {
+                'market': market_state,
+                'cash': st.session_state.portfolio['cash'],
+                'positions': st.session_state.portfolio['positions'],
+                'max_leverage': max_leverage
+            }
+            
+            st.markdown("### 🎯 AI Trade Recommendation")
+            if use_consensus:
+                response, cached = show_consensus(prompt, json_signals), False
+            else:
+                response, cached = show_ai_response(prompt, 'recommendation', recommendation_state,
+                                                    json_signals)
+            
+            signal = parse_trade_signal(response)
+            st.session_state.last_signal = None
+            if signal is None:
+                st.warning("No trade signal found in the response")
+            else:
+                st.session_state.last_signal = {'signal': signal.to_dict(), 'executed': None}
+                if signal_execution == "Automatic" and cached:
+                    # The fresh answer behind a cached one was already routed when it arrived
+                    st.info("Cached signal not executed automatically; execute it below if it still applies")
+                elif signal_execution == "Automatic":
+                    success, message = route_signal(st.session_state.last_signal)
+                    if success:
+                        st.rerun()
+                    st.error(f"Signal not executed: {message}")
     
-    # TAB 1: AI Trading Dashboard
-    with tab1:
-        st.markdown("## 🤖 AI Agent Trading Console")
-        
-        col1, col2 = st.columns([2, 1])
+    # The parsed signal outlives the rerun that produced it, so it can be executed later
+    signal_entry = st.session_state.get('last_signal')
+    if signal_entry:
+        signal = TradeSignal.from_dict(signal_entry['signal'])
+        st.markdown("### 📡 Parsed Signal")
+        st.info(signal.describe())
         
-        with col1:
-            st.markdown("### 💹 Live Market Prices")
-            price_cols = st.columns(len(trading_symbols))
+        if signal_entry['executed']:
+            st.success(f"Executed: {signal_entry['executed']}")
+        else:
+            errors = signal.validate(max_leverage, st.session_state.portfolio['cash'],
+                                     st.session_state.portfolio['positions'], symbols)
+            for error in errors:
+                st.warning(error)
             
-            for idx, symbol in enumerate(trading_symbols):
-                price = get_crypto_price(symbol)
-                if price:
-                    with price_cols[idx]:
-                        df = get_market_data(symbol, '1h', 24)
-                        if df is not None and len(df) > 0:
-                            change_24h = ((price - df['close'].iloc[0]) / df['close'].iloc[0]) * 100
-                            st.metric(symbol, f"${price:,.2f}", f"{change_24h:+.2f}%")
-                        else:
-                            st.metric(symbol, f"${price:,.2f}")
-        
-        with col2:
-            st.markdown("### 🎯 Quick Actions")
-            if st.button("🚀 Get AI Trade Recommendation", type="primary", use_container_width=True):
-                with st.spinner("AI analyzing markets..."):
-                    market_context = "**REAL-TIME MARKET DATA:**\n\n"
-                    
-                    for symbol in trading_symbols:
-                        price = get_crypto_price(symbol)
-                        df = get_market_data(symbol, '1h', 24)
-                        
-                        if price and df is not None:
-                            change_24h = ((price - df['close'].iloc[0]) / df['close'].iloc[0]) * 100
-                            volume = df['volume'].sum()
-                            high_24h = df['high'].max()
-                            low_24h = df['low'].min()
-                            
-                            market_context += f"""
-**{symbol}/USDT:**
-- Current: ${price:,.2f}
-- 24h Change: {change_24h:+.2f}%
-- 24h High: ${high_24h:,.2f}
-- 24h Low: ${low_24h:,.2f}
-- Volume: {volume:,.0f}
-
-"""
-                    
-                    prompt = f"""{market_context}
-
-**PORTFOLIO:**
-- Cash: ${st.session_state.portfolio['cash']:.2f}
-- Positions: {json.dumps(st.session_state.portfolio['positions'], indent=2)}
-
-**MISSION:** Analyze and provide ONE specific trade recommendation that will likely profit in the next 1-6 hours.
-
-Use DeepSeek's winning strategy:
-1. Identify strongest momentum
-2. Recommend aggressive entry with leverage
-3. Set clear profit target (5-20%)
-4. Explain why this will profit
-
-**FORMAT:**
-TRADE SIGNAL: BUY/SELL
-SYMBOL: [crypto]
-AMOUNT: $[USD]
-LEVERAGE: [1-{max_leverage}]x
-ENTRY: $[price]
-TARGET: $[price] ([%] profit)
-STOP LOSS: $[price]
-REASONING: [why this wins]
-CONFIDENCE: [1-10]
-"""
-                    
-                    response = call_ai_api(prompt, api_key, base_url, model_name)
-                    
-                    st.markdown("### 🎯 AI Trade Recommendation")
-                    st.markdown(response)
-        
-        st.divider()
-        
-        # Manual trading
-        st.markdown("### 🎮 Manual Trading Controls")
-        
-        col1, col2, col3, col4 = st.columns(4)
-        
-        with col1:
-            trade_action = st.selectbox("Action", ["BUY", "SELL"])
-        with col2:
-            trade_symbol = st.selectbox("Symbol", trading_symbols)
-        with col3:
-            trade_amount = st.number_input("Amount (USD)", min_value=0.0, value=1000.0, step=100.0)
-        with col4:
-            trade_leverage = st.slider("Leverage", 1, max_leverage, 1)
-        
-        if st.button("Execute Trade", type="primary"):
-            current_price = get_crypto_price(trade_symbol)
-            if current_price:
-                coin_amount = trade_amount / current_price
-                success, message = execute_trade(trade_action, trade_symbol, coin_amount, trade_leverage)
-                
+            if signal_execution == "Manual":
+                st.caption("Switch AI Signal Execution to One-click to trade it directly")
+            elif st.button("⚡ Execute Signal", disabled=bool(errors), use_container_width=True):
+                success, message = route_signal(signal_entry)
                 if success:
-                    st.success(message)
-                    st.balloons()
                     st.rerun()
                 else:
                     st.error(message)
+
+@st.fragment
+@profiler.timed('render.trading')
+def manual_trading_panel(symbols, max_leverage):
+    st.markdown("### 🎮 Manual Trading Controls")
+    
+    col1, col2, col3, col4 = st.columns(4)
+    
+    with col1:
+        trade_action = st.selectbox("Action", ["BUY", "SELL"])
+    with col2:
+        trade_symbol = st.selectbox("Symbol", symbols)
+    with col3:
+        trade_amount = st.number_input("Amount (USD)", min_value=0.0, value=1000.0, step=100.0)
+    with col4:
+        trade_leverage = st.slider("Leverage", 1, max_leverage, 1)
+    
+    if st.button("Execute Trade", type="primary"):
+        current_price = get_crypto_price(trade_symbol)
+        if current_price:
+            coin_amount = trade_amount / current_price
+            success, message = execute_trade(trade_action, trade_symbol, coin_amount, trade_leverage)
+            
+            if success:
+                st.success(message)
+                st.balloons()
+                st.rerun()
             else:
-                st.error("Failed to get price")
+                st.error(message)
+        else:
+            st.error("Failed to get price")
+
+@st.fragment
+@profiler.timed('render.analysis')
+def analysis_panel(symbols):
+    st.markdown("## 📊 Technical Analysis")
     
-    # TAB 2: Market Analysis
-    with tab2:
-        st.markdown("## 📊 Technical Analysis")
-        
-        selected_symbol = st.selectbox("Select Crypto", trading_symbols)
+    col1, col2, col3, col4 = st.columns([2, 2, 1, 1])
+    with col1:
+        selected_symbol = st.selectbox("Select Crypto", symbols)
+    with col2:
+        lookback = st.select_slider("Lookback", options=list(LOOKBACKS), value='1 Week')
+    with col3:
+        chart_style = st.radio("Chart Style", ['Candles', 'Line'], horizontal=True)
+    with col4:
+        chart_width = st.select_slider("Resolution", options=CHART_WIDTHS, value=DEFAULT_WIDTH,
+                                       format_func=lambda width: f"{width}px",
+                                       help="Width in pixels the history is downsampled to")
+    
+    if selected_symbol:
+        analysis_timer = profiler.stopwatch('render.analysis')
+        chart = get_chart(selected_symbol, LOOKBACKS[lookback], chart_width, chart_style)
+        fig = chart.update(data_hub.cache.store, get_market_data)
+        analysis_timer.lap('data')
         
-        if selected_symbol:
-            df = get_market_data(selected_symbol, '1h', 168)
+        if fig is not None:
+            st.plotly_chart(fig, use_container_width=True)
+            caption = f"{len(chart.frame)} {span_label(chart.bucket_ms)} bars from {chart.interval} candles"
+            if chart.partial:
+                caption += " · ⏳ downloading the history up to the live window; the gap fills on a later rerun"
+            if chart.interval != '1m':
+                days = LOOKBACKS[lookback] // 86_400_000
+                caption += (f" · backfill 1m history for full detail: `python kline_store.py backfill "
+                            f"--symbols {selected_symbol} --interval 1m --days {days}`")
+            st.caption(caption)
+            analysis_timer.lap('chart')
             
-            if df is not None:
-                fig = make_subplots(
-                    rows=2, cols=1,
-                    row_heights=[0.7, 0.3],
-                    subplot_titles=(f'{selected_symbol}/USDT Price', 'Volume'),
-                    vertical_spacing=0.05
-                )
-                
-                fig.add_trace(
-                    go.Candlestick(
-                        x=df['timestamp'],
-                        open=df['open'],
-                        high=df['high'],
-                        low=df['low'],
-                        close=df['close'],
-                        name='Price'
-                    ),
-                    row=1, col=1
-                )
-                
-                fig.add_trace(
-                    go.Bar(x=df['timestamp'], y=df['volume'], name='Volume', marker_color='rgba(100,100,250,0.5)'),
-                    row=2, col=1
-                )
-                
-                fig.update_layout(
-                    height=600,
-                    xaxis_rangeslider_visible=False,
-                    template='plotly_dark'
-                )
-                
-                st.plotly_chart(fig, use_container_width=True)
-                
-                if st.button("🧠 Get AI Analysis"):
-                    with st.spinner("AI analyzing..."):
-                        current_price = df['close'].iloc[-1]
-                        price_change = ((current_price - df['close'].iloc[0]) / df['close'].iloc[0]) * 100
-                        
-                        prompt = f"""Analyze {selected_symbol}:
+            if st.button("🧠 Get AI Analysis"):
+                with st.spinner("AI analyzing..."):
+                    df = get_market_data(selected_symbol, '1h', 168)
+                    if df is None:
+                        st.error(f"Could not fetch {selected_symbol} market data")
+                        return
+                    df = compute(df)
+                    current_price = df['close'].iloc[-1]
+                    price_change = ((current_price - df['close'].iloc[0]) / df['close'].iloc[0]) * 100
+                    
+                    prompt = f"""Analyze {selected_symbol}:
 
 Current: ${current_price:.2f}
 7d Change: {price_change:+.2f}%
 7d High: ${df['high'].max():.2f}
 7d Low: ${df['low'].min():.2f}
 
+Indicators (1h):
+{format_for_prompt(df)}
+
 Provide:
 1. Trend (bullish/bearish)
 2. Support/resistance levels
 3. Entry/exit recommendations
 4. Risk/reward ratio
 """
-                        
-                        response = call_ai_api(prompt, api_key, base_url, model_name)
-                        st.markdown(response)
+                    
+                    analysis_state = {
+                        'symbol': selected_symbol,
+                        'price': current_price,
+                        'change': price_change,
+                        'high': df['high'].max(),
+                        'low': df['low'].min()
+                    }
+                    show_ai_response(prompt, 'analysis', analysis_state)
+
+def cancel_order(order_book, order_id):
+    order_book.cancel(order_id)
+    portfolio_store.save_orders(st.session_state.account, order_book)
+
+@st.fragment
+@profiler.timed('render.portfolio')
+def portfolio_panel(order_book):
+    st.markdown("## 💼 Portfolio Overview")
     
-    # TAB 3: Portfolio
-    with tab3:
-        st.markdown("## 💼 Portfolio Overview")
-        
-        col1, col2, col3, col4 = st.columns(4)
+    col1, col2, col3, col4 = st.columns(4)
+    
+    # The sidebar's marks, unless prices have moved since
+    marks = portfolio_marks()
+    current_value = marks['portfolio_value']
+    profit_loss = current_value - st.session_state.portfolio['start_value']
+    profit_pct = (profit_loss / st.session_state.portfolio['start_value']) * 100
+    
+    with col1:
+        if profit_loss >= 0:
+            st.markdown(f'<div class="profit-card"><h2>${current_value:.2f}</h2><p>Total Value</p></div>', 
+                       unsafe_allow_html=True)
+        else:
+            st.markdown(f'<div class="loss-card"><h2>${current_value:.2f}</h2><p>Total Value</p></div>', 
+                       unsafe_allow_html=True)
+    
+    with col2:
+        st.metric("Profit/Loss", f"${profit_loss:.2f}", f"{profit_pct:.2f}%")
+    with col3:
+        st.metric("Available Cash", f"${st.session_state.portfolio['cash']:.2f}")
+    with col4:
+        roi = (current_value / st.session_state.portfolio['start_value'] - 1) * 100
+        st.metric("ROI", f"{roi:.2f}%")
+    
+    st.divider()
+    
+    st.markdown("### 📈 Open Positions")
+    
+    if st.session_state.portfolio['positions']:
+        positions = st.session_state.portfolio['positions']
+        positions_data = pd.DataFrame({
+            'Symbol': marks['symbols'],
+            'Side': np.where(marks['amount'] > 0, 'LONG', 'SHORT'),
+            'Amount': np.abs(marks['amount']),
+            'Entry': marks['entry_price'],
+            'Current': marks['price'],
+            'Leverage': [f"{positions[symbol]['leverage']:.1f}x" for symbol in marks['symbols']],
+            'Notional': marks['notional'],
+            'Margin': marks['margin'],
+            'Liq. Price': marks['liquidation_price'],
+            'P&L': marks['unrealized_pnl'],
+            'ROE %': marks['unrealized_pnl'] / marks['margin'] * 100,
+        })
         
-        current_value = calculate_portfolio_value()
-        profit_loss = current_value - st.session_state.portfolio['start_value']
-        profit_pct = (profit_loss / st.session_state.portfolio['start_value']) * 100
+        st.dataframe(positions_data.style.format({
+            'Amount': '{:.6f}', 'Entry': '${:,.2f}', 'Current': '${:,.2f}', 'Notional': '${:,.2f}',
+            'Margin': '${:,.2f}', 'Liq. Price': '${:,.2f}', 'P&L': '${:,.2f}', 'ROE %': '{:.2f}%'
+        }), use_container_width=True)
+        st.caption(f"Margin in use ${marks['margin'].sum():,.2f} · "
+                   f"maintenance ${marks['maintenance'].sum():,.2f}")
         
+        st.markdown("### 🛡️ Exit Orders")
+        order_kinds = {"Stop loss": 'stop', "Take profit": 'take_profit', "Trailing stop": 'trailing_stop'}
+        col1, col2, col3, col4 = st.columns(4)
         with col1:
-            if profit_loss >= 0:
-                st.markdown(f'<div class="profit-card"><h2>${current_value:.2f}</h2><p>Total Value</p></div>', 
-                           unsafe_allow_html=True)
+            order_symbol = st.selectbox("Position", marks['symbols'])
+        with col2:
+            order_kind = st.selectbox("Order Type", list(order_kinds))
+        mark_price = float(marks['price'][marks['symbols'].index(order_symbol)])
+        with col3:
+            if order_kind == "Trailing stop":
+                order_level = st.number_input("Trail %", min_value=0.1, max_value=50.0, value=2.0, step=0.5)
             else:
-                st.markdown(f'<div class="loss-card"><h2>${current_value:.2f}</h2><p>Total Value</p></div>', 
-                           unsafe_allow_html=True)
+                order_level = st.number_input("Trigger Price", min_value=0.0, value=mark_price,
+                                              step=max(mark_price / 1000, 0.01), format="%.2f")
+        with col4:
+            st.write("")
+            place_order = st.button("Place Order", use_container_width=True)
+        if place_order:
+            trigger, trail = (None, order_level) if order_kind == "Trailing stop" else (order_level, None)
+            order, message = order_book.place(positions, order_symbol, order_kinds[order_kind], mark_price,
+                                              trigger, trail)
+            if order is None:
+                st.error(message)
+            else:
+                st.success(message)
+                portfolio_store.save_orders(st.session_state.account, order_book)
+        
+        if len(order_book):
+            st.dataframe(pd.DataFrame([{
+                'ID': order.id,
+                'Order': order.describe(),
+                'Fires At': f"${order_book.stop_price(order):,.2f}",
+                'OCO': order.oco or '',
+            } for order in order_book.orders()]), hide_index=True, use_container_width=True)
+            col1, col2 = st.columns([3, 1])
+            with col1:
+                cancel_id = st.selectbox("Order to cancel", [order.id for order in order_book.orders()])
+            with col2:
+                st.write("")
+                # Cancelled in the callback, before the fragment reruns and redraws the table
+                st.button("Cancel Order", use_container_width=True, on_click=cancel_order, args=(order_book, cancel_id))
+        else:
+            st.caption("No resting orders. AI signals you execute place their stop loss and target here.")
+    else:
+        st.info("No open positions")
+
+@profiler.timed('render.history')
+def history_panel():
+    st.markdown("## 📜 Trade History")
+    
+    ledger = st.session_state.portfolio['trade_history']
+    if len(ledger):
+        # Only the shown rows are converted; the counts are kept up to date by the ledger
+        st.markdown("### Recent Trades")
+        st.dataframe(ledger.tail(20), use_container_width=True)
         
+        st.divider()
+        col1, col2, col3, col4 = st.columns(4)
+        
+        trade_stats = ledger.stats()
+        
+        with col1:
+            st.metric("Total Trades", trade_stats['trades'])
         with col2:
-            st.metric("Profit/Loss", f"${profit_loss:.2f}", f"{profit_pct:.2f}%")
+            st.metric("Buy Orders", trade_stats['buys'])
         with col3:
-            st.metric("Available Cash", f"${st.session_state.portfolio['cash']:.2f}")
+            st.metric("Sell Orders", trade_stats['sells'])
         with col4:
-            roi = (current_value / st.session_state.portfolio['start_value'] - 1) * 100
-            st.metric("ROI", f"{roi:.2f}%")
+            if trade_stats['closes'] > 0:
+                st.metric("Avg Profit", f"${trade_stats['avg_profit']:.2f}",
+                         help=f"Realized P&L ${trade_stats['realized_pnl']:,.2f}")
+    else:
+        st.info("No trades yet")
+
+# Main content
+if api_key and trading_symbols and base_url:
+    
+    # Main tabs
+    tab1, tab2, tab3, tab4 = st.tabs([
+        "🎯 AI Trading Dashboard",
+        "📊 Market Analysis", 
+        "💼 Portfolio",
+        "📜 Trade History"
+    ])
+    
+    # TAB 1: AI Trading Dashboard
+    with tab1:
+        st.markdown("## 🤖 AI Agent Trading Console")
         
-        st.divider()
+        col1, col2 = st.columns([2, 1])
         
-        st.markdown("### 📈 Open Positions")
+        with col1:
+            # Refreshes itself on a timer; the rest of the page is untouched
+            st.fragment(live_price_panel, run_every=price_refresh or None)(trading_symbols)
         
-        if st.session_state.portfolio['positions']:
-            positions_data = []
-            
-            for symbol, position in st.session_state.portfolio['positions'].items():
-                current_price = get_crypto_price(symbol)
-                if current_price:
-                    entry_value = position['amount'] * position['entry_price']
-                    current_value_pos = position['amount'] * current_price
-                    pnl = (current_value_pos - entry_value) * position['leverage']
-                    pnl_pct = ((current_price / position['entry_price']) - 1) * 100 * position['leverage']
-                    
-                    positions_data.append({
-                        'Symbol': symbol,
-                        'Amount': f"{position['amount']:.6f}",
-                        'Entry': f"${position['entry_price']:.2f}",
-                        'Current': f"${current_price:.2f}",
-                        'Leverage': f"{position['leverage']:.1f}x",
-                        'P&L': f"${pnl:.2f}",
-                        'P&L %': f"{pnl_pct:.2f}%"
-                    })
-            
-            st.dataframe(pd.DataFrame(positions_data), use_container_width=True)
-        else:
-            st.info("No open positions")
+        with col2:
+            recommendation_panel(trading_symbols, max_leverage)
+        
+        st.divider()
+        
+        # Manual trading
+        manual_trading_panel(trading_symbols, max_leverage)
+    
+    # TAB 2: Market Analysis
+    with tab2:
+        analysis_panel(trading_symbols)
+    
+    # TAB 3: Portfolio
+    with tab3:
+        portfolio_panel(order_book)
     
     # TAB 4: Trade History
     with tab4:
-        st.markdown("## 📜 Trade History")
-        
-        if st.session_state.portfolio['trade_history']:
-            df_history = pd.DataFrame(st.session_state.portfolio['trade_history'])
-            
-            st.markdown("### Recent Trades")
-            st.dataframe(df_history.tail(20), use_container_width=True)
-            
-            st.divider()
-            col1, col2, col3, col4 = st.columns(4)
-            
-            total_trades = len(df_history)
-            buy_trades = len(df_history[df_history['action'] == 'BUY'])
-            sell_trades = len(df_history[df_history['action'] == 'SELL'])
-            
-            with col1:
-                st.metric("Total Trades", total_trades)
-            with col2:
-                st.metric("Buy Orders", buy_trades)
-            with col3:
-                st.metric("Sell Orders", sell_trades)
-            with col4:
-                if sell_trades > 0:
-                    avg_profit = df_history[df_history['action'] == 'SELL']['profit'].mean()
-                    st.metric("Avg Profit", f"${avg_profit:.2f}")
-        else:
-            st.info("No trades yet")
+        history_panel()
+    rerun_timer.lap('main')
 
 else:
+    # The price panel is not shown, so positions are watched on reruns instead
+    watch_positions()
     st.markdown("""
         <div style='text-align: center; padding: 3rem;'>
             <h2>🏆 Welcome to AI Trading Agent</h2>
@@ -591,4 +851,35 @@ st.markdown("""
     <div style='text-align: center; color: #888;'>
         <p>⚠️ Paper Trading Only | Not Financial Advice</p>
     </div>
-""", unsafe_allow_html=True)
\ No newline at end of file
+""", unsafe_allow_html=True)
+
+rerun_timer.total()
+if os.environ.get('METRICS_PATH'):
+    # For a Prometheus textfile collector, or JSON lines with a .jsonl path
+    profiler.export(os.environ['METRICS_PATH'])
+
+# Rendered last so it includes this rerun; the numbers are process-wide
+with st.sidebar:
+    with st.expander("⏱️ Diagnostics"):
+        latency_rows = profiler.table()
+        if latency_rows:
+            st.dataframe(pd.DataFrame(latency_rows).round(1), hide_index=True, use_container_width=True)
+        counter_rows = profiler.counter_rows()
+        if counter_rows:
+            st.dataframe(pd.DataFrame(counter_rows), hide_index=True, use_container_width=True)
+        st.caption(f"p50/p95/p99 over the last {profiler.window} samples of each section, "
+                   f"since {datetime.fromtimestamp(profiler.started):%H:%M:%S}")
+        hub_stats = data_hub.stats()
+        fan_in = f"{hub_stats['fan_in']:.1f}x" if hub_stats['fan_in'] else "n/a"
+        st.caption(f"📡 Data hub · {hub_stats['sessions']} sessions on {hub_stats['symbols']} symbols · "
+                   f"fan-in {fan_in} · {hub_stats['upstream_per_minute']:.0f} upstream requests/min")
+        col1, col2 = st.columns(2)
+        with col1:
+            st.download_button("Prometheus", profiler.to_prometheus(), file_name="metrics.prom",
+                               mime="text/plain", use_container_width=True)
+        with col2:
+            st.download_button("JSON lines", profiler.to_json_lines(), file_name="metrics.jsonl",
+                               mime="application/jsonl", use_container_width=True)
+        if st.button("Reset Metrics", use_container_width=True):
+            profiler.reset()
+            st.rerun()
@@ -0,0 +1,272 @@
+"""Replay historical klines through the paper-trading rules.
+
+Klines are read from `<data-dir>/<SYMBOL>_<interval>.parquet` or `.csv`
+(either get_market_data()'s columns with a header, or headerless Binance
+kline dumps), falling back to the kline store under `<data-dir>/klines`
+that `python kline_store.py backfill` fills. Example:
+
+    python backtest.py --data-dir data --symbols BTC ETH --interval 1m --leverage 3 --risk 5
+"""
+import argparse
+import heapq
+import importlib
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+import trading
+from indicators import compute
+from kline_store import KlineStore
+from market_data import KLINE_COLUMNS
+
+BARS_PER_YEAR = {
+    '1m': 525600, '3m': 175200, '5m': 105120, '15m': 35040, '30m': 17520,
+    '1h': 8760, '2h': 4380, '4h': 2190, '6h': 1460, '12h': 730, '1d': 365
+}
+
+# Thresholds behind the sidebar's "Strategy Style" choices
+STRATEGY_PRESETS = {
+    'Aggressive': {'rsi_entry': 55, 'rsi_exit': 45, 'min_volume_z': -np.inf},
+    'Balanced': {'rsi_entry': 60, 'rsi_exit': 50, 'min_volume_z': 0.0},
+    'Conservative': {'rsi_entry': 65, 'rsi_exit': 55, 'min_volume_z': 0.5},
+}
+
+PRICE_COLUMNS = ['open', 'high', 'low', 'close', 'volume']
+
+# Event kinds, in the order they are applied within one timestamp
+LIQUIDATE, SELL, BUY = 0, 1, 2
+
+
+def strategy_preset(strategy):
+    """Look up a preset by name; "Aggressive (Alpha Arena Winner)" matches "Aggressive" """
+    return STRATEGY_PRESETS[strategy.split()[0]]
+
+
+def load_klines(path):
+    """Load klines from a CSV or Parquet file into get_market_data()'s layout"""
+    if path.endswith('.parquet'):
+        df = pd.read_parquet(path)
+    else:
+        df = pd.read_csv(path)
+        if 'timestamp' not in df.columns:
+            # Binance's bulk kline dumps have no header row
+            df = pd.read_csv(path, header=None, names=KLINE_COLUMNS)
+
+    if pd.api.types.is_numeric_dtype(df['timestamp']):
+        # Newer Binance dumps use microseconds, older ones milliseconds
+        unit = 'us' if df['timestamp'].iloc[0] > 10 ** 14 else 'ms'
+        df['timestamp'] = pd.to_datetime(df['timestamp'], unit=unit)
+    else:
+        df['timestamp'] = pd.to_datetime(df['timestamp'])
+    for column in PRICE_COLUMNS:
+        df[column] = df[column].astype(float)
+    return df[['timestamp'] + PRICE_COLUMNS].sort_values('timestamp', ignore_index=True)
+
+
+def load_dataset(data_dir, symbols, interval):
+    """Load klines for each symbol from files in `data_dir` or its kline store"""
+    store = KlineStore(os.path.join(data_dir, 'klines'))
+    klines = {}
+    for symbol in symbols:
+        for extension in ('parquet', 'csv'):
+            path = os.path.join(data_dir, f"{symbol}_{interval}.{extension}")
+            if os.path.exists(path):
+                klines[symbol] = load_klines(path)
+                break
+        else:
+            stored = store.read(symbol, interval)
+            if stored is None:
+                raise FileNotFoundError(f"No {interval} klines for {symbol} in {data_dir}")
+            klines[symbol] = stored[['timestamp'] + PRICE_COLUMNS]
+    return klines
+
+
+def momentum_signal(df, strategy='Aggressive'):
+    """Go long on trend and RSI momentum, exit when either fades
+
+    Returns one value per bar: 1 to buy, -1 to sell, 0 to hold.
+    """
+    preset = strategy_preset(strategy)
+    ind = compute(df)
+    close = df['close'].to_numpy()
+    ema_20, ema_50 = ind['ema_20'].to_numpy(), ind['ema_50'].to_numpy()
+    rsi, volume_z = ind['rsi_14'].to_numpy(), ind['volume_z'].to_numpy()
+
+    enter = ((close > ema_20) & (ema_20 > ema_50) & (rsi > preset['rsi_entry']) &
+             (volume_z > preset['min_volume_z']))
+    leave = (close < ema_20) | (rsi < preset['rsi_exit'])
+    return np.where(enter, 1, np.where(leave, -1, 0)).astype(np.int8)
+
+
+def position_changes(signal):
+    """Bar indices where a buy/sell signal flips the position between flat and long"""
+    # Carry the last non-zero signal forward so repeated signals do not re-trade
+    index = np.where(signal != 0, np.arange(len(signal)), 0)
+    np.maximum.accumulate(index, out=index)
+    held = (signal[index] == 1).astype(np.int8)
+    held[(index == 0) & (signal[0] == 0)] = 0
+    flips = np.flatnonzero(np.diff(held, prepend=0))
+    return flips[held[flips] == 1], flips[held[flips] == 0]
+
+
+def run_backtest(klines, signal_fn=momentum_signal, strategy='Aggressive', leverage=1.0,
+                 risk_per_trade=5.0, cash=trading.STARTING_CASH, interval='1m'):
+    """Replay `klines` ({symbol: DataFrame}) through trading.execute_trade
+
+    Entries commit `risk_per_trade` percent of cash as margin at `leverage`;
+    exits close the whole position. Fills happen at the close of the bar
+    that produced the signal. A position whose bar low reaches its
+    liquidation price before the exit is liquidated there instead. Trades
+    are executed one by one with the app's rules; the equity curve
+    between trades is computed vectorized.
+    """
+    events, bars = [], {}
+    for symbol, df in klines.items():
+        timestamps = df['timestamp'].to_numpy(dtype='datetime64[ns]').view(np.int64)
+        close = df['close'].to_numpy()
+        low = df['low'].to_numpy() if 'low' in df else close
+        buys, sells = position_changes(np.asarray(signal_fn(df, strategy)))
+        bars[symbol] = (timestamps, low, sells)
+        events += [(timestamps[i], SELL, symbol, close[i], i) for i in sells]
+        events += [(timestamps[i], BUY, symbol, close[i], i) for i in buys]
+    # Liquidations, then sells, then buys at the same timestamp, so freed cash can be reused
+    heapq.heapify(events)
+
+    start = min(df['timestamp'].iloc[0] for df in klines.values())
+    portfolio = trading.new_portfolio(cash, start_time=start.to_pydatetime())
+    event_times, event_symbols, amounts_after, entries_after, margins_after, cash_after = [], [], [], [], [], []
+
+    while events:
+        timestamp, kind, symbol, price, bar = heapq.heappop(events)
+        position = portfolio['positions'].get(symbol)
+        when = int(timestamp) // 1_000_000
+        if kind == BUY:
+            notional = portfolio['cash'] * risk_per_trade / 100 * leverage
+            success, _ = trading.execute_trade(portfolio, 'BUY', symbol, notional / price, price, leverage, when)
+            if success:
+                liquidation = liquidation_event(portfolio['positions'][symbol], symbol, bar, *bars[symbol])
+                if liquidation:
+                    heapq.heappush(events, liquidation)
+        elif position is None:
+            continue
+        else:
+            success, _ = trading.execute_trade(portfolio, 'SELL', symbol, position['amount'], price, leverage, when)
+        if success:
+            event_times.append(timestamp)
+            event_symbols.append(symbol)
+            position = portfolio['positions'].get(symbol)
+            amounts_after.append(position['amount'] if position else 0.0)
+            entries_after.append(position['entry_price'] if position else 0.0)
+            margins_after.append(position['margin'] if position else 0.0)
+            cash_after.append(portfolio['cash'])
+
+    equity, timeline = equity_curve(klines, cash, np.array(event_times, dtype=np.int64),
+                                     np.array(event_symbols, dtype=object), np.array(amounts_after),
+                                     np.array(entries_after), np.array(margins_after), np.array(cash_after))
+    equity = pd.Series(equity, index=pd.to_datetime(timeline), name='equity')
+    return {
+        'equity': equity,
+        'trades': portfolio['trade_history'].to_frame(),
+        'metrics': performance_metrics(equity.to_numpy(), portfolio['trade_history'], interval),
+        'portfolio': portfolio,
+    }
+
+
+def liquidation_event(position, symbol, bar, timestamps, low, sells):
+    """The event liquidating a long opened at `bar`, if a low reaches its price before the exit"""
+    price = trading.liquidation_price(position['amount'], position['entry_price'], position['margin'])
+    exit_at = np.searchsorted(sells, bar, side='right')
+    last = sells[exit_at] if exit_at < len(sells) else len(low) - 1
+    hit = np.flatnonzero(low[bar + 1:last + 1] <= price)
+    if price <= 0 or not len(hit):
+        return None
+    liquidated = bar + 1 + hit[0]
+    return (timestamps[liquidated], LIQUIDATE, symbol, float(price), liquidated)
+
+
+def equity_curve(klines, cash, event_times, event_symbols, amounts_after, entries_after, margins_after,
+                 cash_after):
+    """Mark the portfolio to market on every bar from the post-trade state"""
+    stamps = {symbol: df['timestamp'].to_numpy(dtype='datetime64[ns]').view(np.int64)
+              for symbol, df in klines.items()}
+    # Each symbol is already sorted, so a stable merge sort plus dedupe is cheap
+    timeline = np.sort(np.concatenate(list(stamps.values())), kind='stable')
+    timeline = timeline[np.concatenate([[True], np.diff(timeline) != 0])]
+
+    def step(times, values, default):
+        """Value of a step function, changing at `times`, sampled on the timeline"""
+        index = np.searchsorted(times, timeline, side='right') - 1
+        return np.where(index >= 0, values[np.maximum(index, 0)] if len(values) else default, default)
+
+    equity = step(event_times, cash_after, cash).astype(float)
+    for symbol, df in klines.items():
+        mine = event_symbols == symbol
+        amount = step(event_times[mine], amounts_after[mine], 0.0)
+        entry = step(event_times[mine], entries_after[mine], 0.0)
+        margin = step(event_times[mine], margins_after[mine], 0.0)
+        # Last close at or before each timeline bar
+        bar = np.searchsorted(stamps[symbol], timeline, side='right') - 1
+        close = df['close'].to_numpy()[np.maximum(bar, 0)]
+        # Same margin equity as trading.mark_to_market, floored at zero per position
+        position_equity = np.maximum(margin + amount * (close - entry), 0.0)
+        equity += np.where(bar >= 0, position_equity, 0.0)
+    return equity, timeline
+
+
+def performance_metrics(equity, ledger, interval):
+    """Return, drawdown, Sharpe and trade stats for an equity curve and its trade ledger"""
+    returns = np.diff(equity) / equity[:-1] if len(equity) > 1 else np.array([])
+    std = returns.std() if len(returns) else 0.0
+    drawdown = equity / np.maximum.accumulate(equity) - 1
+    profits = ledger.column('profit')
+    profits = profits[~np.isnan(profits)]
+    return {
+        'final_equity': float(equity[-1]),
+        'total_return_pct': float((equity[-1] / equity[0] - 1) * 100),
+        'max_drawdown_pct': float(drawdown.min() * 100),
+        'sharpe': float(returns.mean() / std * np.sqrt(BARS_PER_YEAR.get(interval, 525600))) if std > 0 else 0.0,
+        'trades': len(ledger),
+        'win_rate_pct': float((profits > 0).mean() * 100) if len(profits) else 0.0,
+    }
+
+
+def load_signal(spec):
+    """Import a signal function given as "module:function" """
+    module_name, _, function_name = spec.partition(':')
+    return getattr(importlib.import_module(module_name), function_name or 'signal')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--data-dir', default='data')
+    parser.add_argument('--symbols', nargs='+', default=['BTC', 'ETH'])
+    parser.add_argument('--interval', default='1m')
+    parser.add_argument('--strategy', default='Aggressive', choices=list(STRATEGY_PRESETS))
+    parser.add_argument('--leverage', type=float, default=1.0)
+    parser.add_argument('--risk', type=float, default=5.0, help="Percent of cash committed per entry")
+    parser.add_argument('--cash', type=float, default=trading.STARTING_CASH)
+    parser.add_argument('--signal', help="Custom signal function as module:function")
+    parser.add_argument('--equity-out', help="Write the equity curve to this CSV file")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    klines = load_dataset(args.data_dir, args.symbols, args.interval)
+    loaded = time.perf_counter()
+    signal_fn = load_signal(args.signal) if args.signal else momentum_signal
+    result = run_backtest(klines, signal_fn, args.strategy, args.leverage, args.risk,
+                          args.cash, args.interval)
+    finished = time.perf_counter()
+
+    bars = sum(len(df) for df in klines.values())
+    print(f"{bars:,} bars across {len(klines)} symbols "
+          f"(load {loaded - started:.2f}s, backtest {finished - loaded:.2f}s)")
+    for name, value in result['metrics'].items():
+        print(f"  {name:>18}: {value:,.2f}" if isinstance(value, float) else f"  {name:>18}: {value}")
+    if args.equity_out:
+        result['equity'].to_csv(args.equity_out)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,264 @@
+"""Benchmark the data, trading, prompt and page-render paths offline.
+
+Market data and chat completions come from a local fixture server
+(fixture_server.py), so results depend only on this machine. Run from
+the repository root:
+
+    python benchmarks/bench_app.py --save baseline.json
+    python benchmarks/bench_app.py --compare baseline.json
+    python benchmarks/bench_app.py --synthetic-load --only trade render
+
+--synthetic-load scales to 200 symbols and positions and a million-fill
+trade history unless those are given explicitly.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import market_data  # noqa: E402
+import trading  # noqa: E402
+from fixture_server import BASE_PRICES, FixtureServer  # noqa: E402
+from kline_store import KlineStore  # noqa: E402
+from llm import call_ai_api, stream_ai_api  # noqa: E402
+from persistence import PortfolioStore  # noqa: E402
+from profiler import profiler  # noqa: E402
+from prompts import market_overview, recommendation_prompt  # noqa: E402
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app.py')
+
+GROUPS = ('data', 'trade', 'prompt', 'llm', 'render')
+
+SYNTHETIC_LOAD = {'symbols': 200, 'positions': 200, 'fills': 1_000_000}
+DEFAULTS = {'symbols': 8, 'positions': 8, 'fills': 10_000}
+
+
+def measure(function, rounds, number=1, warmup=1):
+    """Per-call durations in seconds: `rounds` samples, each the mean of `number` calls"""
+    for _ in range(warmup):
+        function()
+    samples = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        for _ in range(number):
+            function()
+        samples.append((time.perf_counter() - started) / number)
+    return samples
+
+
+def summarize(name, samples, **extra):
+    samples = np.array(samples)
+    return {'name': name, 'rounds': len(samples), 'min': float(samples.min()),
+            'median': float(np.median(samples)), 'p95': float(np.quantile(samples, 0.95)), **extra}
+
+
+def symbol_names(n):
+    """The app's eight pairs, then synthetic ones the fixture server makes up"""
+    names = list(BASE_PRICES)[:n]
+    return names + [f"SYN{i:03d}" for i in range(n - len(names))]
+
+
+def build_portfolio(symbols, positions, fills, prices):
+    """A portfolio with `fills` round-trip fills on BTC, then one open position per symbol"""
+    portfolio = trading.new_portfolio(cash=1_000_000.0)
+    for i in range(fills):
+        action = 'BUY' if i % 2 == 0 else 'SELL'
+        trading.execute_trade(portfolio, action, 'BTC', 0.001, prices['BTC'], 1.0, 1_700_000_000_000 + i * 1000)
+    for i, symbol in enumerate(symbols[:positions]):
+        action = 'BUY' if i % 3 else 'SELL'
+        trading.execute_trade(portfolio, action, symbol, 1000 / prices[symbol], prices[symbol], 1 + i % 5)
+    return portfolio
+
+
+def bench_data(args, server, symbols):
+    rows = server.fixtures.rows('BTCUSDT', '1h')
+    results = [summarize('parse_klines 1000 candles', measure(lambda: market_data.parse_klines(rows), args.rounds))]
+
+    def cold():
+        # A fresh cache per call: HTTP round trip plus parsing, as on a cache miss
+        market_data.KlineCache().get('BTC', '1h', 100)
+    results.append(summarize('get_market_data cold', measure(cold, args.rounds)))
+    results.append(summarize('get_market_data warm',
+                             measure(lambda: market_data.get_market_data('BTC', '1h', 100), args.rounds, 100)))
+
+    def fetch_all():
+        market_data.kline_cache = market_data.KlineCache()
+        market_data.fetch_symbol_data(symbols, '1h', 100, deadline=60)
+    warm_cache = market_data.kline_cache
+    results.append(summarize(f'fetch_symbol_data {len(symbols)} symbols cold', measure(fetch_all, args.rounds)))
+    market_data.kline_cache = warm_cache
+    return results
+
+
+def bench_trade(args, portfolio, prices):
+    get_price = prices.get
+    n = len(portfolio['positions'])
+    results = [summarize(f'calculate_portfolio_value {n} positions',
+                         measure(lambda: trading.calculate_portfolio_value(portfolio, get_price), args.rounds, 10))]
+
+    counter = iter(range(10 ** 12))
+
+    def trade():
+        i = next(counter)
+        trading.execute_trade(portfolio, 'BUY' if i % 2 == 0 else 'SELL', 'BTC', 0.001, prices['BTC'], 1.0)
+    samples = measure(trade, args.rounds, 1000)
+    results.append(summarize(f"execute_trade after {len(portfolio['trade_history']):,} fills", samples,
+                             ops_per_second=1 / float(np.median(samples))))
+    return results
+
+
+def bench_prompt(args, symbols, portfolio):
+    prices, frames = market_data.fetch_symbol_data(symbols, '1h', 100, deadline=60)
+
+    def build():
+        context, _, _ = market_overview(symbols, prices, frames)
+        return recommendation_prompt(context, portfolio, 10)
+    prompt = build()
+    return [summarize(f'prompt build {len(symbols)} symbols', measure(build, args.rounds),
+                      prompt_chars=len(prompt))]
+
+
+def bench_llm(args, server):
+    base_url = server.openai_url
+
+    def stream():
+        for _ in stream_ai_api("prompt", "key", base_url, "bench"):
+            pass
+    return [summarize('call_ai_api stub', measure(lambda: call_ai_api("prompt", "key", base_url, "bench"),
+                                                  args.rounds)),
+            summarize('stream_ai_api stub', measure(stream, args.rounds))]
+
+
+def bench_render(args, server, store, portfolio):
+    """Time Streamlit reruns of the app against the fixture server, with `portfolio` as its account"""
+    from streamlit.testing.v1 import AppTest
+
+    # Stored like any account, so the app recovers the whole history from one snapshot
+    staged = store.load('bench', cash=portfolio['start_value'])
+    staged.update(cash=portfolio['cash'], positions=portfolio['positions'], trade_history=portfolio['trade_history'])
+    store.record('bench', staged)
+    store.snapshot('bench', staged)
+    store.flush()
+
+    app = AppTest.from_file(APP_PATH, default_timeout=600)
+    started = time.perf_counter()
+    app.run()
+    first = time.perf_counter() - started
+    # The main page only renders once a provider is configured
+    next(box for box in app.sidebar.selectbox if box.label == "AI Model Provider").select("Custom API").run()
+    for label, value in (("Paper Account", 'bench'), ("API Key", "key"), ("Base URL", server.openai_url),
+                         ("Model Name", "bench")):
+        next(box for box in app.sidebar.text_input if box.label == label).input(value)
+    for label in ("Live WebSocket prices", "Cache AI responses"):
+        next(box for box in app.sidebar.checkbox if box.label == label).uncheck()
+    app.run()
+    if app.exception:
+        raise RuntimeError(app.exception[0].message)
+
+    profiler.reset()
+    results = [summarize('render first run', [first]),
+               summarize(f"render rerun {len(portfolio['positions'])} positions, "
+                         f"{len(portfolio['trade_history']):,} fills", measure(app.run, args.rounds))]
+    # Where the rerun time goes, from the app's own profiler laps
+    for row in profiler.table():
+        if row['section'].startswith('render.') and row['section'] != 'render.total':
+            results.append({'name': f"  {row['section']}", 'rounds': row['count'], 'min': None,
+                            'median': row['p50_ms'] / 1000, 'p95': row['p95_ms'] / 1000})
+
+    def recommend():
+        next(button for button in app.button if "Recommendation" in button.label).click().run()
+    results.append(summarize('render AI recommendation (stub LLM)', measure(recommend, max(3, args.rounds // 4))))
+    return results
+
+
+def report(results, baseline=None):
+    baseline = {row['name']: row for row in (baseline or [])}
+    print(f"{'benchmark':58} {'median':>11} {'p95':>11} {'min':>11} {'vs base':>8}")
+    for row in results:
+        base = baseline.get(row['name'])
+        change = f"{(row['median'] / base['median'] - 1) * 100:+.1f}%" if base and base['median'] else ""
+        cells = [format_seconds(row[key]) for key in ('median', 'p95', 'min')]
+        print(f"{row['name'][:58]:58} {cells[0]:>11} {cells[1]:>11} {cells[2]:>11} {change:>8}")
+
+
+def format_seconds(seconds):
+    if seconds is None:
+        return ""
+    if seconds < 1e-3:
+        return f"{seconds * 1e6:.1f} us"
+    if seconds < 1:
+        return f"{seconds * 1e3:.2f} ms"
+    return f"{seconds:.2f} s"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--only', nargs='+', choices=GROUPS, default=list(GROUPS))
+    parser.add_argument('--rounds', type=int, default=20)
+    parser.add_argument('--symbols', type=int)
+    parser.add_argument('--positions', type=int)
+    parser.add_argument('--fills', type=int, help="Trade history length before the trading and render benchmarks")
+    parser.add_argument('--synthetic-load', action='store_true',
+                        help="Default to many symbols and positions and a long trade history")
+    parser.add_argument('--save', help="Write results as JSON, e.g. a baseline")
+    parser.add_argument('--compare', help="Baseline JSON from --save to compare medians against")
+    args = parser.parse_args()
+    for key, value in (SYNTHETIC_LOAD if args.synthetic_load else DEFAULTS).items():
+        if getattr(args, key) is None:
+            setattr(args, key, value)
+
+    server = FixtureServer().start()
+    directory = tempfile.mkdtemp(prefix='bench-app-')
+    # The app reads these when it starts; the cache is pointed away from the real data directory too
+    os.environ['BINANCE_API_URL'] = market_data.BINANCE_API = server.binance_url
+    os.environ['PORTFOLIO_DB_PATH'] = os.path.join(directory, 'portfolio.db')
+    os.environ['LLM_CACHE_PATH'] = os.path.join(directory, 'llm_cache.json')
+    os.environ.pop('METRICS_PATH', None)
+    market_data.kline_cache.store = KlineStore(os.path.join(directory, 'klines'))
+
+    symbols = symbol_names(args.symbols)
+    prices = {symbol: float(server.fixtures.price(f"{symbol}USDT")) for symbol in symbols}
+    recorded = server.fixtures.recorded()
+    print(f"{len(symbols)} symbols, {args.positions} positions, {args.fills:,} fills, {args.rounds} rounds")
+    print(f"klines recorded for {', '.join(recorded)}, synthetic otherwise" if recorded else
+          "klines synthetic: no recordings in benchmarks/fixtures/ (see record_fixtures.py)")
+    started = time.perf_counter()
+    portfolio = build_portfolio(symbols, args.positions, args.fills, prices)
+    print(f"built portfolio in {time.perf_counter() - started:.1f}s\n")
+
+    results = []
+    if 'data' in args.only:
+        results += bench_data(args, server, symbols)
+    if 'trade' in args.only:
+        results += bench_trade(args, portfolio, prices)
+    if 'prompt' in args.only:
+        results += bench_prompt(args, symbols, portfolio)
+    if 'llm' in args.only:
+        results += bench_llm(args, server)
+    if 'render' in args.only:
+        store = PortfolioStore(os.environ['PORTFOLIO_DB_PATH'])
+        results += bench_render(args, server, store, portfolio)
+        store.close()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+    report(results, baseline)
+    if args.save:
+        config = {key: getattr(args, key) for key in ('symbols', 'positions', 'fills', 'rounds')}
+        # Medians over recorded and synthetic klines are not comparable
+        config['recorded'] = recorded
+        with open(args.save, 'w') as f:
+            json.dump({'config': config, 'results': results}, f, indent=2)
+    server.stop()
+
+
+if __name__ == '__main__':
+    main()
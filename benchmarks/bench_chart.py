@@ -0,0 +1,90 @@
+"""Chart build, update and payload cost as the Market Analysis lookback grows.
+
+Fills a temporary kline store with a year of synthetic 1m candles, then
+for each lookback times the downsampled chart (charting.CandleChart)
+against the old full-resolution candlestick figure. Run from the
+repository root:
+
+    python benchmarks/bench_chart.py --days 365 --naive-days 30
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import plotly.graph_objects as go
+from plotly.subplots import make_subplots
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import charting  # noqa: E402
+from bench_app import format_seconds, measure  # noqa: E402
+from fixture_server import synthetic_klines  # noqa: E402
+from kline_store import KlineStore  # noqa: E402
+from market_data import parse_klines  # noqa: E402
+
+
+def naive_figure(df):
+    """The figure the Market Analysis tab used to build: every candle, SVG traces"""
+    fig = make_subplots(rows=2, cols=1, row_heights=[0.7, 0.3], vertical_spacing=0.05)
+    fig.add_trace(go.Candlestick(x=df['timestamp'], open=df['open'], high=df['high'], low=df['low'],
+                                 close=df['close'], name='Price'), row=1, col=1)
+    fig.add_trace(go.Bar(x=df['timestamp'], y=df['volume'], name='Volume'), row=2, col=1)
+    fig.update_layout(height=600, xaxis_rangeslider_visible=False, template='plotly_dark')
+    return fig
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--days', type=int, default=365, help="Days of 1m history to store")
+    parser.add_argument('--naive-days', type=int, default=30,
+                        help="Longest lookback to also time at full resolution")
+    parser.add_argument('--width', type=int, default=charting.DEFAULT_WIDTH)
+    parser.add_argument('--rounds', type=int, default=10)
+    args = parser.parse_args()
+
+    store = KlineStore(tempfile.mkdtemp(prefix='bench-chart-'))
+    now = time.time()
+    started = time.perf_counter()
+    rows = synthetic_klines('BTCUSDT', '1m', args.days * 1440, end=int(now * 1000))
+    # Stored as closed, so the store's newest candle is also the live one
+    store.append('BTC', '1m', parse_klines(rows), now=now + 60)
+    print(f"stored {len(rows):,} 1m candles in {time.perf_counter() - started:.1f}s\n")
+
+    def klines(symbol, interval, limit):
+        # Stands in for the live window; the store holds the same candles
+        return store.read(symbol, interval, limit=limit)
+
+    print(f"{'lookback':10} {'style':8} {'candles':>9} {'points':>7} {'build':>10} {'update':>10} "
+          f"{'json':>10} {'payload':>10}")
+    for label, lookback in charting.LOOKBACKS.items():
+        if lookback > args.days * charting.DAY_MS:
+            break
+        candles = lookback // 60_000
+        for style in ('Candles', 'Line'):
+            def build():
+                return charting.CandleChart('BTC', '1m', lookback, args.width, style).update(store, klines, now=now)
+            chart = charting.CandleChart('BTC', '1m', lookback, args.width, style)
+            figure = chart.update(store, klines, now=now)
+            update = measure(lambda: chart.update(store, klines, now=now), args.rounds)
+            to_json = measure(figure.to_json, args.rounds)
+            points = len(chart.frame) if chart.line is None else len(chart.line[0])
+            print(f"{label:10} {style:8} {candles:>9,} {points:>7,} "
+                  f"{format_seconds(float(np.median(measure(build, args.rounds)))):>10} "
+                  f"{format_seconds(float(np.median(update))):>10} "
+                  f"{format_seconds(float(np.median(to_json))):>10} {len(figure.to_json()) / 1e3:>8.0f}kB")
+
+        if lookback <= args.naive_days * charting.DAY_MS:
+            df = store.read('BTC', '1m', limit=candles)
+            build = measure(lambda: naive_figure(df), max(1, args.rounds // 5))
+            figure = naive_figure(df)
+            to_json = measure(figure.to_json, max(1, args.rounds // 5))
+            print(f"{label:10} {'naive':8} {candles:>9,} {len(df):>7,} "
+                  f"{format_seconds(float(np.median(build))):>10} {'':>10} "
+                  f"{format_seconds(float(np.median(to_json))):>10} {len(figure.to_json()) / 1e3:>8.0f}kB")
+
+
+if __name__ == '__main__':
+    main()
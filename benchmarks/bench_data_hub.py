@@ -0,0 +1,92 @@
+"""Compare upstream load with and without the shared data hub as concurrent sessions grow.
+
+Each simulated session reruns the app's data path every `--interval`
+seconds: a price snapshot of its symbols, 24h klines per symbol and a
+week of klines for one. Requests go to the local fixture server. Run
+from the repository root:
+
+    python benchmarks/bench_data_hub.py --sessions 1 10 50 --seconds 10
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import market_data  # noqa: E402
+from data_hub import DataHub  # noqa: E402
+from fixture_server import FixtureServer  # noqa: E402
+
+SYMBOLS = ['BTC', 'ETH', 'SOL', 'BNB', 'DOGE', 'XRP', 'ADA', 'AVAX']
+
+
+def session_loop(index, hub, stop, interval, reruns):
+    """One browser session; a rotating pair of symbols, so sessions overlap without matching"""
+    symbols = [SYMBOLS[index % len(SYMBOLS)], SYMBOLS[(index + 1) % len(SYMBOLS)], 'BTC']
+    # Spread the sessions' reruns over the interval like independent users
+    time.sleep(interval * index / 97 % interval)
+    while not stop.is_set():
+        if hub is None:
+            snapshot = market_data.PriceSnapshot(symbols)
+            klines = market_data.get_market_data
+        else:
+            hub.subscribe(index, symbols)
+            snapshot = market_data.PriceSnapshot(symbols, fetch=hub.prices)
+            klines = hub.klines
+        for symbol in symbols:
+            snapshot.get(symbol)
+            klines(symbol, '1h', 24)
+        klines(symbols[0], '1h', 168)
+        reruns[index] += 1
+        stop.wait(interval)
+
+
+def run(sessions, seconds, interval, server, use_hub):
+    # A cold kline cache per run, so both modes start from the same state
+    market_data.kline_cache = market_data.KlineCache()
+    hub = DataHub(cache=market_data.kline_cache) if use_hub else None
+    stop = threading.Event()
+    reruns = [0] * sessions
+    threads = [threading.Thread(target=session_loop, args=(i, hub, stop, interval, reruns), daemon=True)
+               for i in range(sessions)]
+    before = server.requests
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    upstream = server.requests - before
+    return {'reruns': sum(reruns), 'upstream': upstream, 'per_minute': upstream * 60 / elapsed,
+            'stats': hub.stats() if hub else None}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sessions', type=int, nargs='+', default=[1, 10, 50])
+    parser.add_argument('--seconds', type=float, default=10.0)
+    parser.add_argument('--interval', type=float, default=1.0, help="Seconds between a session's reruns")
+    parser.add_argument('--latency', type=float, default=0.02, help="Simulated upstream latency per request")
+    args = parser.parse_args()
+
+    server = FixtureServer(latency=args.latency).start()
+    market_data.BINANCE_API = server.binance_url
+
+    print(f"{'sessions':>8} {'mode':>6} {'reruns':>7} {'upstream':>9} {'req/min':>8} {'fan-in':>7} {'collapsed':>9}")
+    for sessions in args.sessions:
+        for use_hub in (False, True):
+            result = run(sessions, args.seconds, args.interval, server, use_hub)
+            stats = result['stats']
+            fan_in = f"{stats['fan_in']:.1f}" if stats and stats['fan_in'] else ""
+            collapsed = stats['collapsed'] if stats else ""
+            print(f"{sessions:>8} {'hub' if use_hub else 'direct':>6} {result['reruns']:>7} "
+                  f"{result['upstream']:>9} {result['per_minute']:>8.0f} {fan_in:>7} {collapsed:>9}")
+    server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""Time full and incremental indicator computation on synthetic klines.
+
+Run from the repository root:
+
+    python benchmarks/bench_indicators.py --candles 10000 --symbols 8
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from indicators import TAIL_ROWS, compute  # noqa: E402
+
+
+def synthetic_klines(n, seed=0):
+    """Random-walk 1m candles shaped like get_market_data() output"""
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.001, n)))
+    spread = np.abs(rng.normal(0, 0.001, n)) * close
+    return pd.DataFrame({
+        'timestamp': pd.date_range('2024-01-01', periods=n, freq='min'),
+        'open': np.roll(close, 1),
+        'high': close + spread,
+        'low': close - spread,
+        'close': close,
+        'volume': rng.lognormal(3, 1, n),
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--candles', type=int, default=10_000)
+    parser.add_argument('--symbols', type=int, default=8)
+    parser.add_argument('--updates', type=int, default=100, help="Incremental updates to time")
+    args = parser.parse_args()
+
+    full_times, append_times = [], []
+    for seed in range(args.symbols):
+        klines = synthetic_klines(args.candles + args.updates, seed)
+        history = klines.iloc[:args.candles]
+
+        started = time.perf_counter()
+        frame = compute(history)
+        full_times.append(time.perf_counter() - started)
+
+        # New candles extend the computed history from its smoothing state, as the chart does
+        started = time.perf_counter()
+        for end in range(args.candles, args.candles + args.updates):
+            frame = pd.concat([frame, compute(klines.iloc[end:end + 1], frame.iloc[-TAIL_ROWS:])],
+                              ignore_index=True)
+        append_times.append((time.perf_counter() - started) / args.updates)
+
+    print(f"{args.symbols} symbols x {args.candles:,} candles")
+    print(f"  full compute:   {np.mean(full_times) * 1000:8.2f} ms/symbol")
+    print(f"  append candle:  {np.mean(append_times) * 1000:8.2f} ms/symbol/update")
+
+if __name__ == '__main__':
+    main()
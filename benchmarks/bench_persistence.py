@@ -0,0 +1,81 @@
+"""Time fill commits and account recovery in the portfolio store.
+
+Run from the repository root:
+
+    python benchmarks/bench_persistence.py --fills 1000000 --snapshot-every 10000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import trading  # noqa: E402
+from persistence import PortfolioStore  # noqa: E402
+
+
+def trade(portfolio, i, price):
+    """Alternate buying and selling a small amount so every fill succeeds"""
+    action = 'BUY' if i % 2 == 0 else 'SELL'
+    return trading.execute_trade(portfolio, action, 'BTC', 0.001, price, 1.0, 1_700_000_000_000 + i * 1000)
+
+
+def percentile_ms(samples, q):
+    return np.percentile(samples, q) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--fills', type=int, default=1_000_000)
+    parser.add_argument('--commits', type=int, default=200, help="Single fills committed one at a time")
+    parser.add_argument('--snapshot-every', type=int, default=10_000)
+    parser.add_argument('--dir', help="Directory for the database (default: a temporary one)")
+    args = parser.parse_args()
+
+    directory = args.dir or tempfile.mkdtemp(prefix='bench-store-')
+    path = os.path.join(directory, 'portfolio.db')
+    store = PortfolioStore(path, snapshot_every=args.snapshot_every)
+    rng = np.random.default_rng(0)
+
+    # Latency from execute_trade until the fill is fsynced, one fill per commit
+    portfolio = store.load('latency')
+    latencies = []
+    for i in range(args.commits):
+        started = time.perf_counter()
+        trade(portfolio, i, 60000 + rng.normal())
+        store.record('latency', portfolio)
+        store.flush()
+        latencies.append(time.perf_counter() - started)
+    print(f"commit latency per fill: p50 {percentile_ms(latencies, 50):.2f} ms, "
+          f"p99 {percentile_ms(latencies, 99):.2f} ms")
+
+    # Throughput with group commit, as a busy agent would write
+    portfolio = store.load('bulk')
+    prices = 60000 + rng.normal(0, 10, args.fills)
+    started = time.perf_counter()
+    for i in range(args.fills):
+        trade(portfolio, i, prices[i])
+        store.record('bulk', portfolio)
+    store.flush()
+    elapsed = time.perf_counter() - started
+    print(f"{args.fills:,} fills written in {elapsed:.1f}s ({args.fills / elapsed:,.0f} fills/s, "
+          f"{elapsed / args.fills * 1e6:.1f} us/fill incl. execute_trade)")
+    store.close()
+    print(f"database size: {sum(os.path.getsize(os.path.join(directory, f)) for f in os.listdir(directory)) / 1e6:.0f} MB")
+
+    # Recovery in a fresh store, as after a restart
+    started = time.perf_counter()
+    recovered = PortfolioStore(path).load('bulk')
+    elapsed = time.perf_counter() - started
+    assert len(recovered['trade_history']) == args.fills
+    assert abs(recovered['cash'] - portfolio['cash']) < 1e-6
+    print(f"recovered {args.fills:,} fills in {elapsed:.2f}s "
+          f"(replayed {args.fills - recovered['snapshotted']:,} after the last snapshot)")
+
+
+if __name__ == '__main__':
+    main()
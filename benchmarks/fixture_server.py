@@ -0,0 +1,218 @@
+"""Offline stand-in for the Binance REST API and an OpenAI-compatible chat server.
+
+Klines are served from recorded fixtures (see record_fixtures.py) in
+benchmarks/fixtures/, and for symbols without one from a seeded random
+walk in the same wire format, so any number of symbols can be served.
+No recordings are checked in, so by default every series is synthetic;
+record_fixtures.py fetches real ones when Binance is reachable.
+Point the app or agent at it with BINANCE_API_URL=<server.binance_url>
+and the Custom API provider at <server.openai_url>.
+"""
+import json
+import os
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+import numpy as np
+
+from kline_store import INTERVAL_MS
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+# Start prices of synthetic symbols; others start at 1.0
+BASE_PRICES = {'BTC': 65000.0, 'ETH': 3200.0, 'SOL': 150.0, 'BNB': 600.0,
+               'DOGE': 0.15, 'XRP': 0.5, 'ADA': 0.4, 'AVAX': 30.0}
+
+CHAT_REPLY = """TRADE SIGNAL: BUY
+SYMBOL: BTC
+AMOUNT: $1000
+LEVERAGE: 3x
+ENTRY: $65000
+TARGET: $67000 (3% profit)
+STOP LOSS: $64000
+REASONING: Strong momentum with rising volume above the 20-period average
+CONFIDENCE: 8"""
+
+JSON_REPLY = json.dumps({'action': 'BUY', 'symbol': 'BTC', 'amount_usd': 1000, 'leverage': 3, 'entry': 65000,
+                         'target': 67000, 'stop_loss': 64000, 'confidence': 8,
+                         'reasoning': "Strong momentum with rising volume above the 20-period average"})
+
+
+def fixture_path(pair, interval, directory=FIXTURE_DIR):
+    return os.path.join(directory, f"{pair}-{interval}.json")
+
+
+def synthetic_klines(pair, interval, n=1000, end=None):
+    """`n` raw Binance kline rows ending at the open time `end` (ms), seeded by the pair"""
+    step = INTERVAL_MS[interval]
+    end = (int(time.time() * 1000) if end is None else end) // step * step
+    rng = np.random.default_rng(zlib.crc32(f"{pair}-{interval}".encode()))
+    close = BASE_PRICES.get(pair[:-len('USDT')], 1.0) * np.exp(np.cumsum(rng.normal(0, 0.004, n)))
+    opens = np.concatenate([[close[0]], close[:-1]])
+    spread = np.abs(rng.normal(0, 0.002, n)) * close
+    volume = rng.lognormal(5, 1, n)
+    times = end - step * np.arange(n - 1, -1, -1)
+    return [[int(t), f"{o:.8f}", f"{max(o, c) + s:.8f}", f"{min(o, c) - s:.8f}", f"{c:.8f}", f"{v:.8f}",
+             int(t) + step - 1, f"{v * c:.8f}", int(v), f"{v / 2:.8f}", f"{v * c / 2:.8f}", "0"]
+            for t, o, c, s, v in zip(times, opens, close, spread, volume)]
+
+
+class Fixtures:
+    """Raw kline rows per (pair, interval), loaded or synthesized on first use"""
+
+    def __init__(self, directory=FIXTURE_DIR, candles=1000):
+        self.directory = directory
+        self.candles = candles
+        self.klines = {}
+        self.lock = threading.Lock()
+
+    def rows(self, pair, interval):
+        key = (pair, interval)
+        with self.lock:
+            if key not in self.klines:
+                path = fixture_path(pair, interval, self.directory)
+                if os.path.exists(path):
+                    with open(path) as f:
+                        self.klines[key] = json.load(f)
+                else:
+                    self.klines[key] = synthetic_klines(pair, interval, self.candles)
+            return self.klines[key]
+
+    def price(self, pair):
+        return self.rows(pair, '1m')[-1][4]
+
+    def recorded(self):
+        """Names of the recorded fixture files, e.g. 'BTCUSDT-1m'; empty if every series is synthetic"""
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return []
+        return sorted(name[:-len('.json')] for name in names if name.endswith('.json'))
+
+
+class FixtureServer:
+    """Serve /api/v3/klines, /api/v3/ticker/price and /v1/chat/completions on a local port
+
+    Market data answers after `latency` seconds, like a remote API.
+    Chat completions answer with a canned trade signal, streamed as SSE
+    when asked, after `first_token` seconds and `token_delay` between
+    words, so render benchmarks can include the LLM path without a network.
+    With `drop_after`, streams are cut off after that many words without
+    finishing the chunked body, like a dropped connection.
+    """
+
+    def __init__(self, fixtures=None, port=0, latency=0.0, first_token=0.0, token_delay=0.0, drop_after=None):
+        self.fixtures = fixtures or Fixtures()
+        self.latency = latency
+        self.first_token = first_token
+        self.token_delay = token_delay
+        self.drop_after = drop_after
+        self.requests = 0
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), self._handler())
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, name='fixture-server', daemon=True)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    @property
+    def binance_url(self):
+        return f"{self.url}/api/v3"
+
+    @property
+    def openai_url(self):
+        return f"{self.url}/v1"
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def klines(self, query):
+        rows = self.fixtures.rows(query['symbol'], query['interval'])
+        limit = int(query.get('limit', 500))
+        if 'startTime' in query:
+            start = int(query['startTime'])
+            return [row for row in rows if row[0] >= start][:limit]
+        return rows[-limit:]
+
+    def tickers(self, query):
+        if 'symbols' in query:
+            return [{'symbol': pair, 'price': self.fixtures.price(pair)} for pair in json.loads(query['symbols'])]
+        return {'symbol': query['symbol'], 'price': self.fixtures.price(query['symbol'])}
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Headers and body go out as separate writes; Nagle would hold the body back
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                server.requests += 1
+                time.sleep(server.latency)
+                url = urlsplit(self.path)
+                query = dict(parse_qsl(url.query))
+                if url.path.endswith('/klines'):
+                    self._json(server.klines(query))
+                elif url.path.endswith('/ticker/price'):
+                    self._json(server.tickers(query))
+                else:
+                    self._json({'msg': f"Unknown path {url.path}"}, 404)
+
+            def do_POST(self):
+                server.requests += 1
+                body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                json_mode = body.get('response_format', {}).get('type') == 'json_object'
+                reply = JSON_REPLY if json_mode else CHAT_REPLY
+                usage = {'prompt_tokens': len(json.dumps(body['messages'])) // 4,
+                         'completion_tokens': len(reply.split(' '))}
+                if not body.get('stream'):
+                    time.sleep(server.first_token)
+                    self._json({'choices': [{'message': {'role': 'assistant', 'content': reply}}], 'usage': usage})
+                    return
+
+                # Streaming servers answer with headers at once and then think
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.end_headers()
+                self.wfile.flush()
+                time.sleep(server.first_token)
+                words = reply.split(' ')
+                for i, word in enumerate(words):
+                    if i == server.drop_after:
+                        self.close_connection = True
+                        return
+                    delta = word if i == len(words) - 1 else word + ' '
+                    self._chunk({'choices': [{'delta': {'content': delta}}]})
+                    time.sleep(server.token_delay)
+                self._chunk({'choices': [], 'usage': usage})
+                self._chunk('[DONE]')
+                self.wfile.write(b'0\r\n\r\n')
+
+            def _json(self, data, status=200):
+                payload = json.dumps(data).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _chunk(self, data):
+                line = f"data: {data if isinstance(data, str) else json.dumps(data)}\n\n".encode()
+                self.wfile.write(b'%x\r\n%s\r\n' % (len(line), line))
+                self.wfile.flush()
+
+        return Handler
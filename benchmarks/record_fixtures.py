@@ -0,0 +1,37 @@
+"""Record Binance klines as fixtures for the offline benchmark server.
+
+Needs network access to Binance; run from the repository root:
+
+    python benchmarks/record_fixtures.py --symbols BTC ETH SOL --intervals 1m 1h --limit 1000
+"""
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fixture_server import FIXTURE_DIR, fixture_path  # noqa: E402
+from market_data import MAX_KLINES_PER_REQUEST, fetch_klines  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--symbols', nargs='+', default=['BTC', 'ETH', 'SOL', 'BNB', 'DOGE', 'XRP', 'ADA', 'AVAX'])
+    parser.add_argument('--intervals', nargs='+', default=['1m', '1h'])
+    parser.add_argument('--limit', type=int, default=MAX_KLINES_PER_REQUEST)
+    parser.add_argument('--dir', default=FIXTURE_DIR)
+    args = parser.parse_args()
+
+    os.makedirs(args.dir, exist_ok=True)
+    for symbol in args.symbols:
+        for interval in args.intervals:
+            rows = fetch_klines(symbol, interval, args.limit)
+            path = fixture_path(f"{symbol}USDT", interval, args.dir)
+            with open(path, 'w') as f:
+                json.dump(rows, f, separators=(',', ':'))
+            print(f"{path}: {len(rows)} candles")
+
+
+if __name__ == '__main__':
+    main()
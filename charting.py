@@ -0,0 +1,359 @@
+"""Price charts over long kline histories, downsampled server-side.
+
+Candles are aggregated into time-aligned buckets that keep each bucket's
+open, high, low, close and volume, sized so a chart holds about one bar
+per few pixels of its width however long the window. Line charts pick
+one close per bucket with Largest-Triangle-Three-Buckets. Lines are
+drawn with WebGL traces; Plotly has none for candlesticks or bars.
+"""
+import math
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+from plotly.subplots import make_subplots
+
+from http_client import HttpError
+from indicators import TAIL_ROWS, compute
+from kline_store import INTERVAL_MS
+from market_data import MAX_KLINES_PER_REQUEST, backfill_klines, fetch_pool, get_market_data
+from profiler import profiler
+
+DAY_MS = 86_400_000
+
+# A failed catch-up download is retried after this many seconds
+CATCH_UP_RETRY = 60.0
+
+# Chart windows; backfill this many days of 1m candles to chart them at full detail
+LOOKBACKS = {
+    '1 Day': DAY_MS, '1 Week': 7 * DAY_MS, '1 Month': 30 * DAY_MS,
+    '3 Months': 90 * DAY_MS, '6 Months': 180 * DAY_MS, '1 Year': 365 * DAY_MS
+}
+
+# Source intervals, finest first
+CHART_INTERVALS = ['1m', '5m', '15m', '1h', '4h', '1d']
+
+CHART_WIDTHS = [600, 1200, 2400]
+DEFAULT_WIDTH = 1200
+
+# Narrowest candle drawn, in pixels; line charts get a point per pixel
+CANDLE_PIXELS = 3
+
+CANDLE_COLUMNS = ['timestamp', 'open', 'high', 'low', 'close', 'volume']
+
+OVERLAYS = [
+    ('ema_20', 'EMA 20', dict(color='#f5a623', width=1.5)),
+    ('ema_50', 'EMA 50', dict(color='#4a90e2', width=1.5)),
+    ('bb_upper', 'BB Upper', dict(color='rgba(200,200,200,0.5)', width=1, dash='dot')),
+    ('bb_lower', 'BB Lower', dict(color='rgba(200,200,200,0.5)', width=1, dash='dot'))
+]
+
+
+def chart_interval(symbol, lookback_ms, store=None, now=None):
+    """Finest interval whose candles cover the window in one klines request, or from the store"""
+    start = int((now or time.time()) * 1000) - lookback_ms
+    for interval in CHART_INTERVALS:
+        if lookback_ms // INTERVAL_MS[interval] < MAX_KLINES_PER_REQUEST:
+            return interval
+        try:
+            first = None if store is None else store.first_open_time(symbol, interval)
+        except (OSError, ValueError):
+            first = None
+        if first is not None and first <= start:
+            return interval
+    return CHART_INTERVALS[-1]
+
+
+def bucket_size(interval, lookback_ms, points):
+    """Bucket length in ms, a whole number of candles, that fits the window into `points` buckets"""
+    step = INTERVAL_MS[interval]
+    return step * max(1, math.ceil(lookback_ms / step / points))
+
+
+def span_label(ms):
+    """'15m', '4h' or '2d' for a whole number of minutes"""
+    for unit, size in (('d', DAY_MS), ('h', 3_600_000)):
+        if ms % size == 0:
+            return f"{ms // size}{unit}"
+    return f"{ms // 60_000}m"
+
+
+def load_candles(symbol, interval, start, store=None, klines=None, now=None):
+    """OHLCV candles from open time `start` (ms) through the forming one, or None
+
+    Timestamps are epoch ms. The newest candles come from `klines`
+    (get_market_data, or a DataHub's klines) in one request and anything
+    older from the local `store`. A store that ends before the live
+    window is caught up in the background; until then the candles have
+    a gap between the two.
+    """
+    klines = klines or get_market_data
+    step = INTERVAL_MS[interval]
+    now_ms = int((now or time.time()) * 1000)
+    wanted = max(1, (now_ms - start) // step + 1)
+
+    if store is not None and wanted > MAX_KLINES_PER_REQUEST:
+        _catch_up(store, symbol, interval, now_ms)
+    live = _candles(klines(symbol, interval, min(wanted, MAX_KLINES_PER_REQUEST)))
+
+    parts = []
+    live_start = None if live is None else int(live['timestamp'].iloc[0])
+    if store is not None and (live_start is None or start < live_start):
+        try:
+            stored = _candles(store.read(symbol, interval, start=start, end=live_start))
+        except (OSError, ValueError):
+            stored = None
+        if stored is not None:
+            parts.append(stored)
+    if live is not None:
+        parts.append(live[live['timestamp'] >= start])
+
+    candles = pd.concat(parts, ignore_index=True) if parts else None
+    return candles if candles is not None and len(candles) else None
+
+
+def aggregate_ohlc(candles, bucket_ms):
+    """Merge candles into buckets aligned to multiples of `bucket_ms`, stamped with the bucket's start"""
+    times = candles['timestamp'].to_numpy()
+    if len(times) == 0:
+        return candles[CANDLE_COLUMNS].iloc[:0].reset_index(drop=True)
+    keys = times // bucket_ms
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    ends = np.r_[starts[1:], len(times)] - 1
+    return pd.DataFrame({
+        'timestamp': keys[starts] * bucket_ms,
+        'open': candles['open'].to_numpy()[starts],
+        'high': np.maximum.reduceat(candles['high'].to_numpy(), starts),
+        'low': np.minimum.reduceat(candles['low'].to_numpy(), starts),
+        'close': candles['close'].to_numpy()[ends],
+        'volume': np.add.reduceat(candles['volume'].to_numpy(), starts),
+    })
+
+
+def lttb(times, values, bucket_ms, anchor=None):
+    """Indices of the points Largest-Triangle-Three-Buckets keeps, one per `bucket_ms` of time
+
+    Each bucket keeps the point forming the largest triangle with the
+    point kept before it and the mean of the next bucket, which keeps the
+    peaks and troughs a plain stride skips. Buckets are aligned to
+    multiples of `bucket_ms`, so appending points only changes the picks
+    of the last buckets. `anchor` is the (time, value) kept just before
+    `times`; without it the first point is kept. The last point always is.
+    """
+    n = len(times)
+    if n == 0:
+        return np.array([], dtype=np.int64)
+    keys = times // bucket_ms
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    ends = np.r_[starts[1:], n]
+    x = (times - times[0]).astype(float)
+    y = np.asarray(values, dtype=float)
+    mean_x = np.add.reduceat(x, starts) / (ends - starts)
+    mean_y = np.add.reduceat(y, starts) / (ends - starts)
+
+    picks = np.empty(len(starts), dtype=np.int64)
+    if anchor is None:
+        picks[0] = 0
+        ax, ay, first = x[0], y[0], 1
+    else:
+        ax, ay, first = float(anchor[0] - times[0]), float(anchor[1]), 0
+    for bucket in range(first, len(starts) - 1):
+        lo, hi = starts[bucket], ends[bucket]
+        cx, cy = mean_x[bucket + 1], mean_y[bucket + 1]
+        area = np.abs((ax - cx) * (y[lo:hi] - ay) - (ax - x[lo:hi]) * (cy - ay))
+        picks[bucket] = lo + int(area.argmax())
+        ax, ay = x[picks[bucket]], y[picks[bucket]]
+    picks[-1] = n - 1
+    return picks
+
+
+class CandleChart:
+    """Downsampled price and volume figure for one symbol, interval and window
+
+    The window is aggregated into buckets of `bucket_ms`, about one per
+    CANDLE_PIXELS of `width` for candles and one per pixel for lines, so
+    the figure's size is bounded by its width rather than the history.
+    The first update() builds the figure; later ones re-aggregate only
+    the last two buckets from fresh candles, extend the indicators from
+    there and drop buckets that scrolled out of the window, updating the
+    same figure's traces in place.
+    """
+
+    def __init__(self, symbol, interval, lookback_ms, width=DEFAULT_WIDTH, style='Candles'):
+        self.symbol = symbol
+        self.interval = interval
+        self.lookback_ms = lookback_ms
+        self.width = width
+        self.style = style
+        points = width if style == 'Line' else width // CANDLE_PIXELS
+        self.bucket_ms = bucket_size(interval, lookback_ms, points)
+        # Aggregated buckets with indicator columns
+        self.frame = None
+        # (times, closes) kept by LTTB, for line charts
+        self.line = None
+        self.figure = None
+        # Background catch-up of the store the figure was built during; rebuilt once it is done
+        self.catch_up = None
+
+    @profiler.timed('chart.update')
+    def update(self, store=None, klines=None, now=None):
+        """Bring the figure up to date and return it; None if no candles are available yet"""
+        now_ms = int((now or time.time()) * 1000)
+        start = (now_ms - self.lookback_ms) // self.bucket_ms * self.bucket_ms
+        if self.catch_up is not None and self.catch_up.done():
+            # The history that was downloading is stored now
+            self.frame = self.catch_up = None
+        if self.frame is None or not self._extend(store, klines, now):
+            loading = time.monotonic()
+            candles = load_candles(self.symbol, self.interval, start, store, klines, now)
+            if candles is None:
+                # Keep showing the last good figure through an outage
+                return self.figure
+            self._build(candles)
+            self.catch_up = _catch_up_since(store, self.symbol, self.interval, loading)
+
+        # Buckets older than the window scroll off the left edge
+        first = int(self.frame['timestamp'].searchsorted(start))
+        if first:
+            self.frame = self.frame.iloc[first:].reset_index(drop=True)
+        if self.line is not None:
+            times, values = self.line
+            first = int(times.searchsorted(start))
+            self.line = (times[first:], values[first:])
+        self._draw()
+        return self.figure
+
+    @property
+    def partial(self):
+        """Whether the figure shows a gap the store is still being caught up to fill"""
+        return self.catch_up is not None and not self.catch_up.done()
+
+    def _build(self, candles):
+        self.frame = compute(aggregate_ohlc(candles, self.bucket_ms))
+        if self.style == 'Line':
+            times, closes = candles['timestamp'].to_numpy(), candles['close'].to_numpy()
+            picks = lttb(times, closes, self.bucket_ms)
+            self.line = (times[picks], closes[picks])
+
+    def _extend(self, store, klines, now):
+        """Redo the last two buckets from fresh candles; False if the frame has to be rebuilt"""
+        if len(self.frame) < TAIL_ROWS + 2:
+            return False
+        tail = int(self.frame['timestamp'].iloc[-2])
+        candles = load_candles(self.symbol, self.interval, tail, store, klines, now)
+        if candles is None or candles['timestamp'].iloc[0] >= tail + self.bucket_ms:
+            return False
+
+        kept = self.frame.iloc[:-2]
+        fresh = compute(aggregate_ohlc(candles, self.bucket_ms), kept.iloc[-TAIL_ROWS:])
+        self.frame = pd.concat([kept, fresh], ignore_index=True)
+        if self.line is not None:
+            times, values = self.line
+            keep = int(times.searchsorted(tail))
+            anchor = (times[keep - 1], values[keep - 1]) if keep else None
+            new_times, closes = candles['timestamp'].to_numpy(), candles['close'].to_numpy()
+            picks = lttb(new_times, closes, self.bucket_ms, anchor)
+            self.line = (np.r_[times[:keep], new_times[picks]], np.r_[values[:keep], closes[picks]])
+        return True
+
+    def _draw(self):
+        if self.figure is None:
+            self.figure = self._new_figure()
+        frame = self.frame
+        times = frame['timestamp'].to_numpy().astype('datetime64[ms]')
+
+        with self.figure.batch_update():
+            price, *overlays, support, resistance, volume = self.figure.data
+            if self.line is None:
+                price.update(x=times, open=frame['open'].to_numpy(), high=frame['high'].to_numpy(),
+                             low=frame['low'].to_numpy(), close=frame['close'].to_numpy())
+            else:
+                price.update(x=self.line[0].astype('datetime64[ms]'), y=self.line[1])
+            for trace, (column, _, _) in zip(overlays, OVERLAYS):
+                trace.update(x=times, y=frame[column].to_numpy())
+            for trace, column in ((support, 'support'), (resistance, 'resistance')):
+                level = frame[column].iloc[-1]
+                trace.update(x=[times[0], times[-1]], y=[level, level], visible=not pd.isna(level))
+            volume.update(x=times, y=frame['volume'].to_numpy())
+
+    def _new_figure(self):
+        fig = make_subplots(
+            rows=2, cols=1,
+            row_heights=[0.7, 0.3],
+            shared_xaxes=True,
+            subplot_titles=(f'{self.symbol}/USDT Price', 'Volume'),
+            vertical_spacing=0.05
+        )
+        if self.style == 'Line':
+            fig.add_trace(go.Scattergl(mode='lines', name='Price', line=dict(color='#26a69a', width=1.5)),
+                          row=1, col=1)
+        else:
+            fig.add_trace(go.Candlestick(name='Price'), row=1, col=1)
+        for _, name, line in OVERLAYS:
+            fig.add_trace(go.Scattergl(mode='lines', name=name, line=line), row=1, col=1)
+        fig.add_trace(go.Scattergl(mode='lines', name='Support', line=dict(color='#2ecc71', dash='dash')),
+                      row=1, col=1)
+        fig.add_trace(go.Scattergl(mode='lines', name='Resistance', line=dict(color='#e74c3c', dash='dash')),
+                      row=1, col=1)
+        fig.add_trace(go.Bar(name='Volume', marker_color='rgba(100,100,250,0.5)'), row=2, col=1)
+        fig.update_layout(
+            height=600,
+            xaxis_rangeslider_visible=False,
+            bargap=0,
+            template='plotly_dark',
+            # Keep the user's zoom while candles update
+            uirevision=f'{self.symbol}-{self.lookback_ms}'
+        )
+        return fig
+
+
+def _catch_up_since(store, symbol, interval, since):
+    """The catch-up of this symbol and interval that is running or started after `since`, or None"""
+    if store is None:
+        return None
+    with _catch_ups_lock:
+        future, started = _catch_ups.get((store.root, symbol, interval), (None, None))
+    if future is None or (future.done() and started < since):
+        return None
+    return future
+
+
+# (store root, symbol, interval) -> (future, monotonic start time) of the latest catch-up
+_catch_ups = {}
+_catch_ups_lock = threading.Lock()
+
+
+def _catch_up(store, symbol, interval, now_ms):
+    """Start downloading stored history up to the live window, unless it is close enough or already running
+
+    A year of 1m candles is hundreds of requests, so it runs on the
+    fetch pool rather than in the render.
+    """
+    key = (store.root, symbol, interval)
+    with _catch_ups_lock:
+        future, started = _catch_ups.get(key, (None, None))
+        if future is not None and (not future.done() or time.monotonic() - started < CATCH_UP_RETRY):
+            return
+        last = store.last_open_time(symbol, interval)
+        if last is None or (now_ms - last) // INTERVAL_MS[interval] < MAX_KLINES_PER_REQUEST:
+            return
+        _catch_ups[key] = (fetch_pool.submit(_backfill, store, symbol, interval, last), time.monotonic())
+
+
+def _backfill(store, symbol, interval, start):
+    try:
+        return backfill_klines(store, symbol, interval, start)
+    except (HttpError, ValueError, OSError):
+        # A gap in an old chart beats no chart; retried after CATCH_UP_RETRY
+        return 0
+
+
+def _candles(df):
+    """The OHLCV columns of a klines frame with epoch-ms timestamps, or None if empty"""
+    if df is None or len(df) == 0:
+        return None
+    candles = {column: df[column].to_numpy() for column in CANDLE_COLUMNS}
+    candles['timestamp'] = candles['timestamp'].astype('datetime64[ms]').astype(np.int64)
+    return pd.DataFrame(candles)
@@ -0,0 +1,271 @@
+import json
+import os
+import statistics
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from llm import StreamStats, abort_response, estimate_tokens, stream_ai_api
+from signals import TradeSignal, parse_trade_signal
+
+DEFAULT_MODELS_PATH = 'models.json'
+
+# Stand-in confidence for signals that leave it out
+DEFAULT_CONFIDENCE = 5.0
+
+model_pool = ThreadPoolExecutor(16, thread_name_prefix='consensus')
+
+
+def load_models(path=DEFAULT_MODELS_PATH):
+    """Ensemble members from a JSON list of OpenAI-compatible endpoints
+
+    Each entry has `name`, `base_url` and `model`, an `api_key` or the
+    `api_key_env` variable holding it, and optionally `timeout` seconds
+    and `cost_per_1k_input` / `cost_per_1k_output` in USD.
+    Returns [] if the file is missing or invalid.
+    """
+    try:
+        with open(path) as f:
+            entries = json.load(f)
+    except (OSError, ValueError):
+        return []
+
+    models = []
+    for entry in entries:
+        api_key = entry.get('api_key') or os.environ.get(entry.get('api_key_env', ''), '')
+        if api_key and entry.get('base_url') and entry.get('model'):
+            models.append({**entry, 'name': entry.get('name') or entry['model'], 'api_key': api_key})
+    return models
+
+
+class ModelCall:
+    """One ensemble member's answer, filled in by a worker thread
+
+    The final status is set once, by whichever of the worker (ok, error)
+    and the coordinator (timeout, cancelled) settles the call first.
+    """
+
+    def __init__(self, model, prompt):
+        self.model = model
+        self.prompt = prompt
+        self.stats = StreamStats()
+        self.text = ""
+        self.status = 'pending'
+        self.signal = None
+        self.cancelled = False
+        self.response = None
+        self.lock = threading.Lock()
+
+    def run(self, json_mode):
+        for token in stream_ai_api(self.prompt, self.model['api_key'], self.model['base_url'],
+                                   self.model['model'], self.stats, json_mode, self._opened):
+            if self.cancelled:
+                # Closing the stream here drops the connection, so the server stops generating
+                break
+            self.text += token
+
+        if self.cancelled:
+            return self
+        if self.text.startswith("Error:") or "API Error:" in self.text:
+            self.settle('error')
+        else:
+            self.settle('ok', parse_trade_signal(self.text))
+        return self
+
+    def settle(self, status, signal=None):
+        """Set the final status unless already set; returns False if the call had already settled
+
+        Settling as 'timeout' or 'cancelled' also aborts the stream, so a
+        worker still waiting for tokens gives its pool thread back at once.
+        """
+        with self.lock:
+            if self.status != 'pending':
+                return False
+            self.status = status
+            self.signal = signal
+            response = None
+            if status in ('timeout', 'cancelled'):
+                self.cancelled = True
+                response = self.response
+        if response is not None:
+            abort_response(response)
+        return True
+
+    def _opened(self, response):
+        with self.lock:
+            self.response = response
+            cancelled = self.cancelled
+        if cancelled:
+            abort_response(response)
+
+    @property
+    def latency(self):
+        end = self.stats.finished_at or time.perf_counter()
+        return end - self.stats.started
+
+    @property
+    def cost(self):
+        """Estimated USD cost, with the prompt's tokens estimated unless the server reported them"""
+        prompt_tokens = self.stats.prompt_tokens or estimate_tokens(self.prompt)
+        return (prompt_tokens * self.model.get('cost_per_1k_input', 0.0) +
+                self.stats.tokens * self.model.get('cost_per_1k_output', 0.0)) / 1000
+
+    def row(self):
+        return {
+            'model': self.model['name'],
+            'status': self.status,
+            'latency': self.latency,
+            'first_token': self.stats.time_to_first_token,
+            'tokens': self.stats.tokens,
+            'cost': self.cost,
+            'signal': self.signal.describe() if self.signal else ('HOLD' if self.status == 'ok' else None),
+        }
+
+
+def aggregate(signals, method='vote'):
+    """Combine the members' signals into one, or None when holding wins
+
+    `signals` has one entry per answering model, None meaning no trade.
+    With 'vote' each model counts once and confidence breaks ties; with
+    'confidence' each vote is weighted by the model's stated confidence.
+    The combined signal takes the median of the numbers the winning
+    models gave. Returns (signal, tally), where tally maps each choice
+    ("BUY BTC", "HOLD", ...) to its weight.
+    """
+    groups = {}
+    for signal in signals:
+        key = 'HOLD' if signal is None else f"{signal.action} {signal.symbol}"
+        groups.setdefault(key, []).append(signal)
+
+    def confidence(members):
+        return sum((s.confidence if s and s.confidence else DEFAULT_CONFIDENCE) for s in members)
+
+    tally = {key: confidence(members) if method == 'confidence' else len(members)
+             for key, members in groups.items()}
+    if not groups:
+        return None, tally
+    winner = max(groups, key=lambda key: (tally[key], confidence(groups[key]), key != 'HOLD'))
+    if winner == 'HOLD':
+        return None, tally
+
+    members = groups[winner]
+
+    def median(name):
+        values = [getattr(s, name) for s in members if getattr(s, name) is not None]
+        return statistics.median(values) if values else None
+
+    combined = TradeSignal(members[0].action, members[0].symbol,
+                           **{name: median(name) for name in
+                              ('amount_usd', 'leverage', 'entry', 'target', 'stop_loss', 'confidence')})
+    combined.reasoning = f"{len(members)}/{len(signals)} models agree. " + max(
+        members, key=lambda s: s.confidence or 0).reasoning
+    return combined, tally
+
+
+class EnsembleStats:
+    """Running per-model latency, cost and signal counts across consensus calls"""
+
+    def __init__(self, window=100):
+        self.window = window
+        self.models = {}
+        self.lock = threading.Lock()
+
+    def record(self, calls, consensus):
+        agreed = f"{consensus.action} {consensus.symbol}" if consensus else 'HOLD'
+        with self.lock:
+            for call in calls:
+                entry = self.models.setdefault(call.model['name'], {
+                    'calls': 0, 'ok': 0, 'errors': 0, 'timeouts': 0, 'cancelled': 0, 'tokens': 0,
+                    'cost': 0.0, 'agreed': 0, 'signals': {}, 'latencies': deque(maxlen=self.window),
+                })
+                entry['calls'] += 1
+                entry['tokens'] += call.stats.tokens
+                entry['cost'] += call.cost
+                if call.status == 'ok':
+                    entry['ok'] += 1
+                    entry['latencies'].append(call.latency)
+                    choice = f"{call.signal.action} {call.signal.symbol}" if call.signal else 'HOLD'
+                    entry['signals'][choice] = entry['signals'].get(choice, 0) + 1
+                    entry['agreed'] += choice == agreed
+                elif call.status == 'error':
+                    entry['errors'] += 1
+                elif call.status == 'timeout':
+                    entry['timeouts'] += 1
+                else:
+                    entry['cancelled'] += 1
+
+    def table(self):
+        """One summary row per model, for display"""
+        with self.lock:
+            rows = []
+            for name, entry in self.models.items():
+                latencies = sorted(entry['latencies'])
+                rows.append({
+                    'model': name,
+                    'calls': entry['calls'],
+                    'ok': entry['ok'],
+                    'errors': entry['errors'],
+                    'timeouts': entry['timeouts'],
+                    'cancelled': entry['cancelled'],
+                    'p50_latency': latencies[len(latencies) // 2] if latencies else None,
+                    'tokens': entry['tokens'],
+                    'cost': entry['cost'],
+                    'agreement': entry['agreed'] / entry['ok'] if entry['ok'] else None,
+                    'signals': ", ".join(f"{k} ×{v}" for k, v in sorted(entry['signals'].items())),
+                })
+            return rows
+
+
+ensemble_stats = EnsembleStats()
+
+
+def run_consensus(prompt, models, quorum=None, method='vote', json_mode=False, timeout=30.0,
+                  stats=ensemble_stats):
+    """Ask every model concurrently and combine the first `quorum` answers
+
+    Returns as soon as `quorum` models (default: a majority) have answered
+    successfully, or when the rest have failed or run past their own
+    `timeout`. Unfinished calls are cancelled and their streams aborted.
+    Returns a dict with the combined `signal` (None to
+    hold), the vote `tally`, per-model `calls` rows, whether the quorum
+    was reached and the overall latency.
+    """
+    started = time.perf_counter()
+    quorum = min(quorum or len(models) // 2 + 1, len(models))
+    calls = [ModelCall(model, prompt) for model in models]
+    pending = {model_pool.submit(call.run, json_mode): call for call in calls}
+    deadlines = {call: started + call.model.get('timeout', timeout) for call in calls}
+    answered = []
+
+    while pending and len(answered) < quorum:
+        next_deadline = min(deadlines[call] for call in pending.values())
+        done, _ = wait(pending, timeout=max(0.0, next_deadline - time.perf_counter()),
+                       return_when=FIRST_COMPLETED)
+        for future in done:
+            call = pending.pop(future)
+            if call.status == 'ok':
+                answered.append(call)
+        now = time.perf_counter()
+        for future, call in list(pending.items()):
+            if now >= deadlines[call]:
+                del pending[future]
+                if not call.settle('timeout') and call.status == 'ok':
+                    # It answered just as its time ran out
+                    answered.append(call)
+
+    for call in pending.values():
+        if not call.settle('cancelled') and call.status == 'ok':
+            answered.append(call)
+
+    signal, tally = aggregate([call.signal for call in answered], method)
+    if stats is not None:
+        stats.record(calls, signal)
+    return {
+        'signal': signal,
+        'tally': tally,
+        'calls': [call.row() for call in calls],
+        'quorum': quorum,
+        'quorum_reached': len(answered) >= quorum,
+        'latency': time.perf_counter() - started,
+    }
@@ -0,0 +1,235 @@
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import Future
+
+from market_data import get_crypto_prices, kline_cache
+from profiler import profiler
+
+
+class SingleFlight:
+    """Collapse concurrent calls with the same key into one execution
+
+    The first caller of a key runs the function; callers arriving while
+    it is in flight wait for it and get the same result, or exception.
+    """
+
+    def __init__(self):
+        self.calls = {}
+        self.lock = threading.Lock()
+
+    def do(self, key, function, *args):
+        """Returns (result, shared); `shared` is True for callers that joined another's call"""
+        with self.lock:
+            future = self.calls.get(key)
+            leader = future is None
+            if leader:
+                future = self.calls[key] = Future()
+        if not leader:
+            return future.result(), True
+
+        try:
+            future.set_result(function(*args))
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with self.lock:
+                del self.calls[key]
+        return future.result(), False
+
+    def in_flight(self):
+        with self.lock:
+            return len(self.calls)
+
+
+class DataHub:
+    """Market data shared by every Streamlit session in the process
+
+    Sessions subscribe to the symbols they show; subscriptions are
+    reference-counted across sessions, drive the shared WebSocket feed's
+    subscriptions, and lapse for sessions not seen for `lease` seconds
+    (Streamlit does not report closed tabs). Prices are fetched for all
+    subscribed symbols at once and shared for `price_ttl` seconds, and
+    klines come from the process-wide KlineCache. Concurrent identical
+    requests that miss both caches collapse into a single upstream
+    fetch, so upstream load follows the number of symbols, not of users.
+
+    Results are shared, not copied: treat returned frames as read-only.
+    """
+
+    def __init__(self, price_ttl=2.0, lease=300.0, window=60.0, cache=kline_cache, fetch=get_crypto_prices):
+        self.price_ttl = price_ttl
+        self.lease = lease
+        self.window = window
+        self.cache = cache
+        self.fetch = fetch
+        self.feed = None
+        self.flight = SingleFlight()
+        # Symbol -> (price or None, monotonic time fetched)
+        self.price_cache = {}
+        # Session -> (symbols, monotonic time last seen)
+        self.sessions = {}
+        self.refcounts = Counter()
+        self.requests = 0
+        self.upstream = 0
+        self.collapsed = 0
+        self.recent = deque()
+        self.lock = threading.Lock()
+
+    def subscribe(self, session, symbols, feed=None):
+        """Set the symbols a session watches; call on every rerun to keep the lease
+
+        With a `feed` (ws_feed.MarketFeed), the feed is attached and from
+        then on subscribed to exactly the symbols some live session watches.
+        """
+        now = time.monotonic()
+        with self.lock:
+            if feed is not None and self.feed is None:
+                self.feed = feed
+                added = set(self.refcounts)
+            else:
+                added = set()
+            expired = [key for key, (_, seen) in self.sessions.items()
+                       if now - seen > self.lease and key != session]
+            removed = set()
+            for key in expired:
+                removed |= self._release(key)
+            old = self.sessions.get(session, (frozenset(), now))[0]
+            new = frozenset(symbols)
+            self.sessions[session] = (new, now)
+            for symbol in new - old:
+                self.refcounts[symbol] += 1
+                if self.refcounts[symbol] == 1:
+                    added.add(symbol)
+            for symbol in old - new:
+                removed |= self._decrement(symbol)
+            feed = self.feed
+        if feed is not None:
+            # A symbol can leave with one session and come back with another in the same call
+            if added:
+                feed.subscribe(added)
+            if removed - added:
+                feed.unsubscribe(removed - added)
+
+    def release(self, session):
+        """Drop a session's subscriptions now rather than when its lease lapses"""
+        with self.lock:
+            removed = self._release(session)
+            feed = self.feed
+        if feed is not None and removed:
+            feed.unsubscribe(removed)
+
+    def prices(self, symbols):
+        """Prices for `symbols`, None where unavailable; fetches stale ones with every subscribed symbol"""
+        self._count_request()
+        result, missing = self._cached_prices(symbols)
+        if missing:
+            self._fetch_prices(missing)
+            result, missing = self._cached_prices(symbols)
+            if missing:
+                # Only possible if we joined a fetch started before our symbols were asked for
+                self._fetch_prices(missing)
+                result, _ = self._cached_prices(symbols)
+        return result
+
+    def klines(self, symbol, interval='1h', limit=100):
+        """The latest `limit` candles like market_data.get_market_data, or None"""
+        self._count_request()
+        df = self.cache.peek(symbol, interval, limit)
+        if df is not None:
+            return df
+        df, shared = self.flight.do(('klines', symbol, interval, limit), self._load_klines, symbol, interval, limit)
+        if shared:
+            self._count_collapsed()
+        return df
+
+    def stats(self):
+        """Fan-in (requests served per upstream fetch) and the upstream rate over the last window"""
+        now = time.monotonic()
+        with self.lock:
+            self._trim(now)
+            return {
+                'sessions': len(self.sessions),
+                'symbols': len(self.refcounts),
+                'requests': self.requests,
+                'upstream': self.upstream,
+                'collapsed': self.collapsed,
+                'fan_in': self.requests / self.upstream if self.upstream else None,
+                'upstream_per_minute': len(self.recent) * 60.0 / self.window,
+                'in_flight': self.flight.in_flight(),
+            }
+
+    def _cached_prices(self, symbols):
+        now = time.monotonic()
+        result, missing = {}, []
+        with self.lock:
+            for symbol in symbols:
+                entry = self.price_cache.get(symbol)
+                if entry is not None and now - entry[1] <= self.price_ttl:
+                    result[symbol] = entry[0]
+                else:
+                    missing.append(symbol)
+        return result, missing
+
+    def _fetch_prices(self, symbols):
+        with self.lock:
+            # One request refreshes every watched symbol, so other sessions' next reruns are cache hits
+            wanted = set(symbols) | set(self.refcounts)
+            feed = self.feed
+        if feed is not None:
+            wanted = {symbol for symbol in wanted if symbol in symbols or feed.price(symbol) is None}
+        _, shared = self.flight.do(('prices',), self._load_prices, sorted(wanted))
+        if shared:
+            self._count_collapsed()
+
+    def _load_prices(self, symbols):
+        self._count_upstream('prices')
+        fetched = self.fetch(symbols)
+        now = time.monotonic()
+        with self.lock:
+            # Failures are cached too, so an outage costs one request per ttl rather than one per session
+            for symbol in symbols:
+                self.price_cache[symbol] = (fetched.get(symbol), now)
+
+    def _load_klines(self, symbol, interval, limit):
+        # A flight for the same window may have finished between our peek and this call
+        df = self.cache.peek(symbol, interval, limit)
+        if df is not None:
+            return df
+        self._count_upstream('klines')
+        return self.cache.get(symbol, interval, limit)
+
+    def _release(self, session):
+        symbols, _ = self.sessions.pop(session, (frozenset(), None))
+        removed = set()
+        for symbol in symbols:
+            removed |= self._decrement(symbol)
+        return removed
+
+    def _decrement(self, symbol):
+        self.refcounts[symbol] -= 1
+        if self.refcounts[symbol] > 0:
+            return set()
+        del self.refcounts[symbol]
+        return {symbol}
+
+    def _count_request(self):
+        with self.lock:
+            self.requests += 1
+        profiler.count('hub_requests')
+
+    def _count_collapsed(self):
+        with self.lock:
+            self.collapsed += 1
+
+    def _count_upstream(self, kind):
+        now = time.monotonic()
+        with self.lock:
+            self.upstream += 1
+            self.recent.append(now)
+            self._trim(now)
+        profiler.count('hub_upstream', kind=kind)
+
+    def _trim(self, now):
+        while self.recent and now - self.recent[0] > self.window:
+            self.recent.popleft()
@@ -0,0 +1,179 @@
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from profiler import profiler
+
+# Per-endpoint (connect, read) timeouts in seconds and retry budgets
+ENDPOINTS = {
+    'ticker': {'timeout': (3, 5), 'retries': 2},
+    'klines': {'timeout': (3, 10), 'retries': 2},
+    # Completions are billed and not idempotent, so a failed one is not resent
+    'chat': {'timeout': (5, 30), 'retries': 0},
+    'default': {'timeout': (5, 10), 'retries': 2},
+}
+
+# Binance reports request weight used in the current minute in these headers
+WEIGHT_HEADERS = ('X-MBX-USED-WEIGHT-1M', 'X-MBX-USED-WEIGHT')
+
+
+class HttpError(Exception):
+    """Base class for errors raised by HttpClient"""
+
+
+class HttpTimeout(HttpError):
+    """The server did not answer within the endpoint timeout"""
+
+
+class HttpConnectionError(HttpError):
+    """The connection could not be established or was dropped"""
+
+
+class HttpStatusError(HttpError):
+    """The server answered with an error status"""
+
+    def __init__(self, status_code, body):
+        super().__init__(f"{status_code} - {body}")
+        self.status_code = status_code
+        self.body = body
+
+
+class WeightExhaustedError(HttpError):
+    """The host's request weight for this minute is nearly used up; nothing was sent"""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class RateLimitError(HttpStatusError):
+    """The server throttled us (HTTP 429, or 418 for a Binance IP ban)"""
+
+    def __init__(self, status_code, body, retry_after=None):
+        super().__init__(status_code, body)
+        self.retry_after = retry_after
+
+
+class HttpClient:
+    """Keep-alive HTTP client with per-host pools, retries and rate-limit tracking
+
+    One requests.Session is kept per host so connections are reused across
+    calls. Timeouts, connection errors, 429/418 and 5xx responses are retried
+    with full-jitter exponential backoff. Binance's used-weight headers are
+    tracked per host, and once usage gets close to `weight_limit` requests
+    fail fast with WeightExhaustedError until the next minute rather than
+    blocking the caller, so it can fall back to cached data.
+    """
+
+    def __init__(self, pool_size=10, backoff=0.25, max_backoff=4.0, max_retry_after=10.0,
+                 weight_limit=6000, weight_headroom=0.9):
+        self.pool_size = pool_size
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.max_retry_after = max_retry_after
+        self.weight_limit = weight_limit
+        self.weight_headroom = weight_headroom
+        self.sessions = {}
+        self.used_weight = {}
+        self.lock = threading.Lock()
+
+    def session(self, url):
+        """Return the pooled session for the URL's host"""
+        host = urlsplit(url).netloc
+        with self.lock:
+            session = self.sessions.get(host)
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                self.sessions[host] = session
+            return session
+
+    def get(self, url, endpoint='default', **kwargs):
+        return self.request('GET', url, endpoint, **kwargs)
+
+    def post(self, url, endpoint='default', **kwargs):
+        return self.request('POST', url, endpoint, **kwargs)
+
+    def request(self, method, url, endpoint='default', **kwargs):
+        """Send a request, retrying transient failures; raises HttpError subclasses
+
+        The time until the response headers arrive, retries included, is
+        recorded per endpoint as the 'http.<endpoint>' profiler section.
+        """
+        with profiler.timer(f"http.{endpoint}"):
+            return self._send(method, url, endpoint, **kwargs)
+
+    def _send(self, method, url, endpoint, **kwargs):
+        config = ENDPOINTS.get(endpoint, ENDPOINTS['default'])
+        kwargs.setdefault('timeout', config['timeout'])
+        session = self.session(url)
+        host = urlsplit(url).netloc
+
+        for attempt in range(config['retries'] + 1):
+            self._check_weight(host, method, url)
+            delay = None
+            try:
+                response = session.request(method, url, **kwargs)
+            except requests.Timeout as e:
+                error = HttpTimeout(f"{method} {url} timed out: {e}")
+            except requests.ConnectionError as e:
+                error = HttpConnectionError(f"{method} {url} failed: {e}")
+            else:
+                self._track_weight(host, response)
+                status = response.status_code
+                if status < 400:
+                    return response
+                if status in (418, 429):
+                    delay = _retry_after(response)
+                    error = RateLimitError(status, response.text, delay)
+                elif status >= 500:
+                    error = HttpStatusError(status, response.text)
+                else:
+                    raise HttpStatusError(status, response.text)
+
+            if attempt == config['retries']:
+                raise error
+            if delay is not None and delay > self.max_retry_after:
+                # Long bans are surfaced to the caller instead of blocking it
+                raise error
+            if delay is None:
+                delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+            profiler.count('http_retries', endpoint=endpoint)
+            time.sleep(delay)
+
+    def _track_weight(self, host, response):
+        for header in WEIGHT_HEADERS:
+            value = response.headers.get(header)
+            if value is not None:
+                with self.lock:
+                    self.used_weight[host] = (int(value), _current_minute())
+                return
+
+    def _check_weight(self, host, method, url):
+        with self.lock:
+            weight, minute = self.used_weight.get(host, (0, None))
+        if minute == _current_minute() and weight >= self.weight_limit * self.weight_headroom:
+            profiler.count('http_weight_exhausted')
+            # Binance resets weight counters at the start of each minute
+            raise WeightExhaustedError(f"{method} {url} skipped: used weight {weight} of {self.weight_limit}",
+                                       60 - time.time() % 60)
+
+
+def _current_minute():
+    return int(time.time() // 60)
+
+
+def _retry_after(response):
+    try:
+        return float(response.headers['Retry-After'])
+    except (KeyError, ValueError):
+        return None
+
+
+client = HttpClient()
@@ -0,0 +1,190 @@
+import numpy as np
+import pandas as pd
+
+RSI_PERIOD = 14
+ATR_PERIOD = 14
+MACD_FAST, MACD_SLOW, MACD_SIGNAL = 12, 26, 9
+BB_PERIOD, BB_WIDTH = 20, 2.0
+VOLUME_PERIOD = 20
+PIVOT_WINDOW = 5
+
+INDICATOR_COLUMNS = ['sma_20', 'ema_20', 'ema_50', 'rsi_14', 'macd', 'macd_signal', 'macd_hist',
+                     'atr_14', 'bb_upper', 'bb_mid', 'bb_lower', 'volume_z', 'support', 'resistance']
+
+# Smoothing state carried between incremental updates
+STATE_COLUMNS = ['_ema_fast', '_ema_slow', '_avg_gain', '_avg_loss']
+
+# Rows of history the rolling-window indicators need before the first new candle
+TAIL_ROWS = max(BB_PERIOD, VOLUME_PERIOD, 2 * PIVOT_WINDOW)
+
+# Below this many values plain NumPy beats pandas' per-call overhead
+SHORT_SERIES = 64
+
+
+def ema(values, span=None, alpha=None, seed=None):
+    """Exponential moving average, optionally continuing from a previous value"""
+    values = np.asarray(values, dtype=float)
+    alpha = alpha if alpha is not None else 2 / (span + 1)
+    seeded = seed is not None and not np.isnan(seed)
+
+    if len(values) < SHORT_SERIES:
+        out = np.empty(len(values))
+        current = seed if seeded else (values[0] if len(values) else np.nan)
+        for i, value in enumerate(values):
+            current = current + alpha * (value - current)
+            out[i] = current
+        return out
+
+    if seeded:
+        values = np.concatenate([[seed], values])
+    smoothed = pd.Series(values).ewm(alpha=alpha, adjust=False).mean().to_numpy()
+    return smoothed[1:] if seeded else smoothed
+
+
+def rolling_mean_std(values, window, n, history=None):
+    """Rolling mean and population standard deviation over the last `n` values
+
+    `history` primes the window with values that precede `values`.
+    """
+    values = np.asarray(values, dtype=float)
+    if history is not None and len(history):
+        values = np.concatenate([np.asarray(history, dtype=float), values])
+
+    if len(values) >= SHORT_SERIES:
+        series = pd.Series(values).rolling(window)
+        return series.mean().to_numpy()[-n:], series.std(ddof=0).to_numpy()[-n:]
+
+    # Short incremental updates: strided windows avoid pandas' per-call overhead
+    padded = np.concatenate([np.full(window - 1, np.nan), values])
+    windows = np.lib.stride_tricks.sliding_window_view(padded, window)[-n:]
+    full = np.arange(len(values) - n, len(values)) >= window - 1
+    mean = np.full(n, np.nan)
+    std = np.full(n, np.nan)
+    if full.any():
+        mean[full] = windows[full].mean(axis=1)
+        std[full] = windows[full].std(axis=1)
+    return mean, std
+
+
+def compute(candles, prev=None):
+    """Compute indicator columns for `candles`, continuing from the `prev` frame
+
+    `prev` holds the already-computed rows just before `candles` (at least
+    TAIL_ROWS of them), so only the new rows are computed. Without it the
+    indicators are computed from scratch.
+    """
+    high = candles['high'].to_numpy(dtype=float)
+    low = candles['low'].to_numpy(dtype=float)
+    close = candles['close'].to_numpy(dtype=float)
+    volume = candles['volume'].to_numpy(dtype=float)
+    n = len(close)
+
+    previous_row = prev.iloc[-1] if prev is not None and len(prev) else None
+
+    def last(column):
+        return None if previous_row is None else float(previous_row[column])
+
+    def tail(column):
+        return prev[column].to_numpy(dtype=float)[-TAIL_ROWS:] if prev is not None else None
+
+    out = {}
+
+    # Moving averages and MACD
+    out['sma_20'], _ = rolling_mean_std(close, 20, n, tail('close'))
+    out['ema_20'] = ema(close, span=20, seed=last('ema_20'))
+    out['ema_50'] = ema(close, span=50, seed=last('ema_50'))
+    out['_ema_fast'] = ema(close, span=MACD_FAST, seed=last('_ema_fast'))
+    out['_ema_slow'] = ema(close, span=MACD_SLOW, seed=last('_ema_slow'))
+    out['macd'] = out['_ema_fast'] - out['_ema_slow']
+    out['macd_signal'] = ema(out['macd'], span=MACD_SIGNAL, seed=last('macd_signal'))
+    out['macd_hist'] = out['macd'] - out['macd_signal']
+
+    # Wilder-smoothed RSI and ATR
+    prev_close = last('close')
+    previous = np.concatenate([[np.nan if prev_close is None else prev_close], close[:-1]])
+    change = close - previous
+    gain = np.where(change > 0, change, 0.0)
+    loss = np.where(change < 0, -change, 0.0)
+    if prev_close is None:
+        gain, loss = gain[1:], loss[1:]
+    avg_gain = ema(gain, alpha=1 / RSI_PERIOD, seed=last('_avg_gain'))
+    avg_loss = ema(loss, alpha=1 / RSI_PERIOD, seed=last('_avg_loss'))
+    if prev_close is None:
+        avg_gain = np.concatenate([[np.nan], avg_gain])
+        avg_loss = np.concatenate([[np.nan], avg_loss])
+    out['_avg_gain'], out['_avg_loss'] = avg_gain, avg_loss
+    with np.errstate(divide='ignore', invalid='ignore'):
+        out['rsi_14'] = np.where(avg_loss == 0, 100.0, 100 - 100 / (1 + avg_gain / avg_loss))
+    out['rsi_14'][np.isnan(avg_gain)] = np.nan
+
+    true_range = np.maximum(high - low, np.maximum(np.abs(high - previous), np.abs(low - previous)))
+    true_range = np.where(np.isnan(true_range), high - low, true_range)
+    out['atr_14'] = ema(true_range, alpha=1 / ATR_PERIOD, seed=last('atr_14'))
+
+    # Bollinger bands and volume z-score
+    mid, std = rolling_mean_std(close, BB_PERIOD, n, tail('close'))
+    out['bb_mid'] = mid
+    out['bb_upper'] = mid + BB_WIDTH * std
+    out['bb_lower'] = mid - BB_WIDTH * std
+
+    volume_mean, volume_std = rolling_mean_std(volume, VOLUME_PERIOD, n, tail('volume'))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        out['volume_z'] = (volume - volume_mean) / volume_std
+    out['volume_z'][volume_std == 0] = 0.0
+
+    # Pivot support/resistance, confirmed PIVOT_WINDOW bars after the pivot
+    out['resistance'] = _pivots(high, tail('high'), last('resistance'), np.max, n)
+    out['support'] = _pivots(low, tail('low'), last('support'), np.min, n)
+
+    columns = INDICATOR_COLUMNS + STATE_COLUMNS
+    indicators = pd.DataFrame({column: out[column] for column in columns})
+    return pd.concat([candles.reset_index(drop=True), indicators], axis=1)
+
+
+def _pivots(values, history, seed, reducer, n):
+    """Latest confirmed pivot level at each bar, with no look-ahead"""
+    span = 2 * PIVOT_WINDOW + 1
+    if history is not None and len(history):
+        values = np.concatenate([history, values])
+
+    levels = np.full(len(values), np.nan)
+    if len(values) >= span:
+        # Window j covers bars j..j+span-1; its center is a pivot if it is the extreme
+        extreme = reducer(np.lib.stride_tricks.sliding_window_view(values, span), axis=1)
+        center = values[PIVOT_WINDOW:len(values) - PIVOT_WINDOW]
+        confirmed = levels[span - 1:]
+        confirmed[center == extreme] = center[center == extreme]
+    return _ffill(levels[-n:], seed)
+
+
+def _ffill(values, seed=None):
+    """Forward-fill NaNs, starting from `seed`"""
+    values = np.concatenate([[np.nan if seed is None else seed], values])
+    index = np.where(np.isnan(values), 0, np.arange(len(values)))
+    np.maximum.accumulate(index, out=index)
+    return values[index][1:]
+
+
+def summarize(frame):
+    """Latest indicator values as a dict, for prompts"""
+    latest = frame.iloc[-1]
+    return {column: (None if pd.isna(latest[column]) else float(latest[column]))
+            for column in INDICATOR_COLUMNS}
+
+
+def format_for_prompt(frame):
+    """Latest indicator readings as markdown bullet lines for LLM prompts"""
+    latest = summarize(frame)
+
+    def fmt(value, pattern):
+        return "n/a" if value is None else pattern.format(value)
+
+    return "\n".join([
+        f"- RSI(14): {fmt(latest['rsi_14'], '{:.1f}')}",
+        f"- EMA20 / EMA50: {fmt(latest['ema_20'], '${:,.2f}')} / {fmt(latest['ema_50'], '${:,.2f}')}",
+        f"- MACD Histogram: {fmt(latest['macd_hist'], '{:+.4f}')}",
+        f"- ATR(14): {fmt(latest['atr_14'], '${:,.2f}')}",
+        f"- Bollinger Bands: {fmt(latest['bb_lower'], '${:,.2f}')} - {fmt(latest['bb_upper'], '${:,.2f}')}",
+        f"- Volume Z-Score: {fmt(latest['volume_z'], '{:+.2f}')}",
+        f"- Support / Resistance: {fmt(latest['support'], '${:,.2f}')} / {fmt(latest['resistance'], '${:,.2f}')}",
+    ])
@@ -0,0 +1,188 @@
+"""Local columnar kline store backed by memory-mapped NumPy files.
+
+Each symbol/interval is a directory holding one flat little-endian file
+per column, so appends are plain file appends and reads are zero-copy
+slices of memory maps. Backfill history from Binance with:
+
+    python kline_store.py backfill --symbols BTC ETH --interval 1m --days 365
+"""
+import argparse
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_ROOT = os.path.join('data', 'klines')
+
+# Stored columns; timestamp and close_time are epoch milliseconds
+COLUMN_DTYPES = {
+    'timestamp': '<i8',
+    'open': '<f8',
+    'high': '<f8',
+    'low': '<f8',
+    'close': '<f8',
+    'volume': '<f8',
+    'close_time': '<i8',
+    'quote_volume': '<f8',
+    'trades': '<i8',
+    'taker_buy_base': '<f8',
+    'taker_buy_quote': '<f8',
+}
+
+INTERVAL_MS = {
+    '1m': 60_000, '3m': 180_000, '5m': 300_000, '15m': 900_000, '30m': 1_800_000,
+    '1h': 3_600_000, '2h': 7_200_000, '4h': 14_400_000, '6h': 21_600_000,
+    '8h': 28_800_000, '12h': 43_200_000, '1d': 86_400_000
+}
+
+
+class KlineStore:
+    """Append-only columnar kline files under `root/<SYMBOL>/<interval>/`
+
+    Only closed candles are stored, so stored rows never change, and each
+    append must continue where the store ends, so stored rows are
+    contiguous and a read of N rows spans exactly N intervals. Columns are
+    appended one file at a time; if a crash leaves them at different
+    lengths the extra rows are ignored and overwritten by the next append.
+    """
+
+    def __init__(self, root=DEFAULT_ROOT):
+        self.root = root
+        self.lock = threading.Lock()
+
+    def path(self, symbol, interval, column=None):
+        directory = os.path.join(self.root, symbol, interval)
+        return directory if column is None else os.path.join(directory, f"{column}.bin")
+
+    def rows(self, symbol, interval):
+        """Number of complete rows stored"""
+        sizes = []
+        for column, dtype in COLUMN_DTYPES.items():
+            try:
+                sizes.append(os.path.getsize(self.path(symbol, interval, column)) // np.dtype(dtype).itemsize)
+            except OSError:
+                return 0
+        return min(sizes)
+
+    def columns(self, symbol, interval):
+        """Read-only memory maps of every column, or {} if nothing is stored"""
+        rows = self.rows(symbol, interval)
+        if rows == 0:
+            return {}
+        return {column: np.memmap(self.path(symbol, interval, column), dtype=dtype, mode='r', shape=(rows,))
+                for column, dtype in COLUMN_DTYPES.items()}
+
+    def first_open_time(self, symbol, interval):
+        """Open time in ms of the oldest stored candle, or None"""
+        if self.rows(symbol, interval) == 0:
+            return None
+        path = self.path(symbol, interval, 'timestamp')
+        return int(np.fromfile(path, dtype=COLUMN_DTYPES['timestamp'], count=1)[0])
+
+    def last_open_time(self, symbol, interval):
+        """Open time in ms of the newest stored candle, or None"""
+        timestamps = self.columns(symbol, interval).get('timestamp')
+        return None if timestamps is None else int(timestamps[-1])
+
+    def read(self, symbol, interval, start=None, end=None, limit=None):
+        """Stored candles with open time in [start, end) ms, newest `limit` of them
+
+        Columns are views over the memory maps; nothing is copied.
+        """
+        columns = self.columns(symbol, interval)
+        if not columns:
+            return None
+
+        timestamps = columns['timestamp']
+        lo = 0 if start is None else int(np.searchsorted(timestamps, start, side='left'))
+        hi = len(timestamps) if end is None else int(np.searchsorted(timestamps, end, side='left'))
+        if limit is not None:
+            lo = max(lo, hi - limit)
+
+        data = {column: values[lo:hi] for column, values in columns.items()}
+        data['timestamp'] = data['timestamp'].view('datetime64[ms]')
+        return pd.DataFrame(data, copy=False)
+
+    def append(self, symbol, interval, df, now=None, start=None):
+        """Append closed candles from a get_market_data() frame that are newer than the store
+
+        Nothing is written if the first new candle does not directly follow
+        the newest stored one, unless `start`, the open time (ms) the frame
+        was requested from, shows the exchange has no candles in between.
+        Otherwise backfill the gap first (market_data.backfill_klines).
+        Returns the number of rows written.
+        """
+        now_ms = int((now or time.time()) * 1000)
+        open_times = df['timestamp'].to_numpy().astype('datetime64[ms]').astype(np.int64)
+        close_times = df['close_time'].to_numpy().astype(np.int64)
+
+        with self.lock:
+            rows = self.rows(symbol, interval)
+            last = self.last_open_time(symbol, interval)
+            mask = close_times < now_ms
+            if last is not None:
+                mask &= open_times > last
+            if not mask.any():
+                return 0
+            step = INTERVAL_MS.get(interval)
+            if last is not None and step is not None and open_times[mask][0] != last + step:
+                if start is None or start > last + step:
+                    return 0
+
+            os.makedirs(self.path(symbol, interval), exist_ok=True)
+            for column, dtype in COLUMN_DTYPES.items():
+                values = open_times if column == 'timestamp' else df[column].to_numpy()
+                path = self.path(symbol, interval, column)
+                # Write over rows a crash may have left beyond the shortest column rather than
+                # truncating: files never shrink under readers' memory maps
+                with open(path, 'r+b' if os.path.exists(path) else 'wb') as f:
+                    f.seek(rows * np.dtype(dtype).itemsize)
+                    f.write(np.ascontiguousarray(values[mask], dtype=dtype).tobytes())
+            return int(mask.sum())
+
+
+def _listdir(path):
+    try:
+        return sorted(os.listdir(path))
+    except OSError:
+        return []
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    backfill = commands.add_parser('backfill', help="Download history from Binance into the store")
+    backfill.add_argument('--symbols', nargs='+', default=['BTC', 'ETH'])
+    backfill.add_argument('--interval', default='1m', choices=list(INTERVAL_MS))
+    backfill.add_argument('--days', type=float, default=30)
+    backfill.add_argument('--root', default=DEFAULT_ROOT)
+
+    info = commands.add_parser('info', help="Show what the store holds")
+    info.add_argument('--root', default=DEFAULT_ROOT)
+    args = parser.parse_args()
+
+    store = KlineStore(args.root)
+    if args.command == 'info':
+        for symbol in _listdir(args.root):
+            for interval in _listdir(os.path.join(args.root, symbol)):
+                df = store.read(symbol, interval)
+                if df is not None:
+                    print(f"{symbol:>6} {interval:>4}: {len(df):>10,} candles "
+                          f"{df['timestamp'].iloc[0]} -> {df['timestamp'].iloc[-1]}")
+        return
+
+    # Imported here so the store itself has no network dependency
+    from market_data import backfill_klines
+
+    start = int((time.time() - args.days * 86400) * 1000)
+    for symbol in args.symbols:
+        started = time.perf_counter()
+        written = backfill_klines(store, symbol, args.interval, start)
+        print(f"{symbol}: {written:,} candles in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
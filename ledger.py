@@ -0,0 +1,127 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+ACTIONS = ('BUY', 'SELL')
+
+# One row per fill; timestamps are epoch milliseconds, symbols ASCII bytes
+TRADE_DTYPE = np.dtype([
+    ('timestamp', '<i8'),
+    ('action', 'i1'),
+    ('symbol', 'S12'),
+    ('amount', '<f8'),
+    ('price', '<f8'),
+    ('leverage', '<f8'),
+    ('cost', '<f8'),
+    ('profit', '<f8'),
+    ('proceeds', '<f8'),
+])
+
+
+class Ledger:
+    """Append-only trade history in a growable NumPy structured array
+
+    Appends are amortized O(1) and update running counts and realized P&L,
+    so stats() and tail() cost the same at ten fills or a million. `cost`
+    is the margin a fill posted; `profit` and `proceeds` are what it
+    realized and returned to cash by closing all or part of a position.
+    Columns that do not apply to a fill are NaN.
+    """
+
+    def __init__(self, capacity=64):
+        self.data = np.zeros(capacity, dtype=TRADE_DTYPE)
+        self.size = 0
+        self.counts = [0] * len(ACTIONS)
+        self.realized_pnl = 0.0
+        self.closes = 0
+        self.wins = 0
+
+    def __len__(self):
+        return self.size
+
+    def append(self, timestamp_ms, action, symbol, amount, price, leverage=1.0,
+               cost=np.nan, profit=np.nan, proceeds=np.nan):
+        if self.size == len(self.data):
+            grown = np.zeros(2 * len(self.data), dtype=TRADE_DTYPE)
+            grown[:self.size] = self.data
+            self.data = grown
+
+        code = ACTIONS.index(action)
+        self.data[self.size] = (timestamp_ms, code, symbol.encode(), amount, price, leverage,
+                                cost, profit, proceeds)
+        self.size += 1
+        self.counts[code] += 1
+        if not np.isnan(profit):
+            self.realized_pnl += float(profit)
+            self.closes += 1
+            self.wins += int(profit > 0)
+
+    @property
+    def records(self):
+        """View of the filled rows"""
+        return self.data[:self.size]
+
+    def column(self, name, action=None):
+        """One column of every fill, or only of BUY or SELL fills"""
+        records = self.records
+        if action is not None:
+            records = records[records['action'] == ACTIONS.index(action)]
+        return records[name]
+
+    def stats(self):
+        """Running aggregates, maintained on every append"""
+        return {
+            'trades': self.size,
+            'buys': self.counts[ACTIONS.index('BUY')],
+            'sells': self.counts[ACTIONS.index('SELL')],
+            'closes': self.closes,
+            'realized_pnl': self.realized_pnl,
+            'avg_profit': self.realized_pnl / self.closes if self.closes else None,
+            'win_rate': self.wins / self.closes if self.closes else None,
+        }
+
+    def tail(self, n=20):
+        """The last `n` fills as a DataFrame, for display"""
+        return self.frame(self.records[-n:] if n else self.records[:0])
+
+    def to_frame(self):
+        return self.frame(self.records)
+
+    @staticmethod
+    def frame(records):
+        return pd.DataFrame({
+            'timestamp': records['timestamp'].astype('datetime64[ms]'),
+            'action': np.array(ACTIONS)[records['action']],
+            'symbol': records['symbol'].astype(str),
+            'amount': records['amount'],
+            'price': records['price'],
+            'leverage': records['leverage'],
+            'cost': records['cost'],
+            'profit': records['profit'],
+            'proceeds': records['proceeds'],
+        })
+
+    def save(self, path):
+        """Write the filled rows to a .npy file, atomically"""
+        tmp_path = f"{path}.tmp.npy"
+        np.save(tmp_path, self.records)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """Rebuild a ledger and its aggregates from save()'s file"""
+        return cls.from_records(np.load(path))
+
+    @classmethod
+    def from_records(cls, records):
+        """Rebuild a ledger and its aggregates from TRADE_DTYPE rows"""
+        ledger = cls(max(64, len(records)))
+        ledger.data[:len(records)] = records
+        ledger.size = len(records)
+        ledger.counts = [int((records['action'] == code).sum()) for code in range(len(ACTIONS))]
+        profits = records['profit'][~np.isnan(records['profit'])]
+        ledger.realized_pnl = float(profits.sum())
+        ledger.closes = len(profits)
+        ledger.wins = int((profits > 0).sum())
+        return ledger
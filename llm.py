@@ -0,0 +1,181 @@
+import json
+import socket
+import time
+
+import requests
+
+from http_client import HttpError, HttpStatusError, client
+from profiler import profiler
+
+SYSTEM_PROMPT = "You are an elite crypto trading AI based on DeepSeek's winning Alpha Arena strategy."
+
+
+def build_request(prompt, api_key, model_name, json_mode=False):
+    """Build headers and body for an OpenAI-compatible chat completion
+
+    `json_mode` asks the server to constrain the answer to a JSON object.
+    """
+    headers = {
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {api_key}"
+    }
+
+    data = {
+        "model": model_name,
+        "messages": [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ],
+        "temperature": 0.7,
+        "max_tokens": 2000
+    }
+    if json_mode:
+        data["response_format"] = {"type": "json_object"}
+    return headers, data
+
+
+def estimate_tokens(text):
+    """Rough token count for servers that do not report usage, at about four characters a token"""
+    return len(text) // 4
+
+
+def record_usage(model_name, prompt_tokens, completion_tokens):
+    """Add one completion's token counts to the profiler's per-model counters"""
+    profiler.count('tokens', prompt_tokens, model=model_name, kind='prompt')
+    profiler.count('tokens', completion_tokens, model=model_name, kind='completion')
+
+
+def call_ai_api(prompt, api_key, base_url, model_name, json_mode=False):
+    """Call AI API with OpenAI-compatible format"""
+    headers, data = build_request(prompt, api_key, model_name, json_mode)
+
+    started = time.perf_counter()
+    try:
+        response = client.post(f"{base_url}/chat/completions", endpoint='chat',
+                               headers=headers, json=data)
+        result = response.json()
+        content = result['choices'][0]['message']['content']
+    except HttpStatusError as e:
+        profiler.record('llm.call', time.perf_counter() - started, error=True)
+        return f"Error: {e.status_code} - {e.body}"
+    except (HttpError, ValueError, KeyError, IndexError) as e:
+        profiler.record('llm.call', time.perf_counter() - started, error=True)
+        return f"API Error: {str(e)}"
+
+    profiler.record('llm.call', time.perf_counter() - started)
+    usage = result.get('usage') or {}
+    record_usage(model_name, usage.get('prompt_tokens') or estimate_tokens(prompt),
+                 usage.get('completion_tokens') or estimate_tokens(content or ""))
+    return content
+
+
+class StreamStats:
+    """Latency and throughput of one streamed completion
+
+    `tokens` counts content deltas, which OpenAI-compatible servers send
+    roughly one per token, unless the server reports usage in the stream.
+    `prompt_tokens` is only known if it does.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.first_token_at = None
+        self.finished_at = None
+        self.tokens = 0
+        self.prompt_tokens = None
+
+    def record(self, delta):
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+        self.tokens += 1
+
+    def finish(self):
+        self.finished_at = time.perf_counter()
+
+    @property
+    def time_to_first_token(self):
+        if self.first_token_at is None:
+            return None
+        return self.first_token_at - self.started
+
+    @property
+    def tokens_per_second(self):
+        if self.first_token_at is None or self.finished_at is None:
+            return None
+        elapsed = self.finished_at - self.first_token_at
+        return self.tokens / elapsed if elapsed > 0 else None
+
+
+def abort_response(response):
+    """Unblock a thread reading a streamed `response`, from another thread
+
+    Closing the response waits for the next byte; shutting the socket
+    down wakes the reader at once, and its stream ends as interrupted.
+    """
+    connection = getattr(response.raw, 'connection', None)
+    sock = getattr(connection, 'sock', None)
+    if sock is not None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+
+def stream_ai_api(prompt, api_key, base_url, model_name, stats=None, json_mode=False, on_response=None):
+    """Yield completion text as it arrives over the OpenAI-compatible SSE stream
+
+    `on_response` is called with the HTTP response once its headers
+    arrive, so another thread can cancel the stream with abort_response().
+    """
+    stats = stats if stats is not None else StreamStats()
+    headers, data = build_request(prompt, api_key, model_name, json_mode)
+    data["stream"] = True
+
+    try:
+        response = client.post(f"{base_url}/chat/completions", endpoint='chat',
+                               headers=headers, json=data, stream=True)
+    except HttpStatusError as e:
+        stats.finish()
+        profiler.record('llm.stream', stats.finished_at - stats.started, error=True)
+        yield f"Error: {e.status_code} - {e.body}"
+        return
+    except HttpError as e:
+        stats.finish()
+        profiler.record('llm.stream', stats.finished_at - stats.started, error=True)
+        yield f"API Error: {str(e)}"
+        return
+
+    if on_response is not None:
+        on_response(response)
+    # SSE is UTF-8 by spec but servers often omit the charset
+    response.encoding = 'utf-8'
+    interrupted = False
+    try:
+        for line in response.iter_lines(decode_unicode=True):
+            if not line or not line.startswith('data:'):
+                continue
+            payload = line[len('data:'):].strip()
+            if payload == '[DONE]':
+                break
+
+            chunk = json.loads(payload)
+            choices = chunk.get('choices') or []
+            delta = choices[0].get('delta', {}).get('content') if choices else None
+            if delta:
+                stats.record(delta)
+                yield delta
+            usage = chunk.get('usage')
+            if usage and usage.get('completion_tokens'):
+                stats.tokens = usage['completion_tokens']
+                stats.prompt_tokens = usage.get('prompt_tokens')
+    except (requests.RequestException, ValueError) as e:
+        interrupted = True
+        yield f"\n\nAPI Error: stream interrupted ({str(e)})"
+    finally:
+        stats.finish()
+        response.close()
+        # Also reached when the consumer stops early, e.g. a cancelled consensus member
+        profiler.record('llm.stream', stats.finished_at - stats.started, error=interrupted)
+        if stats.time_to_first_token is not None:
+            profiler.record('llm.first_token', stats.time_to_first_token)
+        record_usage(model_name, stats.prompt_tokens or estimate_tokens(prompt), stats.tokens)
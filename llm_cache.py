@@ -0,0 +1,174 @@
+import atexit
+import hashlib
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+# Market-state fields treated as prices and bucketed on a log scale
+PRICE_FIELDS = ('price', 'high', 'low', 'entry_price')
+
+
+def quantize_price(price, tolerance):
+    """Bucket a positive price so values within ~`tolerance` (a fraction) share a bucket"""
+    if not price or price <= 0:
+        return 0
+    return round(math.log(price) / math.log1p(tolerance))
+
+
+def normalize_state(state, tolerance):
+    """Quantize a nested market/portfolio state so small price moves map to the same key
+
+    Price fields are bucketed by relative tolerance, percentage changes by
+    absolute steps of the same size, and volumes by ten times the tolerance
+    since they are much noisier. Everything else is kept as-is.
+    """
+    if isinstance(state, dict):
+        normalized = {}
+        for name, value in state.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                if name in PRICE_FIELDS or name == 'cash':
+                    value = quantize_price(value, tolerance)
+                elif name.endswith('change'):
+                    value = round(value / (tolerance * 100))
+                elif name in ('volume', 'amount'):
+                    value = quantize_price(value, tolerance * 10)
+            else:
+                value = normalize_state(value, tolerance)
+            normalized[str(name)] = value
+        return normalized
+    if isinstance(state, (list, tuple)):
+        return [normalize_state(value, tolerance) for value in state]
+    return state
+
+
+def make_cache_key(model_name, kind, state, tolerance):
+    """Hash the model, prompt kind and quantized state into a cache key"""
+    normalized = {
+        'model': model_name,
+        'kind': kind,
+        'state': normalize_state(state, tolerance),
+    }
+    payload = json.dumps(normalized, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class ResponseCache:
+    """TTL + LRU cache of LLM responses with optional JSON persistence
+
+    Hits record the latency and tokens the original call spent, so the
+    stats show how much time and token spend the cache saved. With a
+    `path`, the file is rewritten at most every `save_interval` seconds
+    and on exit, rather than on every put.
+    """
+
+    def __init__(self, ttl=300, max_entries=256, path=None, save_interval=5.0):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.path = path
+        self.save_interval = save_interval
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        # Held while writing the file, so saves never interleave
+        self.save_lock = threading.Lock()
+        self.dirty = False
+        self.saved_at = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+        self.saved_tokens = 0
+        if path:
+            self._load()
+            atexit.register(self.flush)
+
+    def get(self, key):
+        """Return the cached response for `key`, or None on a miss"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and time.time() - entry['created'] > self.ttl:
+                del self.entries[key]
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+            self.saved_seconds += entry['latency']
+            self.saved_tokens += entry['tokens']
+            return entry['response']
+
+    def put(self, key, response, latency, tokens=None):
+        """Store a response with the latency and token count it cost"""
+        if tokens is None:
+            # Roughly four characters per token for English text
+            tokens = len(response) // 4
+        with self.lock:
+            self.entries[key] = {
+                'response': response,
+                'created': time.time(),
+                'latency': latency,
+                'tokens': tokens,
+            }
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+            self.dirty = True
+        if self.path and time.monotonic() - self.saved_at >= self.save_interval:
+            self.flush()
+
+    def flush(self):
+        """Write unsaved entries to `path` now"""
+        if not self.path:
+            return
+        with self.save_lock:
+            with self.lock:
+                if not self.dirty:
+                    return
+                stored = list(self.entries.items())
+                self.dirty = False
+            self.saved_at = time.monotonic()
+            try:
+                self._save(stored)
+            except OSError:
+                # Persistence is best-effort; keep the entries for the next attempt
+                with self.lock:
+                    self.dirty = True
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self.entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'saved_seconds': self.saved_seconds,
+            'saved_tokens': self.saved_tokens,
+        }
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            return
+        now = time.time()
+        for key, entry in stored:
+            if now - entry['created'] <= self.ttl:
+                self.entries[key] = entry
+
+    def _save(self, stored):
+        # Write a private temp file then rename, so a crash never leaves a truncated cache file
+        directory, name = os.path.split(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f"{name}.", suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(stored, f)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
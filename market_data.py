@@ -0,0 +1,296 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import pandas as pd
+
+from http_client import HttpError, HttpStatusError, client
+from kline_store import DEFAULT_ROOT, INTERVAL_MS, KlineStore
+from profiler import profiler
+
+BINANCE_API = os.environ.get('BINANCE_API_URL', "https://api.binance.com/api/v3")
+
+KLINE_COLUMNS = ['timestamp', 'open', 'high', 'low', 'close', 'volume',
+                 'close_time', 'quote_volume', 'trades', 'taker_buy_base',
+                 'taker_buy_quote', 'ignore']
+
+# Binance returns at most this many candles per klines request
+MAX_KLINES_PER_REQUEST = 1000
+
+
+@profiler.timed('fetch.price')
+def get_crypto_price(symbol):
+    """Get real-time crypto price from Binance API"""
+    try:
+        response = client.get(f"{BINANCE_API}/ticker/price", endpoint='ticker',
+                              params={'symbol': f"{symbol}USDT"})
+        return float(response.json()['price'])
+    except (HttpError, ValueError, KeyError):
+        return None
+
+
+@profiler.timed('fetch.prices')
+def get_crypto_prices(symbols):
+    """Get real-time prices for several symbols in one Binance request"""
+    symbols = sorted(set(symbols))
+    if not symbols:
+        return {}
+
+    pairs = json.dumps([f"{symbol}USDT" for symbol in symbols], separators=(',', ':'))
+    try:
+        response = client.get(f"{BINANCE_API}/ticker/price", endpoint='ticker',
+                              params={'symbols': pairs})
+        data = response.json()
+    except HttpStatusError as e:
+        if e.status_code != 400:
+            return {}
+        # Binance rejects the whole batch if any pair is unknown, so fall back per symbol
+        return {symbol: get_crypto_price(symbol) for symbol in symbols}
+    except (HttpError, ValueError):
+        return {}
+
+    return {item['symbol'][:-len('USDT')]: float(item['price']) for item in data}
+
+
+class PriceSnapshot:
+    """Prices for a set of symbols, fetched once and shared by every caller
+
+    With a live `feed` (ws_feed.MarketFeed) its fresh prices are used as-is
+    and only the symbols it has no fresh price for are fetched over REST,
+    with `fetch` (get_crypto_prices, or a shared DataHub's prices).
+    """
+
+    def __init__(self, symbols, feed=None, fetch=None):
+        self.fetch = fetch or get_crypto_prices
+        self.taken = time.monotonic()
+        self.prices = {}
+        if feed is not None:
+            for symbol in set(symbols):
+                price = feed.price(symbol)
+                if price is not None:
+                    self.prices[symbol] = price
+        missing = [symbol for symbol in symbols if symbol not in self.prices]
+        if missing:
+            self.prices.update(self.fetch(missing))
+
+    def get(self, symbol):
+        """Return the snapshot price, fetching symbols outside the snapshot on demand"""
+        if symbol not in self.prices:
+            self.prices[symbol] = self.fetch([symbol]).get(symbol)
+        return self.prices[symbol]
+
+
+def fetch_klines(symbol, interval, limit, start_time=None):
+    """Download raw klines from Binance, optionally starting at an open time in ms"""
+    params = {'symbol': f"{symbol}USDT", 'interval': interval, 'limit': limit}
+    if start_time is not None:
+        params['startTime'] = start_time
+    response = client.get(f"{BINANCE_API}/klines", endpoint='klines', params=params)
+    return response.json()
+
+
+def parse_klines(data):
+    """Turn raw Binance kline rows into a typed DataFrame"""
+    df = pd.DataFrame(data, columns=KLINE_COLUMNS)
+    df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
+    df['open'] = df['open'].astype(float)
+    df['close'] = df['close'].astype(float)
+    df['volume'] = df['volume'].astype(float)
+    df['high'] = df['high'].astype(float)
+    df['low'] = df['low'].astype(float)
+    df['close_time'] = df['close_time'].astype('int64')
+    df['quote_volume'] = df['quote_volume'].astype(float)
+    df['trades'] = df['trades'].astype('int64')
+    df['taker_buy_base'] = df['taker_buy_base'].astype(float)
+    df['taker_buy_quote'] = df['taker_buy_quote'].astype(float)
+    return df.drop(columns=['ignore'])
+
+
+def backfill_klines(store, symbol, interval, start_time):
+    """Page through the klines endpoint from `start_time` (ms) into `store`
+
+    Resumes right after the newest stored candle, since the store only
+    takes contiguous candles. Returns the number of candles written.
+    """
+    last = store.last_open_time(symbol, interval)
+    cursor = start_time if last is None else last + INTERVAL_MS[interval]
+    written = 0
+    while True:
+        data = fetch_klines(symbol, interval, MAX_KLINES_PER_REQUEST, start_time=cursor)
+        if not data:
+            break
+        written += store.append(symbol, interval, parse_klines(data), start=cursor)
+        if len(data) < MAX_KLINES_PER_REQUEST:
+            break
+        cursor = data[-1][0] + INTERVAL_MS[interval]
+    return written
+
+
+class KlineCache:
+    """LRU cache holding the longest kline window fetched per (symbol, interval)
+
+    Smaller windows are served by slicing. Once an entry is older than `ttl`
+    seconds only the candles from the last cached open time onward are
+    downloaded and appended, since the last cached candle may still have
+    been forming. Entries are evicted least-recently-used first once the
+    cached frames exceed `max_bytes`.
+
+    With a KlineStore, cold windows are read from local disk and only the
+    candles after the newest stored one are downloaded; newly closed
+    candles are written back to the store.
+    """
+
+    def __init__(self, ttl=10, max_bytes=32 * 1024 * 1024, store=None):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.store = store
+        self.entries = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def get(self, symbol, interval, limit):
+        """Return the latest `limit` candles, or None if they cannot be fetched"""
+        key = (symbol, interval)
+        entry = self.entries.get(key)
+
+        if entry is None or len(entry['df']) < limit:
+            try:
+                df = self._load(symbol, interval, limit)
+            except (HttpError, ValueError):
+                return None
+            self._store(key, df)
+        else:
+            df = entry['df']
+            if time.time() - entry['fetched'] > self.ttl:
+                try:
+                    df = self._refresh(symbol, interval, df)
+                    self._store(key, df)
+                except (HttpError, ValueError):
+                    # Serve the stale window rather than nothing
+                    pass
+            with self.lock:
+                if key in self.entries:
+                    self.entries.move_to_end(key)
+
+        return df.iloc[-limit:].reset_index(drop=True)
+
+    def peek(self, symbol, interval, limit):
+        """The latest `limit` candles if they are in memory and fresh, else None; never fetches"""
+        key = (symbol, interval)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or len(entry['df']) < limit or time.time() - entry['fetched'] > self.ttl:
+                return None
+            self.entries.move_to_end(key)
+            df = entry['df']
+        return df.iloc[-limit:].reset_index(drop=True)
+
+    def _load(self, symbol, interval, limit):
+        stored = self._read_store(symbol, interval, limit)
+        if stored is not None and len(stored) == limit:
+            first_open = int(stored['timestamp'].iloc[0].value // 1_000_000)
+            last_open = int(stored['timestamp'].iloc[-1].value // 1_000_000)
+            behind = (time.time() * 1000 - last_open) / INTERVAL_MS[interval]
+            # Stores written before appends had to be contiguous may span a gap
+            contiguous = last_open - first_open == (limit - 1) * INTERVAL_MS[interval]
+            if contiguous and behind < MAX_KLINES_PER_REQUEST:
+                # Only the tail after the newest stored candle goes over the network
+                start = last_open + INTERVAL_MS[interval]
+                tail = parse_klines(fetch_klines(symbol, interval, MAX_KLINES_PER_REQUEST, start_time=start))
+                self._write_store(symbol, interval, tail, start)
+                merged = pd.concat([stored, tail], ignore_index=True)
+                return merged.iloc[-limit:].reset_index(drop=True)
+
+        df = parse_klines(fetch_klines(symbol, interval, limit))
+        self._write_store(symbol, interval, df)
+        return df
+
+    def _read_store(self, symbol, interval, limit):
+        if self.store is None or interval not in INTERVAL_MS:
+            return None
+        try:
+            return self.store.read(symbol, interval, limit=limit)
+        except (OSError, ValueError):
+            return None
+
+    def _write_store(self, symbol, interval, df, start=None):
+        if self.store is None or interval not in INTERVAL_MS or df.empty:
+            return
+        try:
+            self.store.append(symbol, interval, df, start=start)
+        except OSError:
+            # The store is an optimization; a read-only disk must not break live data
+            pass
+
+    def _refresh(self, symbol, interval, df):
+        last_open = df['timestamp'].iloc[-1].value // 1_000_000
+        data = fetch_klines(symbol, interval, MAX_KLINES_PER_REQUEST, start_time=last_open)
+        if len(data) >= MAX_KLINES_PER_REQUEST:
+            # Too far behind to patch the tail; reload the whole window
+            return parse_klines(fetch_klines(symbol, interval, len(df)))
+
+        tail = parse_klines(data)
+        self._write_store(symbol, interval, tail, last_open)
+        if tail.empty:
+            return df
+        kept = df[df['timestamp'] < tail['timestamp'].iloc[0]]
+        merged = pd.concat([kept, tail], ignore_index=True)
+        return merged.iloc[-len(df):].reset_index(drop=True)
+
+    def _store(self, key, df):
+        nbytes = int(df.memory_usage(deep=True).sum())
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.size -= old['bytes']
+
+            self.entries[key] = {'df': df, 'fetched': time.time(), 'bytes': nbytes}
+            self.size += nbytes
+
+            while self.size > self.max_bytes and len(self.entries) > 1:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= evicted['bytes']
+
+
+kline_cache = KlineCache(store=KlineStore(os.environ.get('KLINE_STORE_DIR', DEFAULT_ROOT)))
+
+
+@profiler.timed('fetch.klines')
+def get_market_data(symbol, interval='1h', limit=100):
+    """Get historical market data"""
+    return kline_cache.get(symbol, interval, limit)
+
+
+# Shared by every concurrent fetch so a rerun never spawns its own threads
+fetch_pool = ThreadPoolExecutor(max_workers=16, thread_name_prefix='market-data')
+
+
+@profiler.timed('fetch.symbol_data')
+def fetch_symbol_data(symbols, interval='1h', limit=24, deadline=5.0, source=None):
+    """Fetch prices and klines for every symbol concurrently under one deadline
+
+    Returns (prices, frames). Symbols whose data is not back before the
+    deadline, or failed, map to None so callers can skip them. `source`
+    is an object with prices() and klines() such as a data_hub.DataHub;
+    by default Binance is asked directly.
+    """
+    get_prices = get_crypto_prices if source is None else source.prices
+    get_klines = get_market_data if source is None else source.klines
+    price_future = fetch_pool.submit(get_prices, symbols)
+    kline_futures = {symbol: fetch_pool.submit(get_klines, symbol, interval, limit)
+                     for symbol in symbols}
+    wait([price_future, *kline_futures.values()], timeout=deadline)
+
+    batch = _result(price_future) or {}
+    prices = {symbol: batch.get(symbol) for symbol in symbols}
+    frames = {symbol: _result(future) for symbol, future in kline_futures.items()}
+    return prices, frames
+
+
+def _result(future):
+    if not future.done() or future.exception() is not None:
+        return None
+    return future.result()
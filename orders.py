@@ -0,0 +1,356 @@
+import heapq
+import itertools
+from collections import deque
+
+import trading
+
+ORDER_KINDS = ('stop', 'take_profit', 'trailing_stop')
+
+
+class Order:
+    """A resting exit order on one open position
+
+    `side` is the action that closes the position: SELL for a long, BUY
+    for a short. A stop fires when the price moves against the position
+    to `trigger`, a take-profit when it moves in its favour to `trigger`,
+    and a trailing stop when the price gives back `trail_pct` percent of
+    the best price seen since the order was placed. `amount` None closes
+    the whole position. Orders sharing an `oco` group cancel each other
+    when one of them fills.
+    """
+
+    def __init__(self, order_id, symbol, kind, side, trigger=None, trail_pct=None, amount=None, oco=None):
+        self.id = order_id
+        self.symbol = symbol
+        self.kind = kind
+        self.side = side
+        self.trigger = trigger
+        self.trail_pct = trail_pct
+        self.amount = amount
+        self.oco = oco
+        self.status = 'open'
+        self.fill_price = None
+        self.message = None
+
+    @property
+    def falling(self):
+        """Whether the order fires on a falling price rather than a rising one"""
+        return (self.side == 'SELL') == (self.kind != 'take_profit')
+
+    def describe(self):
+        if self.kind == 'trailing_stop':
+            level = f"trailing {self.trail_pct:g}%"
+        else:
+            level = f"{'≤' if self.falling else '≥'} ${self.trigger:,.2f}"
+        size = "all" if self.amount is None else f"{self.amount:.6f}"
+        return f"{self.kind.replace('_', ' ')} {self.side} {size} {self.symbol} {level}"
+
+    def to_dict(self):
+        return {
+            'id': self.id, 'symbol': self.symbol, 'kind': self.kind, 'side': self.side,
+            'trigger': self.trigger, 'trail_pct': self.trail_pct, 'amount': self.amount, 'oco': self.oco,
+            'status': self.status, 'fill_price': self.fill_price, 'message': self.message,
+        }
+
+
+class TrailingStops:
+    """Trailing stops on one side of one symbol
+
+    Prices are handled as x = price for longs and x = -price for shorts,
+    so every order trails a running maximum `peak` of x and fires once
+    x <= peak * (1 - sign * trail_pct / 100). Orders placed before the
+    same new high share a peak, so they are kept in groups, each a heap
+    by trail_pct. After every tick all peaks are at least x, so a new
+    group always has the lowest peak and the groups form a stack; a tick
+    merges only the groups it overtakes, smaller heaps into the largest.
+    A heap over the groups' triggers finds the ones that fire.
+    """
+
+    def __init__(self, sign):
+        self.sign = sign
+        self.groups = []
+        self.triggers = []
+        self.sequence = itertools.count()
+        # Number of times a new best price moved the peaks
+        self.advances = 0
+
+    def add(self, order, price):
+        x = self.sign * price
+        self._advance(x)
+        group = {'peak': x, 'orders': [], 'alive': True}
+        self.groups.append(group)
+        heapq.heappush(group['orders'], (order.trail_pct, order.id, order))
+        self._push(group)
+
+    def fire(self, price):
+        """Orders whose trailing stop `price` reaches, best trigger first"""
+        x = self.sign * price
+        self._advance(x)
+        fired = []
+        while self.triggers:
+            key, _, group = self.triggers[0]
+            trigger = self._trigger(group)
+            if trigger is None or -key != trigger:
+                # Stale entry: the group was merged away or lost its tightest order
+                heapq.heappop(self.triggers)
+                if trigger is not None:
+                    self._push(group)
+                continue
+            if x > trigger:
+                break
+            heapq.heappop(self.triggers)
+            fired.append(heapq.heappop(group['orders'])[2])
+            self._push(group)
+        return fired
+
+    def peak(self, order):
+        """Best price an open trailing order has seen"""
+        for group in self.groups:
+            if any(entry[2] is order for entry in group['orders']):
+                return self.sign * group['peak']
+        return None
+
+    def stop_price(self, order):
+        """Current stop level of an open trailing order, as a price"""
+        peak = self.peak(order)
+        return None if peak is None else peak * (1 - self.sign * order.trail_pct / 100)
+
+    def _trigger(self, group):
+        orders = group['orders']
+        while orders and orders[0][2].status != 'open':
+            heapq.heappop(orders)
+        if not group['alive'] or not orders:
+            return None
+        return group['peak'] * (1 - self.sign * orders[0][0] / 100)
+
+    def _push(self, group):
+        trigger = self._trigger(group)
+        if trigger is not None:
+            heapq.heappush(self.triggers, (-trigger, next(self.sequence), group))
+
+    def _advance(self, x):
+        overtaken = []
+        while self.groups and self.groups[-1]['peak'] < x:
+            group = self.groups.pop()
+            group['alive'] = False
+            overtaken.append(group)
+        if not overtaken:
+            return
+        self.advances += 1
+        orders = max((group['orders'] for group in overtaken), key=len)
+        for group in overtaken:
+            if group['orders'] is not orders:
+                for entry in group['orders']:
+                    heapq.heappush(orders, entry)
+        merged = {'peak': x, 'orders': orders, 'alive': True}
+        self.groups.append(merged)
+        self._push(merged)
+
+
+class OrderBook:
+    """Resting stop, take-profit and trailing-stop orders for one portfolio
+
+    Stops and take-profits sit in two heaps per symbol: orders that fire
+    on a falling price, highest trigger first, and orders that fire on a
+    rising price, lowest first. A tick therefore only looks at the tops
+    of the heaps and costs O(log n) per order it fires, however many
+    orders rest. Cancelled and filled orders stay in the heaps and are
+    dropped when they surface (lazy deletion); the heaps are rebuilt
+    once such leftovers outnumber the open orders. Fills go through
+    trading.execute_trade at the tick price.
+    """
+
+    def __init__(self, history=100):
+        self.open = {}
+        # (symbol, side) -> {id: order}, and OCO group -> {id: order}, open orders only
+        self.sides = {}
+        self.oco_groups = {}
+        self.history = deque(maxlen=history)
+        self.falling = {}
+        self.rising = {}
+        self.trails = {}
+        self.ids = itertools.count(1)
+        self.oco_ids = itertools.count(1)
+        self.leftovers = 0
+        self.edits = 0
+        # Value of `changes` when a store last saved the book
+        self.saved = 0
+
+    def __len__(self):
+        return len(self.open)
+
+    @property
+    def changes(self):
+        """Counter that moves whenever an order is placed or finished or a trailing stop ratchets"""
+        return self.edits + sum(trail.advances for trail in self.trails.values())
+
+    def symbols(self):
+        """Symbols that have open orders, i.e. the ones ticks matter for"""
+        return {symbol for (symbol, _), orders in self.sides.items() if orders}
+
+    def orders(self, symbol=None):
+        if symbol is None:
+            return list(self.open.values())
+        return [order for side in ('SELL', 'BUY') for order in self.sides.get((symbol, side), {}).values()]
+
+    def place(self, positions, symbol, kind, price, trigger=None, trail_pct=None, amount=None, oco=None):
+        """Attach an exit order to the open `symbol` position, given the current `price`
+
+        Returns (order, message); order is None if it was refused. A
+        `price` of None skips the check that the order would not trigger
+        at once, for orders restored with their saved trigger.
+        """
+        position = positions.get(symbol)
+        if position is None:
+            return None, f"No open {symbol} position"
+        if kind not in ORDER_KINDS:
+            return None, f"Unknown order type {kind}"
+        side = 'SELL' if position['amount'] > 0 else 'BUY'
+        order = Order(next(self.ids), symbol, kind, side, trigger, trail_pct, amount, oco)
+
+        if kind == 'trailing_stop':
+            if not trail_pct or not 0 < trail_pct < 100:
+                return None, "Trailing distance must be between 0 and 100%"
+            self.trails.setdefault((symbol, side), TrailingStops(1 if side == 'SELL' else -1)).add(order, price)
+        else:
+            if not trigger or trigger <= 0:
+                return None, "Trigger price must be positive"
+            if price is not None and ((price <= trigger) if order.falling else (price >= trigger)):
+                return None, f"{order.describe()} would trigger at once at ${price:,.2f}"
+            book = self.falling if order.falling else self.rising
+            heapq.heappush(book.setdefault(symbol, []), (-trigger if order.falling else trigger, order.id, order))
+        self.open[order.id] = order
+        self.sides.setdefault((symbol, side), {})[order.id] = order
+        if oco is not None:
+            self.oco_groups.setdefault(oco, {})[order.id] = order
+        self.edits += 1
+        return order, f"Placed {order.describe()}"
+
+    def bracket(self, positions, symbol, price, stop_loss=None, take_profit=None, trail_pct=None, amount=None):
+        """Place whichever of a stop, take-profit and trailing stop are given as one OCO group
+
+        Returns (orders, messages).
+        """
+        oco = next(self.oco_ids)
+        placed, messages = [], []
+        for kind, trigger, trail in (('stop', stop_loss, None), ('take_profit', take_profit, None),
+                                     ('trailing_stop', None, trail_pct)):
+            if trigger or trail:
+                order, message = self.place(positions, symbol, kind, price, trigger, trail, amount, oco)
+                messages.append(message)
+                if order is not None:
+                    placed.append(order)
+        return placed, messages
+
+    def cancel(self, order_id, reason="Cancelled"):
+        order = self.open.get(order_id)
+        if order is not None:
+            self._finish(order, 'cancelled', reason)
+        return order
+
+    def on_price(self, portfolio, symbol, price, timestamp=None):
+        """Fill every open `symbol` order that `price` triggers; returns the orders it finished"""
+        fired = []
+        for book, crossed in ((self.falling, lambda key: -key >= price), (self.rising, lambda key: key <= price)):
+            heap = book.get(symbol)
+            while heap and (heap[0][2].status != 'open' or crossed(heap[0][0])):
+                order = heapq.heappop(heap)[2]
+                if order.status == 'open':
+                    fired.append(order)
+                else:
+                    self.leftovers -= 1
+        for side in ('SELL', 'BUY'):
+            trail = self.trails.get((symbol, side))
+            if trail is not None:
+                fired += trail.fire(price)
+
+        finished = []
+        # Oldest first; an earlier fill may close the position or cancel a later order's OCO group
+        for order in sorted(fired, key=lambda order: order.id):
+            if order.status == 'open':
+                self._fill(portfolio, order, price, timestamp)
+                finished.append(order)
+        if finished:
+            self.reconcile(portfolio['positions'], symbol)
+        return finished
+
+    def reconcile(self, positions, symbol=None):
+        """Cancel orders whose position has been closed or flipped, e.g. by a manual trade"""
+        for key in [key for key in self.sides if symbol is None or key[0] == symbol]:
+            held = positions.get(key[0], {}).get('amount', 0.0)
+            if not held or (held > 0) != (key[1] == 'SELL'):
+                for order in list(self.sides[key].values()):
+                    self._finish(order, 'cancelled', "Position closed")
+
+    def snapshot(self):
+        """Open orders as plain dicts that restore() can place again; trailing stops keep their peak"""
+        rows = []
+        for order in sorted(self.open.values(), key=lambda order: order.id):
+            row = {'symbol': order.symbol, 'kind': order.kind, 'side': order.side, 'trigger': order.trigger,
+                   'trail_pct': order.trail_pct, 'amount': order.amount, 'oco': order.oco}
+            if order.kind == 'trailing_stop':
+                row['peak'] = self.trails[(order.symbol, order.side)].peak(order)
+            rows.append(row)
+        return rows
+
+    def restore(self, positions, rows):
+        """Place orders saved by snapshot() again, skipping any whose position has closed or flipped"""
+        groups = {}
+        for row in rows:
+            held = positions.get(row['symbol'], {}).get('amount', 0.0)
+            if not held or (held > 0) != (row['side'] == 'SELL'):
+                continue
+            oco = row['oco']
+            if oco is not None:
+                oco = groups.setdefault(oco, next(self.oco_ids))
+            self.place(positions, row['symbol'], row['kind'], row.get('peak'), row['trigger'], row['trail_pct'],
+                       row['amount'], oco)
+        return self
+
+    def stop_price(self, order):
+        """Price an open order fires at; for trailing stops the current level"""
+        if order.kind != 'trailing_stop':
+            return order.trigger
+        return self.trails[(order.symbol, order.side)].stop_price(order)
+
+    def _fill(self, portfolio, order, price, timestamp):
+        position = portfolio['positions'].get(order.symbol)
+        held = position['amount'] if position else 0.0
+        if not held or (held > 0) != (order.side == 'SELL'):
+            self._finish(order, 'cancelled', "Position closed", resting=False)
+            return
+        amount = abs(held) if order.amount is None else min(order.amount, abs(held))
+        success, message = trading.execute_trade(portfolio, order.side, order.symbol, amount, price,
+                                                 position['leverage'], timestamp)
+        if not success:
+            self._finish(order, 'rejected', message, resting=False)
+            return
+        order.fill_price = price
+        self._finish(order, 'filled', message, resting=False)
+        for sibling in list(self.oco_groups.get(order.oco, {}).values()):
+            self._finish(sibling, 'cancelled', f"OCO: {order.kind.replace('_', ' ')} filled")
+
+    def _finish(self, order, status, message, resting=True):
+        """Close out an order; `resting` if it is still in a trigger heap"""
+        order.status = status
+        order.message = message
+        self.edits += 1
+        del self.open[order.id]
+        del self.sides[(order.symbol, order.side)][order.id]
+        if order.oco is not None:
+            del self.oco_groups[order.oco][order.id]
+            if not self.oco_groups[order.oco]:
+                del self.oco_groups[order.oco]
+        self.history.append(order)
+        if resting and order.kind != 'trailing_stop':
+            self.leftovers += 1
+            if self.leftovers > max(64, len(self.open)):
+                self._compact()
+
+    def _compact(self):
+        """Rebuild the trigger heaps from the open orders, dropping finished ones"""
+        for book in (self.falling, self.rising):
+            for symbol, heap in book.items():
+                heap[:] = [entry for entry in heap if entry[2].status == 'open']
+                heapq.heapify(heap)
+        self.leftovers = 0
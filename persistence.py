@@ -0,0 +1,344 @@
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+import trading
+from ledger import ACTIONS, TRADE_DTYPE, Ledger
+from orders import OrderBook
+
+DEFAULT_DB_PATH = os.path.join('data', 'portfolio.db')
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS accounts (
+    account TEXT PRIMARY KEY,
+    start_value REAL NOT NULL,
+    start_time TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS fills (
+    account TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    timestamp INTEGER NOT NULL,
+    action INTEGER NOT NULL,
+    symbol TEXT NOT NULL,
+    amount REAL NOT NULL,
+    price REAL NOT NULL,
+    leverage REAL NOT NULL,
+    cost REAL,
+    profit REAL,
+    proceeds REAL,
+    PRIMARY KEY (account, seq)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS snapshots (
+    account TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    created REAL NOT NULL,
+    cash REAL NOT NULL,
+    positions TEXT NOT NULL,
+    trades BLOB NOT NULL,
+    PRIMARY KEY (account, seq)
+);
+CREATE TABLE IF NOT EXISTS orders (
+    account TEXT PRIMARY KEY,
+    updated REAL NOT NULL,
+    orders TEXT NOT NULL
+);
+"""
+
+FILL_COLUMNS = list(TRADE_DTYPE.names)
+
+
+class PortfolioStore:
+    """Durable paper-trading accounts in SQLite, shared by app sessions and agents
+
+    Every fill is appended to the `fills` table, which acts as the
+    write-ahead log. A single writer thread commits queued fills in
+    batches (up to `batch_size` rows, or whatever arrived within
+    `flush_interval` seconds), so one fsync covers many fills. Every
+    `snapshot_every` fills a snapshot stores cash, positions and the
+    ledger rows since the previous snapshot as a columnar blob, so
+    recovery concatenates the blobs and replays only the fills after the
+    last snapshot through trading.execute_trade. Each account's open
+    exit orders are kept beside it as one JSON row, rewritten whenever
+    the order book changes.
+
+    Accounts are independent; several processes may use one database
+    file. Loaded portfolios carry how much of them is persisted, so
+    several sessions can hold the same account. Fills are only written
+    if they continue the account's stored history, checked in the same
+    transaction; if another session appended first the batch is
+    rejected, record() reports it and rebase() replays the session's
+    unstored fills on the reloaded account.
+    """
+
+    def __init__(self, path=DEFAULT_DB_PATH, batch_size=256, flush_interval=0.05, snapshot_every=10000):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.snapshot_every = snapshot_every
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with self.connect() as db:
+            db.executescript(SCHEMA)
+        # Kept open so checking for other writers on every rerun is one indexed query
+        self.reader = self.connect()
+        self.reader_lock = threading.Lock()
+        self.lock = threading.Lock()
+        self.queue = queue.Queue()
+        self.writer = threading.Thread(target=self._write_loop, name='portfolio-store', daemon=True)
+        self.writer.start()
+
+    def connect(self):
+        db = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+        db.execute("PRAGMA journal_mode=WAL")
+        # Each commit is fsynced; batching commits is what keeps that cheap
+        db.execute("PRAGMA synchronous=FULL")
+        return db
+
+    def accounts(self):
+        with self.connect() as db:
+            return [row[0] for row in db.execute("SELECT account FROM accounts ORDER BY account")]
+
+    def load(self, account, cash=trading.STARTING_CASH):
+        """Recover an account's portfolio, creating the account if it is new"""
+        self.flush()
+        db = self.connect()
+        try:
+            row = db.execute("SELECT start_value, start_time FROM accounts WHERE account = ?",
+                             (account,)).fetchone()
+            if row is None:
+                portfolio = trading.new_portfolio(cash)
+                with db:
+                    db.execute("INSERT INTO accounts VALUES (?, ?, ?)",
+                               (account, cash, portfolio['start_time'].isoformat()))
+                self._track(portfolio, 0)
+                return portfolio
+
+            portfolio = trading.new_portfolio(row[0], datetime.fromisoformat(row[1]))
+            snapshots = db.execute("SELECT seq, cash, positions, trades FROM snapshots WHERE account = ? "
+                                   "ORDER BY seq", (account,)).fetchall()
+            seq = 0
+            if snapshots:
+                seq, portfolio['cash'], positions, _ = snapshots[-1]
+                portfolio['positions'] = json.loads(positions)
+                records = np.concatenate([np.frombuffer(blob, dtype=TRADE_DTYPE) for *_, blob in snapshots])
+                portfolio['trade_history'] = Ledger.from_records(records)
+
+            tail = db.execute(f"SELECT {', '.join(FILL_COLUMNS)} FROM fills WHERE account = ? AND seq >= ? "
+                              "ORDER BY seq", (account, seq)).fetchall()
+        finally:
+            db.close()
+
+        # Replaying through the trading rules rebuilds cash, positions and ledger rows alike
+        for timestamp, action, symbol, amount, price, leverage, *_ in tail:
+            trading.execute_trade(portfolio, ACTIONS[action], symbol, amount, price, leverage, timestamp)
+        self._track(portfolio, seq)
+        return portfolio
+
+    def reset(self, account, cash=trading.STARTING_CASH):
+        """Delete an account's history and start it over"""
+        self.flush()
+        with self.connect() as db:
+            for table in ('fills', 'snapshots', 'orders', 'accounts'):
+                db.execute(f"DELETE FROM {table} WHERE account = ?", (account,))
+        return self.load(account, cash)
+
+    def head(self, account):
+        """Number of fills committed for `account`, by any writer"""
+        with self.reader_lock:
+            return _head(self.reader, account)
+
+    def is_stale(self, account, portfolio):
+        """Whether another writer has moved the account past this loaded portfolio"""
+        return portfolio['conflict'] or self.head(account) > portfolio['queued']
+
+    def record(self, account, portfolio, wait=False):
+        """Queue fills the portfolio's ledger gained since the last call, and a snapshot when due
+
+        Returns False once a batch of this portfolio's fills was rejected
+        because another writer appended to the account first; with `wait`
+        it blocks until the new fills are committed or rejected.
+        """
+        ledger = portfolio['trade_history']
+        with self.lock:
+            start = portfolio['queued']
+            if len(ledger) > start:
+                self.queue.put(('fills', account, portfolio, start, ledger.records[start:].copy()))
+                portfolio['queued'] = len(ledger)
+                if len(ledger) - portfolio['snapshotted'] >= self.snapshot_every:
+                    self._queue_snapshot(account, portfolio)
+        if wait:
+            self.flush()
+        return not portfolio['conflict']
+
+    def rebase(self, account, portfolio, attempts=3):
+        """Reload an account another writer moved and replay the portfolio's unstored fills on it
+
+        Fills the trading rules now refuse are dropped. Returns the
+        reloaded portfolio and the number of fills dropped.
+        """
+        self.flush()
+        with self.lock:
+            pending = portfolio['trade_history'].records[portfolio['persisted']:].copy()
+        for _ in range(attempts):
+            rebased = self.load(account)
+            dropped = 0
+            for row in pending:
+                success, _ = trading.execute_trade(rebased, ACTIONS[row['action']], row['symbol'].decode(),
+                                                   float(row['amount']), float(row['price']),
+                                                   float(row['leverage']), int(row['timestamp']))
+                dropped += not success
+            if self.record(account, rebased, wait=True):
+                return rebased, dropped
+        return self.load(account), len(pending)
+
+    def snapshot(self, account, portfolio):
+        """Queue a snapshot of the portfolio as it is now"""
+        with self.lock:
+            if len(portfolio['trade_history']) > portfolio['snapshotted']:
+                self._queue_snapshot(account, portfolio)
+
+    def save_orders(self, account, book):
+        """Queue the account's open exit orders if the book changed since it was last saved"""
+        changes = book.changes
+        if changes != book.saved:
+            self.queue.put(('orders', account, json.dumps(book.snapshot()), book))
+            book.saved = changes
+
+    def load_orders(self, account, positions):
+        """The account's saved exit orders, as an OrderBook on `positions`"""
+        self.flush()
+        with self.reader_lock:
+            row = self.reader.execute("SELECT orders FROM orders WHERE account = ?", (account,)).fetchone()
+        book = OrderBook().restore(positions, json.loads(row[0]) if row else [])
+        book.saved = book.changes
+        return book
+
+    def flush(self, timeout=None):
+        """Block until everything queued so far is committed"""
+        done = threading.Event()
+        self.queue.put(('flush', done))
+        return done.wait(timeout)
+
+    def close(self):
+        self.flush()
+        self.queue.put(None)
+        self.writer.join()
+        self.reader.close()
+
+    def _track(self, portfolio, snapshotted):
+        """Remember on the portfolio itself how much of it is stored (persisted) or on its way (queued)"""
+        portfolio['persisted'] = portfolio['queued'] = len(portfolio['trade_history'])
+        portfolio['snapshotted'] = snapshotted
+        portfolio['conflict'] = False
+
+    def _queue_snapshot(self, account, portfolio):
+        ledger = portfolio['trade_history']
+        start = portfolio['snapshotted']
+        positions = json.dumps(portfolio['positions'])
+        self.queue.put(('snapshot', account, len(ledger), portfolio['cash'], positions,
+                        ledger.records[start:].tobytes(), portfolio))
+        portfolio['snapshotted'] = len(ledger)
+
+    def _write_loop(self):
+        db = self.connect()
+        # Transactions are opened explicitly, so each head check and insert run under one write lock
+        db.isolation_level = None
+        while True:
+            item = self.queue.get()
+            batch = [item]
+            # Group whatever arrives shortly after the first item into one transaction
+            deadline = time.monotonic() + self.flush_interval
+            while item is not None and item[0] != 'flush' and len(batch) < self.batch_size:
+                try:
+                    item = self.queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                batch.append(item)
+
+            events = [item[1] for item in batch if item is not None and item[0] == 'flush']
+            try:
+                outcomes = self._write_batch(db, batch)
+            except sqlite3.Error:
+                # The database stays locked past the busy timeout, or the disk is full: the batch is
+                # dropped, its portfolios are marked in conflict so their sessions rebase and write their
+                # fills again, and the writer carries on with the next batch
+                logger.exception("Portfolio store write of %d items failed", len(batch))
+                if db.in_transaction:
+                    db.execute("ROLLBACK")
+                outcomes = self._failed(batch)
+            with self.lock:
+                for portfolio, end, written in outcomes:
+                    if written:
+                        portfolio['persisted'] = max(portfolio['persisted'], end)
+                    else:
+                        portfolio['conflict'] = True
+            for event in events:
+                event.set()
+            if batch[-1] is None:
+                db.close()
+                return
+
+    def _write_batch(self, db, batch):
+        """Write a batch in one transaction; returns (portfolio, end, written) per batch of fills"""
+        outcomes = []
+        db.execute("BEGIN IMMEDIATE")
+        for item in batch:
+            if item is None or item[0] == 'flush':
+                continue
+            if item[0] == 'fills':
+                outcomes.append((item[2], item[3] + len(item[4]), self._write_fills(db, *item[1:])))
+            elif item[0] == 'orders':
+                db.execute("INSERT OR REPLACE INTO orders VALUES (?, ?, ?)", (item[1], time.time(), item[2]))
+            elif _head(db, item[1]) == item[2]:
+                # A snapshot of a portfolio whose fills were rejected describes no stored history
+                db.execute("INSERT OR REPLACE INTO snapshots VALUES (?, ?, ?, ?, ?, ?)",
+                           (item[1], item[2], time.time(), item[3], item[4], item[5]))
+        db.execute("COMMIT")
+        return outcomes
+
+    def _failed(self, batch):
+        """Outcomes of a batch that was rolled back; order books are saved again by the next save_orders()"""
+        outcomes = []
+        for item in batch:
+            if item is None or item[0] == 'flush':
+                continue
+            if item[0] == 'fills':
+                outcomes.append((item[2], item[3] + len(item[4]), False))
+            elif item[0] == 'orders':
+                item[3].saved = None
+            else:
+                # Its rows would be missing from the snapshot blobs; rebasing reloads where they start
+                outcomes.append((item[6], item[2], False))
+        return outcomes
+
+    def _write_fills(self, db, account, portfolio, start, rows):
+        """Insert fills numbered from `start` if the account's history ends there; returns whether it did"""
+        if _head(db, account) != start:
+            # Another session appended first; its fills stand and this batch is refused whole
+            return False
+        values = [(account, start + i, int(row['timestamp']), int(row['action']), row['symbol'].decode(),
+                   float(row['amount']), float(row['price']), float(row['leverage']),
+                   _nullable(row['cost']), _nullable(row['profit']), _nullable(row['proceeds']))
+                  for i, row in enumerate(rows)]
+        db.executemany(f"INSERT INTO fills VALUES ({', '.join('?' * (len(FILL_COLUMNS) + 2))})", values)
+        return True
+
+
+def _head(db, account):
+    row = db.execute("SELECT MAX(seq) FROM fills WHERE account = ?", (account,)).fetchone()
+    return 0 if row[0] is None else row[0] + 1
+
+
+def _nullable(value):
+    return None if np.isnan(value) else float(value)
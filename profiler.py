@@ -0,0 +1,186 @@
+import functools
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import numpy as np
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+# Prefix of every exported Prometheus metric
+METRIC_PREFIX = 'llm_trade'
+
+
+class Profiler:
+    """Rolling latency percentiles per section, plus labelled counters
+
+    Sections are dotted names such as 'http.klines', 'llm.stream' or
+    'render.sidebar'. Each keeps its last `window` durations for
+    p50/p95/p99, and lifetime count, sum, max and error totals for rates.
+    Counters (LLM tokens, cache hits) are plain running totals keyed by
+    name and labels. Safe to use from any thread.
+    """
+
+    def __init__(self, window=1000):
+        self.window = window
+        self.sections = {}
+        self.counters = {}
+        self.lock = threading.Lock()
+        self.started = time.time()
+
+    def record(self, section, seconds, error=False):
+        with self.lock:
+            entry = self.sections.get(section)
+            if entry is None:
+                entry = self.sections[section] = {
+                    'samples': deque(maxlen=self.window), 'count': 0, 'sum': 0.0, 'max': 0.0, 'errors': 0,
+                }
+            entry['samples'].append(seconds)
+            entry['count'] += 1
+            entry['sum'] += seconds
+            entry['max'] = max(entry['max'], seconds)
+            entry['errors'] += bool(error)
+
+    def count(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    @contextmanager
+    def timer(self, section):
+        """Time the block; an exception is recorded as an error and re-raised"""
+        started = time.perf_counter()
+        error = False
+        try:
+            yield
+        except BaseException:
+            error = True
+            raise
+        finally:
+            self.record(section, time.perf_counter() - started, error)
+
+    def timed(self, section):
+        """Decorator timing every call of a function"""
+        def decorate(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                with self.timer(section):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def stopwatch(self, prefix):
+        """A Stopwatch recording consecutive laps as `prefix.<lap>` sections"""
+        return Stopwatch(self, prefix)
+
+    def reset(self):
+        with self.lock:
+            self.sections.clear()
+            self.counters.clear()
+            self.started = time.time()
+
+    def table(self):
+        """One row per section with its rolling percentiles in milliseconds, slowest p95 first"""
+        with self.lock:
+            entries = [(section, np.array(entry['samples']), dict(entry)) for section, entry in
+                       self.sections.items()]
+        rows = []
+        for section, samples, entry in entries:
+            p50, p95, p99 = np.quantile(samples, QUANTILES) * 1000
+            rows.append({
+                'section': section, 'count': entry['count'], 'errors': entry['errors'],
+                'p50_ms': p50, 'p95_ms': p95, 'p99_ms': p99, 'max_ms': entry['max'] * 1000,
+                'mean_ms': entry['sum'] / entry['count'] * 1000,
+            })
+        return sorted(rows, key=lambda row: -row['p95_ms'])
+
+    def counter_rows(self):
+        with self.lock:
+            items = list(self.counters.items())
+        return [{'counter': name, **dict(labels), 'value': value} for (name, labels), value in sorted(items)]
+
+    def to_prometheus(self):
+        """All metrics in the Prometheus text exposition format"""
+        with self.lock:
+            entries = [(section, np.array(entry['samples']), dict(entry)) for section, entry in
+                       self.sections.items()]
+            counters = sorted(self.counters.items())
+
+        name = f"{METRIC_PREFIX}_latency_seconds"
+        lines = [f"# HELP {name} Latency of instrumented sections over the last samples",
+                 f"# TYPE {name} summary"]
+        for section, samples, entry in sorted(entries, key=lambda item: item[0]):
+            label = f'section="{section}"'
+            for quantile, value in zip(QUANTILES, np.quantile(samples, QUANTILES)):
+                lines.append(f'{name}{{{label},quantile="{quantile:g}"}} {value:.6f}')
+            lines.append(f"{name}_sum{{{label}}} {entry['sum']:.6f}")
+            lines.append(f"{name}_count{{{label}}} {entry['count']}")
+
+        errors = f"{METRIC_PREFIX}_errors_total"
+        lines += [f"# HELP {errors} Instrumented sections that raised", f"# TYPE {errors} counter"]
+        lines += [f'{errors}{{section="{section}"}} {entry["errors"]}' for section, _, entry in sorted(
+            entries, key=lambda item: item[0])]
+
+        declared = set()
+        for (counter, labels), value in counters:
+            metric = f"{METRIC_PREFIX}_{counter.replace('.', '_')}_total"
+            if metric not in declared:
+                declared.add(metric)
+                lines.append(f"# TYPE {metric} counter")
+            label_text = ",".join(f'{key}="{_escape(value)}"' for key, value in labels)
+            lines.append(f"{metric}{{{label_text}}} {value:g}" if label_text else f"{metric} {value:g}")
+        return "\n".join(lines) + "\n"
+
+    def to_json_lines(self):
+        """One JSON object per section and counter, stamped with the current time"""
+        now = time.time()
+        records = [{'time': now, 'type': 'latency', **row} for row in self.table()]
+        records += [{'time': now, 'type': 'counter', **row} for row in self.counter_rows()]
+        return "".join(json.dumps(record) + "\n" for record in records)
+
+    def export(self, path):
+        """Write metrics to `path` atomically: JSON lines for .jsonl files, Prometheus text otherwise"""
+        text = self.to_json_lines() if path.endswith('.jsonl') else self.to_prometheus()
+        directory, name = os.path.split(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        # A temp file of its own, so threads exporting at once never rename each other's
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f"{name}.", suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(text)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+
+class Stopwatch:
+    """Times consecutive stretches of straight-line code, such as a Streamlit rerun
+
+    Each lap() records the time since the previous lap (or the start) as
+    `prefix.<name>`; total() records the time since the start.
+    """
+
+    def __init__(self, profiler, prefix):
+        self.profiler = profiler
+        self.prefix = prefix
+        self.started = self.last = time.perf_counter()
+
+    def lap(self, name):
+        now = time.perf_counter()
+        self.profiler.record(f"{self.prefix}.{name}", now - self.last)
+        self.last = now
+
+    def total(self, name='total'):
+        self.profiler.record(f"{self.prefix}.{name}", time.perf_counter() - self.started)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+profiler = Profiler()
@@ -0,0 +1,82 @@
+import json
+
+from indicators import compute, format_for_prompt
+from signals import JSON_FORMAT
+
+
+def market_overview(symbols, prices, frames, get_price=None):
+    """Markdown market context and quantized-cache state for the recommendation prompt
+
+    `prices` and `frames` come from fetch_symbol_data(..., '1h', 100, ...);
+    `get_price` is asked for symbols whose fresh price missed the deadline.
+    Returns (context, market_state, missing_symbols).
+    """
+    context = "**REAL-TIME MARKET DATA:**\n\n"
+    market_state = {}
+    missing_symbols = []
+
+    for symbol in symbols:
+        price = prices.get(symbol) or (get_price(symbol) if get_price else None)
+        df = frames.get(symbol)
+
+        if price and df is not None:
+            # 100 candles give the indicators enough warm-up; the last 24 are the 24h stats
+            indicator_lines = format_for_prompt(compute(df))
+            df = df.tail(24)
+            change_24h = ((price - df['close'].iloc[0]) / df['close'].iloc[0]) * 100
+            volume = df['volume'].sum()
+            high_24h = df['high'].max()
+            low_24h = df['low'].min()
+            market_state[symbol] = {'price': price, 'change': change_24h,
+                                    'high': high_24h, 'low': low_24h, 'volume': volume}
+
+            context += f"""
+**{symbol}/USDT:**
+- Current: ${price:,.2f}
+- 24h Change: {change_24h:+.2f}%
+- 24h High: ${high_24h:,.2f}
+- 24h Low: ${low_24h:,.2f}
+- Volume: {volume:,.0f}
+{indicator_lines}
+
+"""
+        else:
+            missing_symbols.append(symbol)
+            context += f"**{symbol}/USDT:** data unavailable\n\n"
+
+    return context, market_state, missing_symbols
+
+
+def recommendation_prompt(market_context, portfolio, max_leverage, json_mode=False):
+    """Prompt asking for one trade in the TRADE SIGNAL format, or as JSON with `json_mode`"""
+    if json_mode:
+        output_format = JSON_FORMAT % max_leverage
+    else:
+        output_format = f"""TRADE SIGNAL: BUY/SELL
+SYMBOL: [crypto]
+AMOUNT: $[USD]
+LEVERAGE: [1-{max_leverage}]x
+ENTRY: $[price]
+TARGET: $[price] ([%] profit)
+STOP LOSS: $[price]
+REASONING: [why this wins]
+CONFIDENCE: [1-10]"""
+
+    return f"""{market_context}
+
+**PORTFOLIO:**
+- Cash: ${portfolio['cash']:.2f}
+- Positions: {json.dumps(portfolio['positions'], indent=2)}
+- Negative amounts are shorts. SELL closes a long or, without one, opens a short; BUY closes a short.
+
+**MISSION:** Analyze and provide ONE specific trade recommendation that will likely profit in the next 1-6 hours.
+
+Use DeepSeek's winning strategy:
+1. Identify strongest momentum
+2. Recommend aggressive entry with leverage
+3. Set clear profit target (5-20%)
+4. Explain why this will profit
+
+**FORMAT:**
+{output_format}
+"""
@@ -0,0 +1,213 @@
+import json
+import re
+
+# "KEY: value" lines, tolerating markdown bullets and bold around the key
+FIELD_PATTERN = re.compile(r'^[\s>*#-]*([A-Za-z][A-Za-z ]*?)\s*\**\s*:\s*\**\s*(.+?)\s*$', re.MULTILINE)
+NUMBER_PATTERN = re.compile(r'[-+]?\d[\d,]*(?:\.\d+)?|[-+]?\.\d+')
+JSON_PATTERN = re.compile(r'\{.*\}', re.DOTALL)
+
+NUMERIC_FIELDS = {
+    'AMOUNT': 'amount_usd',
+    'LEVERAGE': 'leverage',
+    'ENTRY': 'entry',
+    'TARGET': 'target',
+    'STOP LOSS': 'stop_loss',
+    'CONFIDENCE': 'confidence',
+}
+
+# Keys accepted in JSON-mode answers, mapped to TradeSignal attributes
+JSON_ALIASES = {
+    'action': 'action', 'trade_signal': 'action', 'signal': 'action',
+    'symbol': 'symbol',
+    'amount_usd': 'amount_usd', 'amount': 'amount_usd',
+    'leverage': 'leverage',
+    'entry': 'entry', 'entry_price': 'entry',
+    'target': 'target', 'target_price': 'target', 'take_profit': 'target',
+    'stop_loss': 'stop_loss', 'stop': 'stop_loss',
+    'confidence': 'confidence',
+    'reasoning': 'reasoning',
+}
+
+# Shown to the model instead of the line format when JSON mode is on
+JSON_FORMAT = """Reply with ONLY a JSON object:
+{"action": "BUY" or "SELL", "symbol": "<crypto>", "amount_usd": <number>, "leverage": <1-%d>,
+ "entry": <price>, "target": <price>, "stop_loss": <price>, "confidence": <1-10>, "reasoning": "<why this wins>"}"""
+
+
+class TradeSignal:
+    """One trade recommendation parsed from a model response
+
+    Prices and amounts are floats or None when the model left them out;
+    `amount_usd` is the position's notional value in USD.
+    """
+
+    FIELDS = ('action', 'symbol', 'amount_usd', 'leverage', 'entry', 'target', 'stop_loss',
+              'confidence', 'reasoning')
+
+    def __init__(self, action, symbol, amount_usd=None, leverage=None, entry=None, target=None,
+                 stop_loss=None, confidence=None, reasoning=""):
+        self.action = action
+        self.symbol = symbol
+        self.amount_usd = amount_usd
+        self.leverage = leverage
+        self.entry = entry
+        self.target = target
+        self.stop_loss = stop_loss
+        self.confidence = confidence
+        self.reasoning = reasoning
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.FIELDS}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**{name: data.get(name) for name in cls.FIELDS})
+
+    def validate(self, max_leverage, cash, positions, symbols=None):
+        """Problems that should stop this signal from being executed, as messages
+
+        Checks the signal against the sidebar's max leverage, the cash
+        needed as margin to open a position, and the ordering of entry,
+        target and stop loss for its direction. A BUY against a short or
+        a SELL against a long closes it; a SELL otherwise opens a short.
+        """
+        errors = []
+        if symbols is not None and self.symbol not in symbols:
+            errors.append(f"{self.symbol} is not a selected trading pair")
+        leverage = self.leverage or 1.0
+        if not 1 <= leverage <= max_leverage:
+            errors.append(f"Leverage {leverage:g}x is outside 1-{max_leverage}x")
+        if self.confidence is not None and not 1 <= self.confidence <= 10:
+            errors.append(f"Confidence {self.confidence:g} is outside 1-10")
+        if self.action not in ('BUY', 'SELL'):
+            errors.append(f"Unknown action {self.action}")
+            return errors
+
+        if self.closes(positions):
+            if self.amount_usd is not None and self.amount_usd <= 0:
+                errors.append(f"No positive USD amount to {self.action.lower()}")
+            return errors
+
+        if not self.amount_usd or self.amount_usd <= 0:
+            errors.append(f"No positive USD amount to {self.action.lower()}")
+        elif self.amount_usd / leverage > cash:
+            errors.append(f"Needs ${self.amount_usd / leverage:,.2f} margin but only ${cash:,.2f} cash")
+        if self.action == 'BUY':
+            if self.stop_loss and self.entry and self.stop_loss >= self.entry:
+                errors.append("Stop loss must be below entry for a BUY")
+            if self.target and self.entry and self.target <= self.entry:
+                errors.append("Target must be above entry for a BUY")
+        else:
+            if self.stop_loss and self.entry and self.stop_loss <= self.entry:
+                errors.append("Stop loss must be above entry for a short")
+            if self.target and self.entry and self.target >= self.entry:
+                errors.append("Target must be below entry for a short")
+        return errors
+
+    def closes(self, positions):
+        """Whether the signal trades against an open position, closing it"""
+        held = positions.get(self.symbol, {}).get('amount', 0.0)
+        return held < 0 if self.action == 'BUY' else held > 0
+
+    def order(self, price, positions):
+        """Coin amount and leverage to pass to execute_trade at `price`
+
+        A signal against an open position never exceeds it and closes
+        all of it when no amount is given.
+        """
+        leverage = self.leverage or 1.0
+        if not self.closes(positions):
+            return self.amount_usd / price, leverage
+        held = abs(positions[self.symbol]['amount'])
+        amount = held if not self.amount_usd else min(held, self.amount_usd / price)
+        return amount, leverage
+
+    def to_text(self):
+        """The signal in the prompt's TRADE SIGNAL line format"""
+        lines = [f"TRADE SIGNAL: {self.action}", f"SYMBOL: {self.symbol}"]
+        for label, name, pattern in (('AMOUNT', 'amount_usd', '${:,.2f}'), ('LEVERAGE', 'leverage', '{:g}x'),
+                                     ('ENTRY', 'entry', '${:,.2f}'), ('TARGET', 'target', '${:,.2f}'),
+                                     ('STOP LOSS', 'stop_loss', '${:,.2f}')):
+            value = getattr(self, name)
+            if value is not None:
+                lines.append(f"{label}: {pattern.format(value)}")
+        if self.reasoning:
+            lines.append(f"REASONING: {self.reasoning}")
+        if self.confidence is not None:
+            lines.append(f"CONFIDENCE: {self.confidence:g}")
+        return "\n".join(lines)
+
+    def describe(self):
+        """One-line summary for the UI and logs"""
+        parts = [f"{self.action} {self.symbol}"]
+        if self.amount_usd:
+            parts.append(f"${self.amount_usd:,.2f}")
+        parts.append(f"{self.leverage or 1:g}x")
+        if self.target:
+            parts.append(f"target ${self.target:,.2f}")
+        if self.stop_loss:
+            parts.append(f"stop ${self.stop_loss:,.2f}")
+        if self.confidence:
+            parts.append(f"confidence {self.confidence:g}/10")
+        return " · ".join(parts)
+
+
+def parse_number(text):
+    """First number in `text`, ignoring currency signs and thousands separators"""
+    match = NUMBER_PATTERN.search(str(text))
+    return float(match.group().replace(',', '')) if match else None
+
+
+def clean_symbol(text):
+    """"eth/usdt", "ETHUSDT" and "**ETH**" all become "ETH" """
+    symbol = re.sub(r'[^A-Z]', '', str(text).upper().split('/')[0])
+    if symbol.endswith('USDT') and len(symbol) > 4:
+        symbol = symbol[:-len('USDT')]
+    return symbol
+
+
+def parse_json_signal(text):
+    """Signal from a JSON object in the response (JSON mode), or None"""
+    match = JSON_PATTERN.search(text or "")
+    if match is None:
+        return None
+    try:
+        data = json.loads(match.group())
+    except ValueError:
+        return None
+    if not isinstance(data, dict):
+        return None
+
+    fields = {}
+    for key, value in data.items():
+        name = JSON_ALIASES.get(str(key).lower().replace(' ', '_'))
+        if name is not None and value is not None:
+            fields.setdefault(name, value)
+    return _build(fields.get('action'), fields.get('symbol'), fields, fields.get('reasoning'))
+
+
+def parse_text_signal(text):
+    """Signal from the TRADE SIGNAL / SYMBOL / ... line format, or None"""
+    lines = {}
+    for key, value in FIELD_PATTERN.findall(text or ""):
+        # Keep the first occurrence; later ones are usually in the reasoning
+        lines.setdefault(key.strip().upper(), value.strip().strip('*').strip())
+    fields = {name: lines[key] for key, name in NUMERIC_FIELDS.items() if key in lines}
+    return _build(lines.get('TRADE SIGNAL'), lines.get('SYMBOL'), fields, lines.get('REASONING'))
+
+
+def _build(action, symbol, fields, reasoning):
+    action = str(action or '').split()
+    symbol = clean_symbol(symbol or '')
+    if not action or action[0].upper() not in ('BUY', 'SELL') or not symbol:
+        return None
+    numbers = {name: parse_number(fields[name]) for name in NUMERIC_FIELDS.values() if name in fields}
+    return TradeSignal(action[0].upper(), symbol, reasoning=str(reasoning or ''), **numbers)
+
+
+def parse_trade_signal(text):
+    """Parse a model response into a TradeSignal, or None if it holds no BUY/SELL signal
+
+    JSON answers are tried first, then the line format the prompt asks for.
+    """
+    return parse_json_signal(text) or parse_text_signal(text)
@@ -0,0 +1,142 @@
+"""Run backtests over a grid or random sample of strategy settings in parallel.
+
+Sweeps the sidebar's knobs (max leverage, risk per trade, strategy style)
+over historical klines on a process pool and prints a ranked table:
+
+    python sweep.py --data-dir data --symbols BTC ETH --leverage 1 3 5 10 --risk 2 5 10
+    python sweep.py --data-dir data --random 2000 --workers 8 --out sweep.csv
+"""
+import argparse
+import itertools
+import os
+import random
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import backtest
+
+SHARED_COLUMNS = ['timestamp'] + backtest.PRICE_COLUMNS
+
+# Per-worker state, set up once by init_worker
+worker_klines = None
+worker_signals = {}
+
+
+def share_klines(klines, directory):
+    """Write each symbol's kline columns as .npy files that workers memory-map"""
+    for symbol, df in klines.items():
+        for column in SHARED_COLUMNS:
+            values = df[column].to_numpy()
+            if column == 'timestamp':
+                values = values.astype('datetime64[ns]').view(np.int64)
+            np.save(os.path.join(directory, f"{symbol}.{column}.npy"), np.ascontiguousarray(values))
+
+
+def load_shared(directory, symbols):
+    """Open shared kline columns read-only; pages are shared by every worker"""
+    klines = {}
+    for symbol in symbols:
+        columns = {column: np.load(os.path.join(directory, f"{symbol}.{column}.npy"), mmap_mode='r')
+                   for column in SHARED_COLUMNS}
+        columns['timestamp'] = np.asarray(columns['timestamp']).view('datetime64[ns]')
+        klines[symbol] = pd.DataFrame(columns, copy=False)
+    return klines
+
+
+def init_worker(directory, symbols):
+    global worker_klines
+    worker_klines = load_shared(directory, symbols)
+
+
+def cached_signal(df, strategy):
+    """Signals depend only on the data and the strategy, so each worker computes them once"""
+    key = (id(df), strategy)
+    if key not in worker_signals:
+        worker_signals[key] = backtest.momentum_signal(df, strategy)
+    return worker_signals[key]
+
+
+def run_config(config):
+    """Backtest one parameter set in a worker and return its metrics row"""
+    result = backtest.run_backtest(worker_klines, cached_signal, config['strategy'], config['leverage'],
+                                   config['risk_per_trade'], interval=config['interval'])
+    return {**config, **result['metrics']}
+
+
+def grid(leverages, risks, strategies):
+    """Every combination of the given values"""
+    return [{'leverage': leverage, 'risk_per_trade': risk, 'strategy': strategy}
+            for strategy, leverage, risk in itertools.product(strategies, leverages, risks)]
+
+
+def random_search(count, leverage_range, risk_range, strategies, seed=None):
+    """`count` random configurations within the sidebar's slider ranges"""
+    rng = random.Random(seed)
+    configs = [{'leverage': rng.randint(*leverage_range), 'risk_per_trade': rng.randint(*risk_range),
+                'strategy': rng.choice(strategies)} for _ in range(count)]
+    # Group by strategy so each worker's signal cache is reused as much as possible
+    return sorted(configs, key=lambda config: config['strategy'])
+
+
+def run_sweep(klines, configs, interval='1m', workers=None, rank_by='sharpe'):
+    """Evaluate `configs` on a process pool and return results ranked best first"""
+    workers = workers or os.cpu_count()
+    configs = [{**config, 'interval': interval} for config in configs]
+    directory = tempfile.mkdtemp(prefix='sweep-')
+    try:
+        share_klines(klines, directory)
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                 initargs=(directory, list(klines))) as pool:
+            chunksize = max(1, len(configs) // (workers * 4))
+            rows = list(pool.map(run_config, configs, chunksize=chunksize))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    results = pd.DataFrame(rows).drop(columns=['interval'])
+    return results.sort_values(rank_by, ascending=False, ignore_index=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--data-dir', default='data')
+    parser.add_argument('--symbols', nargs='+', default=['BTC', 'ETH'])
+    parser.add_argument('--interval', default='1m')
+    parser.add_argument('--leverage', nargs='+', type=int, default=[1, 2, 3, 5, 8, 10],
+                        help="Grid values, or min and max with --random")
+    parser.add_argument('--risk', nargs='+', type=int, default=[1, 2, 5, 10, 15, 20],
+                        help="Grid values, or min and max with --random")
+    parser.add_argument('--strategy', nargs='+', default=list(backtest.STRATEGY_PRESETS),
+                        choices=list(backtest.STRATEGY_PRESETS))
+    parser.add_argument('--random', type=int, help="Sample this many configurations instead of the grid")
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--rank-by', default='sharpe')
+    parser.add_argument('--top', type=int, default=20)
+    parser.add_argument('--out', help="Write the full ranked table to this CSV file")
+    args = parser.parse_args()
+
+    if args.random:
+        configs = random_search(args.random, (min(args.leverage), max(args.leverage)),
+                                (min(args.risk), max(args.risk)), args.strategy, args.seed)
+    else:
+        configs = grid(args.leverage, args.risk, args.strategy)
+
+    klines = backtest.load_dataset(args.data_dir, args.symbols, args.interval)
+    started = time.perf_counter()
+    results = run_sweep(klines, configs, args.interval, args.workers, args.rank_by)
+    elapsed = time.perf_counter() - started
+
+    print(f"{len(configs):,} configurations on {args.workers} workers in {elapsed:.1f}s "
+          f"({len(configs) / elapsed:.1f}/s)")
+    print(results.head(args.top).to_string(index=False))
+    if args.out:
+        results.to_csv(args.out, index=False)
+
+
+if __name__ == '__main__':
+    main()
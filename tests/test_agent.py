@@ -0,0 +1,39 @@
+import asyncio
+import threading
+import time
+
+import agent
+from agent import TradingAgent
+from fixture_server import synthetic_klines
+from market_data import parse_klines
+
+
+def test_abandoned_decisions_keep_their_llm_slot_until_the_call_returns(monkeypatch):
+    frame = parse_klines(synthetic_klines('BTCUSDT', '1h', 100))
+    monkeypatch.setattr(agent, 'fetch_symbol_data',
+                        lambda symbols, *args: ({'BTC': float(frame['close'].iloc[-1])}, {'BTC': frame}))
+    running, peak, lock = [0], [0], threading.Lock()
+
+    def slow_llm(*args):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.5)
+        with lock:
+            running[0] -= 1
+        return "TRADE SIGNAL: HOLD"
+
+    monkeypatch.setattr(agent, 'call_ai_api', slow_llm)
+    bot = TradingAgent('key', 'http://127.0.0.1:1', 'test', ['BTC'], latency_budget=0.3, llm_concurrency=1,
+                       state_path=None)
+
+    async def run():
+        records = [await bot.decide('test') for _ in range(4)]
+        while running[0] or bot.llm_slots.locked():
+            await asyncio.sleep(0.05)
+        return records
+
+    records = asyncio.run(run())
+    assert all(record['outcome'].startswith("Abandoned") for record in records)
+    assert peak[0] == 1
+    assert bot.state()['recent'] == records
@@ -0,0 +1,42 @@
+import threading
+import time
+
+import charting
+from charting import CandleChart, load_candles
+from fixture_server import synthetic_klines
+from kline_store import INTERVAL_MS, KlineStore
+from market_data import MAX_KLINES_PER_REQUEST, parse_klines
+
+STEP = INTERVAL_MS['1m']
+NOW = time.time() // 60 * 60
+END = int(NOW * 1000) // STEP * STEP
+LOOKBACK = 5 * MAX_KLINES_PER_REQUEST * STEP
+
+
+def test_store_catch_up_runs_in_the_background(tmp_path, monkeypatch):
+    rows = parse_klines(synthetic_klines('BTCUSDT', '1m', 5 * MAX_KLINES_PER_REQUEST, end=END))
+    behind = len(rows) - 2 * MAX_KLINES_PER_REQUEST
+    store = KlineStore(str(tmp_path))
+    store.append('BTC', '1m', rows.iloc[:behind], now=NOW)
+    release = threading.Event()
+
+    def slow_backfill(store, symbol, interval, start):
+        release.wait(5)
+        return store.append(symbol, interval, rows.iloc[behind:-1], now=NOW)
+
+    def klines(symbol, interval, limit):
+        return rows.iloc[-limit:]
+
+    monkeypatch.setattr(charting, 'backfill_klines', slow_backfill)
+    started = time.perf_counter()
+    chart = CandleChart('BTC', '1m', LOOKBACK)
+    assert chart.update(store, klines, NOW) is not None
+    assert time.perf_counter() - started < 2
+    assert chart.partial
+
+    release.set()
+    chart.catch_up.result(timeout=5)
+    chart.update(store, klines, NOW)
+    assert not chart.partial
+    full = load_candles('BTC', '1m', END - LOOKBACK, store, klines, NOW)
+    assert len(full) == LOOKBACK // STEP
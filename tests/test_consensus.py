@@ -0,0 +1,56 @@
+import time
+
+import pytest
+
+from consensus import EnsembleStats, ModelCall, model_pool, run_consensus
+from fixture_server import FixtureServer
+
+
+@pytest.fixture
+def fast():
+    server = FixtureServer().start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def slow():
+    server = FixtureServer(first_token=5.0).start()
+    yield server
+    server.stop()
+
+
+def model(server, name):
+    return {'name': name, 'model': name, 'base_url': server.openai_url, 'api_key': 'key'}
+
+
+def test_cancelling_a_blocked_call_frees_its_thread(slow):
+    call = ModelCall(model(slow, 'slow'), "prompt")
+    future = model_pool.submit(call.run, True)
+    time.sleep(0.3)
+
+    started = time.perf_counter()
+    assert call.settle('cancelled')
+    future.result(timeout=2)
+    assert time.perf_counter() - started < 2
+    assert call.status == 'cancelled' and call.signal is None
+
+
+def test_a_settled_status_is_never_overwritten(fast):
+    call = ModelCall(model(fast, 'fast'), "prompt")
+    assert call.settle('timeout')
+    call.run(True)
+    assert call.status == 'timeout'
+    assert not call.settle('ok')
+
+
+def test_quorum_cancels_the_slow_model_and_stats_agree(fast, slow):
+    stats = EnsembleStats()
+    models = [model(fast, 'a'), model(fast, 'b'), model(slow, 'slow')]
+    result = run_consensus("prompt", models, quorum=2, json_mode=True, stats=stats)
+
+    assert result['quorum_reached']
+    assert result['latency'] < 2
+    statuses = {row['model']: row['status'] for row in result['calls']}
+    assert statuses == {'a': 'ok', 'b': 'ok', 'slow': 'cancelled'}
+    assert sum(result['tally'].values()) == 2
@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from indicators import INDICATOR_COLUMNS, TAIL_ROWS, compute
+
+
+def klines(n, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 65000 * np.exp(np.cumsum(rng.normal(0, 0.004, n)))
+    spread = np.abs(rng.normal(0, 0.002, n)) * close
+    return pd.DataFrame({
+        'timestamp': pd.date_range('2024-01-01', periods=n, freq='h'),
+        'open': np.roll(close, 1),
+        'high': close + spread,
+        'low': close - spread,
+        'close': close,
+        'volume': rng.lognormal(3, 1, n),
+    })
+
+
+def assert_matches_compute(result, candles):
+    expected = compute(candles)
+    for column in INDICATOR_COLUMNS:
+        np.testing.assert_allclose(result[column], expected[column], rtol=1e-9, equal_nan=True, err_msg=column)
+
+
+@pytest.mark.parametrize('appended', [1, 5, 40])
+def test_extending_from_prev_matches_compute(appended):
+    data = klines(100 + appended)
+    prev = compute(data.iloc[:100])
+    new = compute(data.iloc[100:], prev.iloc[-TAIL_ROWS:])
+    assert_matches_compute(pd.concat([prev, new], ignore_index=True), data)
+
+
+def test_short_window_matches_its_own_compute():
+    data = klines(200)
+    short = data.iloc[-24:].reset_index(drop=True)
+    result = compute(short)
+    assert len(result) == 24
+    assert result['sma_20'].notna().sum() == 5
@@ -0,0 +1,54 @@
+import os
+
+import numpy as np
+
+from fixture_server import synthetic_klines
+from kline_store import COLUMN_DTYPES, INTERVAL_MS, KlineStore
+from market_data import parse_klines
+
+STEP = INTERVAL_MS['1m']
+END = 1_700_000_000_000 // STEP * STEP
+NOW = END / 1000 + 3600
+
+
+def candles(n=300):
+    return parse_klines(synthetic_klines('BTCUSDT', '1m', n, end=END))
+
+
+def test_append_refuses_candles_after_a_gap(tmp_path):
+    store = KlineStore(str(tmp_path))
+    df = candles()
+    assert store.append('BTC', '1m', df.iloc[:100], now=NOW) == 100
+    assert store.append('BTC', '1m', df.iloc[150:], now=NOW) == 0
+    assert store.append('BTC', '1m', df.iloc[90:], now=NOW) == 200
+
+    stored = store.read('BTC', '1m')
+    times = stored['timestamp'].to_numpy().astype(np.int64)
+    assert np.all(np.diff(times) == STEP)
+
+
+def test_append_accepts_a_gap_the_exchange_reports(tmp_path):
+    store = KlineStore(str(tmp_path))
+    df = candles()
+    store.append('BTC', '1m', df.iloc[:100], now=NOW)
+    requested_from = store.last_open_time('BTC', '1m') + STEP
+    assert store.append('BTC', '1m', df.iloc[150:], now=NOW, start=requested_from) == 150
+
+
+def test_crash_leftovers_are_overwritten_without_shrinking_files(tmp_path):
+    store = KlineStore(str(tmp_path))
+    df = candles()
+    store.append('BTC', '1m', df.iloc[:100], now=NOW)
+    # A crash after the timestamp column was extended but before the others
+    with open(store.path('BTC', '1m', 'timestamp'), 'ab') as f:
+        f.write(np.arange(50, dtype=COLUMN_DTYPES['timestamp']).tobytes())
+    assert store.rows('BTC', '1m') == 100
+
+    mapped = store.read('BTC', '1m')
+    store.append('BTC', '1m', df.iloc[100:110], now=NOW)
+    size = os.path.getsize(store.path('BTC', '1m', 'timestamp'))
+    assert size == 150 * 8
+    assert store.rows('BTC', '1m') == 110
+    assert len(mapped) == 100 and mapped['close'].iloc[-1] == df['close'].iloc[99]
+    times = store.read('BTC', '1m')['timestamp'].to_numpy().astype(np.int64)
+    assert np.all(np.diff(times) == STEP)
@@ -0,0 +1,45 @@
+import pytest
+
+from fixture_server import CHAT_REPLY, FixtureServer
+from llm import StreamStats, stream_ai_api
+from profiler import profiler
+
+
+@pytest.fixture
+def server(request):
+    server = FixtureServer(**getattr(request, 'param', {})).start()
+    yield server
+    server.stop()
+
+
+@pytest.mark.parametrize('server', [{'first_token': 0.2}], indirect=True)
+def test_stream_reports_time_to_first_token(server):
+    stats = StreamStats()
+    text = "".join(stream_ai_api("prompt", "key", server.openai_url, "test", stats))
+
+    assert text == CHAT_REPLY
+    assert stats.time_to_first_token >= 0.2
+    assert stats.finished_at >= stats.first_token_at
+    assert stats.tokens_per_second > 0
+
+
+def test_stream_takes_usage_from_the_server(server):
+    stats = StreamStats()
+    key = ('tokens', (('kind', 'completion'), ('model', 'usage-test')))
+    before = profiler.counters.get(key, 0)
+    "".join(stream_ai_api("prompt", "key", server.openai_url, "usage-test", stats))
+
+    assert stats.tokens == len(CHAT_REPLY.split(' '))
+    assert stats.prompt_tokens > 0
+    assert profiler.counters[key] - before == stats.tokens
+
+
+@pytest.mark.parametrize('server', [{'drop_after': 3}], indirect=True)
+def test_interrupted_stream_keeps_partial_text_and_reports_error(server):
+    stats = StreamStats()
+    chunks = list(stream_ai_api("prompt", "key", server.openai_url, "test", stats))
+
+    assert "".join(chunks[:-1]) == " ".join(CHAT_REPLY.split(' ')[:3]) + " "
+    assert chunks[-1].startswith("\n\nAPI Error: stream interrupted")
+    assert stats.tokens == 3
+    assert stats.finished_at is not None
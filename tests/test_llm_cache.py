@@ -0,0 +1,39 @@
+import os
+import threading
+
+from llm_cache import ResponseCache
+
+
+def test_concurrent_puts_save_without_errors(tmp_path):
+    path = str(tmp_path / 'cache.json')
+    cache = ResponseCache(path=path, save_interval=0)
+    errors = []
+
+    def writer(n):
+        try:
+            for i in range(100):
+                cache.put(f"{n}-{i}", "response", 0.1)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=writer, args=(n,)) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    cache.flush()
+
+    assert errors == []
+    assert sorted(os.listdir(tmp_path)) == ['cache.json']
+    assert len(ResponseCache(path=path).entries) == 256
+
+
+def test_saves_are_throttled_until_flush(tmp_path):
+    path = str(tmp_path / 'cache.json')
+    cache = ResponseCache(path=path, save_interval=60)
+    cache.put('a', "first", 0.1)
+    cache.put('b', "second", 0.1)
+    assert list(ResponseCache(path=path).entries) == ['a']
+
+    cache.flush()
+    assert list(ResponseCache(path=path).entries) == ['a', 'b']
@@ -0,0 +1,56 @@
+import numpy as np
+
+import trading
+from orders import OrderBook
+
+SYMBOLS = [f"S{i}" for i in range(20)]
+
+
+def expected_fills(book, symbol, price, peaks, troughs):
+    """Orders a full scan says `price` triggers"""
+    hits = set()
+    for order in book.orders(symbol):
+        if order.kind == 'trailing_stop':
+            if order.side == 'SELL':
+                hit = price <= peaks[symbol] * (1 - order.trail_pct / 100)
+            else:
+                hit = price >= troughs[symbol] * (1 + order.trail_pct / 100)
+        else:
+            hit = price <= order.trigger if order.falling else price >= order.trigger
+        if hit:
+            hits.add(order.id)
+    return hits
+
+
+def test_fills_match_a_brute_force_scan():
+    rng = np.random.default_rng(0)
+    portfolio = trading.new_portfolio(1e12)
+    book = OrderBook()
+    for symbol in SYMBOLS:
+        trading.execute_trade(portfolio, 'BUY' if rng.random() < 0.5 else 'SELL', symbol, 1e6, 100.0)
+    for i in range(1000):
+        symbol = SYMBOLS[i % len(SYMBOLS)]
+        kind = rng.choice(['stop', 'take_profit', 'trailing_stop'])
+        if kind == 'trailing_stop':
+            book.place(portfolio['positions'], symbol, kind, 100.0, trail_pct=float(rng.uniform(1, 30)), amount=1.0)
+            continue
+        below = (kind == 'stop') == (portfolio['positions'][symbol]['amount'] > 0)
+        distance = rng.uniform(0.01, 0.5)
+        trigger = 100.0 * (1 - distance if below else 1 + distance)
+        book.place(portfolio['positions'], symbol, kind, 100.0, trigger=trigger, amount=1.0)
+
+    prices = dict.fromkeys(SYMBOLS, 100.0)
+    peaks, troughs = dict(prices), dict(prices)
+    filled = 0
+    for _ in range(20000):
+        symbol = SYMBOLS[rng.integers(len(SYMBOLS))]
+        prices[symbol] *= np.exp(rng.normal(0, 0.003))
+        price = prices[symbol]
+        peaks[symbol] = max(peaks[symbol], price)
+        troughs[symbol] = min(troughs[symbol], price)
+
+        expected = expected_fills(book, symbol, price, peaks, troughs)
+        got = {order.id for order in book.on_price(portfolio, symbol, price) if order.status == 'filled'}
+        assert got == expected
+        filled += len(got)
+    assert filled > 100
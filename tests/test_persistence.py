@@ -0,0 +1,102 @@
+import sqlite3
+
+import pytest
+
+import trading
+from persistence import PortfolioStore
+
+
+@pytest.fixture
+def stores(tmp_path):
+    path = str(tmp_path / 'portfolio.db')
+    first, second = PortfolioStore(path), PortfolioStore(path)
+    yield first, second
+    first.close()
+    second.close()
+
+
+def test_the_second_writer_is_rejected_and_rebases(stores):
+    first, second = stores
+    mine, theirs = first.load('shared'), second.load('shared')
+
+    trading.execute_trade(mine, 'BUY', 'BTC', 0.1, 60000.0)
+    trading.execute_trade(theirs, 'BUY', 'ETH', 1.0, 3000.0)
+    assert first.record('shared', mine, wait=True)
+    assert not second.record('shared', theirs, wait=True)
+    assert second.is_stale('shared', theirs)
+    assert not first.is_stale('shared', mine)
+
+    rebased, dropped = second.rebase('shared', theirs)
+    assert dropped == 0
+    assert set(rebased['positions']) == {'BTC', 'ETH'}
+    assert first.is_stale('shared', mine)
+
+    stored = first.load('shared')
+    assert len(stored['trade_history']) == 2
+    assert stored['cash'] == pytest.approx(rebased['cash'])
+
+
+def test_interleaved_writers_never_mix_histories(stores):
+    first, second = stores
+    portfolios = {first: first.load('shared'), second: second.load('shared')}
+    for i in range(20):
+        for store, symbol in ((first, 'BTC'), (second, 'ETH')):
+            portfolio = portfolios[store]
+            if store.is_stale('shared', portfolio):
+                portfolio, _ = store.rebase('shared', portfolio)
+            trading.execute_trade(portfolio, 'BUY', symbol, 0.01, 100.0 + i)
+            store.record('shared', portfolio)
+            portfolios[store] = portfolio
+    for store, portfolio in portfolios.items():
+        store.flush()
+        if store.is_stale('shared', portfolio):
+            store.rebase('shared', portfolio)
+
+    stored = first.load('shared')
+    history = stored['trade_history'].records
+    assert len(history) == 40
+    # Replaying the stored fills gives the cash the store recovers
+    assert stored['cash'] == pytest.approx(trading.STARTING_CASH - float((history['amount'] * history['price']).sum()))
+
+
+def test_exit_orders_are_restored_with_their_trailing_peak(stores):
+    first, second = stores
+    portfolio = first.load('orders')
+    trading.execute_trade(portfolio, 'BUY', 'BTC', 0.1, 60000.0)
+    first.record('orders', portfolio)
+    book = first.load_orders('orders', portfolio['positions'])
+    book.bracket(portfolio['positions'], 'BTC', 60000.0, stop_loss=55000.0, take_profit=70000.0, trail_pct=5.0)
+    book.on_price(portfolio, 'BTC', 64000.0)
+    first.save_orders('orders', book)
+    first.flush()
+
+    restored = second.load_orders('orders', second.load('orders')['positions'])
+    assert [order.describe() for order in restored.orders()] == [order.describe() for order in book.orders()]
+    assert [restored.stop_price(order) for order in restored.orders()] == [55000.0, 70000.0, 64000.0 * 0.95]
+    # Still one OCO group: the take-profit filling cancels the other two
+    restored.on_price(portfolio, 'BTC', 70000.0)
+    assert len(restored) == 0
+
+
+def test_a_failed_write_is_reported_and_the_writer_keeps_going(stores, monkeypatch):
+    store, _ = stores
+    portfolio = store.load('failing')
+    write_fills = store._write_fills
+    failures = [sqlite3.OperationalError("database is locked")]
+
+    def flaky(*args):
+        if failures:
+            raise failures.pop()
+        return write_fills(*args)
+
+    monkeypatch.setattr(store, '_write_fills', flaky)
+    trading.execute_trade(portfolio, 'BUY', 'BTC', 0.1, 60000.0)
+    assert not store.record('failing', portfolio, wait=True)
+    assert store.flush(timeout=3)
+    assert store.writer.is_alive()
+    assert store.is_stale('failing', portfolio)
+
+    rebased, dropped = store.rebase('failing', portfolio)
+    assert dropped == 0
+    assert len(store.load('failing')['trade_history']) == 1
+    assert set(rebased['positions']) == {'BTC'}
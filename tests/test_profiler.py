@@ -0,0 +1,29 @@
+import os
+import threading
+
+from profiler import Profiler
+
+
+def test_concurrent_exports_do_not_collide(tmp_path):
+    profiler = Profiler()
+    profiler.record('http.klines', 0.01)
+    path = str(tmp_path / 'metrics.prom')
+    errors = []
+
+    def exporter():
+        try:
+            for _ in range(50):
+                profiler.export(path)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=exporter) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert os.listdir(tmp_path) == ['metrics.prom']
+    with open(path) as f:
+        assert 'section="http.klines"' in f.read()
@@ -0,0 +1,138 @@
+import pytest
+
+from signals import TradeSignal, parse_trade_signal
+
+LINE_ANSWER = """Momentum is turning up on the 1h chart.
+
+TRADE SIGNAL: BUY
+SYMBOL: ETH/USDT
+AMOUNT: $2,500
+LEVERAGE: 3x
+ENTRY: $3,120.50
+TARGET: $3,300
+STOP LOSS: $3,050
+REASONING: Higher lows above the 50 EMA
+CONFIDENCE: 7/10
+"""
+
+
+def test_line_format():
+    signal = parse_trade_signal(LINE_ANSWER)
+
+    assert signal.to_dict() == {
+        'action': 'BUY', 'symbol': 'ETH', 'amount_usd': 2500.0, 'leverage': 3.0, 'entry': 3120.5,
+        'target': 3300.0, 'stop_loss': 3050.0, 'confidence': 7.0,
+        'reasoning': 'Higher lows above the 50 EMA',
+    }
+
+
+def test_bold_and_bullet_markup():
+    signal = parse_trade_signal("- **TRADE SIGNAL:** **SELL**\n* **SYMBOL**: **btcusdt**\n"
+                                "- **AMOUNT:** $1,000\n> **STOP LOSS**: 67,000")
+
+    assert (signal.action, signal.symbol, signal.amount_usd, signal.stop_loss) == ('SELL', 'BTC', 1000.0, 67000.0)
+
+
+def test_json_format():
+    signal = parse_trade_signal('Here you go:\n```json\n{"signal": "sell", "symbol": "SOLUSDT", '
+                                '"amount": "$500", "leverage": 2, "take_profit": 120, "stop": 150}\n```')
+
+    assert (signal.action, signal.symbol, signal.amount_usd, signal.leverage) == ('SELL', 'SOL', 500.0, 2.0)
+    assert (signal.target, signal.stop_loss) == (120.0, 150.0)
+
+
+def test_only_the_first_occurrence_of_a_field_counts():
+    signal = parse_trade_signal(LINE_ANSWER + "\nIf it breaks down, TARGET: $2,900")
+
+    assert signal.target == 3300.0
+
+
+@pytest.mark.parametrize('answer', [
+    "TRADE SIGNAL: BUY/SELL\nSYMBOL: <crypto>",
+    "TRADE SIGNAL: HOLD\nSYMBOL: BTC",
+    '{"action": "HOLD", "symbol": "BTC"}',
+    "TRADE SIGNAL: BUY\nSYMBOL:  ",
+    "No clear setup right now.",
+    "",
+])
+def test_placeholder_and_hold_answers_are_not_signals(answer):
+    assert parse_trade_signal(answer) is None
+
+
+def test_valid_open_has_no_errors():
+    signal = TradeSignal('BUY', 'ETH', amount_usd=3000, leverage=3, entry=3100, target=3300, stop_loss=3000)
+
+    assert signal.validate(max_leverage=5, cash=1000, positions={}, symbols=['ETH']) == []
+
+
+@pytest.mark.parametrize('leverage', [0.5, 10])
+def test_leverage_outside_the_limit_is_rejected(leverage):
+    errors = TradeSignal('BUY', 'ETH', amount_usd=100, leverage=leverage).validate(5, 1000, {})
+
+    assert errors == [f"Leverage {leverage:g}x is outside 1-5x"]
+
+
+def test_margin_beyond_cash_is_rejected():
+    errors = TradeSignal('BUY', 'ETH', amount_usd=3000, leverage=2).validate(5, 1000, {})
+
+    assert errors == ["Needs $1,500.00 margin but only $1,000.00 cash"]
+
+
+def test_negative_cash_blocks_any_new_position():
+    errors = TradeSignal('SELL', 'ETH', amount_usd=10).validate(5, -50, {})
+
+    assert errors == ["Needs $10.00 margin but only $-50.00 cash"]
+
+
+@pytest.mark.parametrize('action, target, stop_loss, expected', [
+    ('BUY', 3300, 3200, "Stop loss must be below entry for a BUY"),
+    ('BUY', 3000, 2900, "Target must be above entry for a BUY"),
+    ('SELL', 2900, 3000, "Stop loss must be above entry for a short"),
+    ('SELL', 3300, 3200, "Target must be below entry for a short"),
+])
+def test_prices_in_the_wrong_order_are_rejected(action, target, stop_loss, expected):
+    signal = TradeSignal(action, 'ETH', amount_usd=100, entry=3100, target=target, stop_loss=stop_loss)
+
+    assert signal.validate(5, 1000, {}) == [expected]
+
+
+def test_unselected_symbol_is_rejected():
+    errors = TradeSignal('BUY', 'DOGE', amount_usd=100).validate(5, 1000, {}, symbols=['BTC', 'ETH'])
+
+    assert errors == ["DOGE is not a selected trading pair"]
+
+
+def test_closing_needs_no_cash_or_amount():
+    positions = {'ETH': {'amount': 2.0}}
+    signal = TradeSignal('SELL', 'ETH', entry=3100, target=3300)
+
+    assert signal.closes(positions)
+    assert signal.validate(5, -50, positions) == []
+
+
+def test_closes_only_against_the_opposite_side():
+    long, short = {'ETH': {'amount': 2.0}}, {'ETH': {'amount': -2.0}}
+
+    assert TradeSignal('SELL', 'ETH').closes(long)
+    assert TradeSignal('BUY', 'ETH').closes(short)
+    assert not TradeSignal('BUY', 'ETH').closes(long)
+    assert not TradeSignal('SELL', 'ETH').closes({})
+
+
+def test_opening_sizes_from_the_usd_amount():
+    amount, leverage = TradeSignal('BUY', 'ETH', amount_usd=1000, leverage=2).order(2000.0, {})
+
+    assert (amount, leverage) == (0.5, 2)
+
+
+@pytest.mark.parametrize('amount_usd, expected', [(None, 2.0), (2000, 1.0), (50_000, 2.0)])
+def test_closing_never_exceeds_the_position(amount_usd, expected):
+    amount, leverage = TradeSignal('SELL', 'ETH', amount_usd=amount_usd).order(2000.0, {'ETH': {'amount': 2.0}})
+
+    assert (amount, leverage) == (pytest.approx(expected), 1.0)
+
+
+def test_text_round_trip():
+    signal = parse_trade_signal(LINE_ANSWER)
+
+    assert parse_trade_signal(signal.to_text()).to_dict() == signal.to_dict()
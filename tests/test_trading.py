@@ -0,0 +1,104 @@
+import numpy as np
+import pytest
+
+import trading
+
+
+def test_selling_a_rounding_error_more_than_held_closes_the_position():
+    portfolio = trading.new_portfolio()
+    trading.execute_trade(portfolio, 'BUY', 'BTC', 1000 / 65000, 65000.0)
+    success, _ = trading.execute_trade(portfolio, 'SELL', 'BTC', 1000.004 / 65000, 65000.0)
+
+    assert success
+    assert portfolio['positions'] == {}
+    assert portfolio['cash'] == pytest.approx(trading.STARTING_CASH)
+    assert portfolio['trade_history'].records['amount'][-1] == pytest.approx(1000 / 65000, rel=1e-12)
+
+
+def test_selling_clearly_more_than_held_opens_a_short():
+    portfolio = trading.new_portfolio()
+    trading.execute_trade(portfolio, 'BUY', 'BTC', 0.01, 65000.0)
+    trading.execute_trade(portfolio, 'SELL', 'BTC', 0.02, 65000.0)
+
+    assert portfolio['positions']['BTC']['amount'] == pytest.approx(-0.01)
+
+
+def test_partial_close_realizes_its_share_and_keeps_the_rest():
+    portfolio = trading.new_portfolio()
+    trading.execute_trade(portfolio, 'BUY', 'BTC', 1.0, 100.0, leverage=2)
+    success, _ = trading.execute_trade(portfolio, 'SELL', 'BTC', 0.4, 110.0)
+
+    assert success
+    # 40% of the 50 margin comes back with 0.4 * 10 profit
+    assert portfolio['cash'] == pytest.approx(trading.STARTING_CASH - 50 + 24)
+    assert portfolio['positions']['BTC'] == pytest.approx(
+        {'amount': 0.6, 'entry_price': 100.0, 'leverage': 2.0, 'margin': 30.0})
+    assert portfolio['trade_history'].records['profit'][-1] == pytest.approx(4.0)
+
+
+def test_selling_more_than_a_long_flips_it_into_a_short():
+    portfolio = trading.new_portfolio()
+    trading.execute_trade(portfolio, 'BUY', 'BTC', 1.0, 100.0)
+    success, _ = trading.execute_trade(portfolio, 'SELL', 'BTC', 3.0, 90.0, leverage=2)
+
+    assert success
+    # The long returns 90 of its 100 margin; the 2 BTC short posts 90
+    assert portfolio['cash'] == pytest.approx(trading.STARTING_CASH - 100)
+    assert portfolio['positions']['BTC'] == pytest.approx(
+        {'amount': -2.0, 'entry_price': 90.0, 'leverage': 2.0, 'margin': 90.0})
+
+
+def test_adding_to_a_position_blends_entry_and_leverage():
+    portfolio = trading.new_portfolio()
+    trading.execute_trade(portfolio, 'BUY', 'BTC', 1.0, 100.0, leverage=1)
+    trading.execute_trade(portfolio, 'BUY', 'BTC', 1.0, 200.0, leverage=4)
+
+    assert portfolio['positions']['BTC'] == pytest.approx(
+        {'amount': 2.0, 'entry_price': 150.0, 'leverage': 2.0, 'margin': 150.0})
+
+
+def test_a_closing_loss_is_capped_at_the_posted_margin():
+    portfolio = trading.new_portfolio()
+    trading.execute_trade(portfolio, 'BUY', 'BTC', 1.0, 100.0, leverage=10)
+    trading.execute_trade(portfolio, 'SELL', 'BTC', 1.0, 80.0)
+
+    assert portfolio['cash'] == pytest.approx(trading.STARTING_CASH - 10)
+    assert portfolio['trade_history'].records['proceeds'][-1] == 0.0
+    assert portfolio['trade_history'].records['profit'][-1] == pytest.approx(-10.0)
+
+
+def test_liquidation_prices_for_longs_and_shorts():
+    rate = trading.MAINTENANCE_MARGIN_RATE
+    prices = trading.liquidation_price(np.array([1.0, -1.0, 2.0]), np.array([100.0, 100.0, 50.0]),
+                                       np.array([10.0, 10.0, 100.0]))
+
+    np.testing.assert_allclose(prices, [90 / (1 - rate), 110 / (1 + rate), 0.0])
+
+
+def test_mark_to_market_caps_equity_and_marks_unpriced_positions_at_entry():
+    portfolio = trading.new_portfolio()
+    trading.execute_trade(portfolio, 'BUY', 'BTC', 1.0, 100.0, leverage=10)
+    trading.execute_trade(portfolio, 'SELL', 'ETH', 1.0, 50.0)
+    marks = trading.mark_to_market(portfolio, {'BTC': 80.0}.get)
+
+    assert marks['symbols'] == ['BTC', 'ETH']
+    np.testing.assert_allclose(marks['equity'], [0.0, 50.0])
+    np.testing.assert_allclose(marks['unrealized_pnl'], [-20.0, 0.0])
+    assert marks['liquidate'].tolist() == [True, False]
+    assert marks['portfolio_value'] == pytest.approx(trading.STARTING_CASH - 10)
+
+
+def test_liquidate_closes_at_the_liquidation_price_and_releases_the_margin():
+    portfolio = trading.new_portfolio()
+    trading.execute_trade(portfolio, 'BUY', 'BTC', 1.0, 100.0, leverage=10)
+    trading.execute_trade(portfolio, 'SELL', 'ETH', 1.0, 50.0, leverage=2)
+    messages = trading.liquidate(portfolio, {'BTC': 85.0, 'ETH': 51.0}.get)
+
+    liquidation = 90 / (1 - trading.MAINTENANCE_MARGIN_RATE)
+    assert len(messages) == 1 and messages[0].startswith("Liquidated BTC")
+    assert list(portfolio['positions']) == ['ETH']
+    records = portfolio['trade_history'].records
+    assert records['price'][-1] == pytest.approx(liquidation)
+    # What is left of the margin is the maintenance margin at the liquidation price
+    assert records['proceeds'][-1] == pytest.approx(trading.MAINTENANCE_MARGIN_RATE * liquidation)
+    assert portfolio['cash'] == pytest.approx(trading.STARTING_CASH - 10 - 25 + records['proceeds'][-1])
@@ -0,0 +1,157 @@
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+from websockets.asyncio.server import serve
+
+from ws_feed import MarketFeed
+
+
+class FakeBinance:
+    """Combined-stream WebSocket server that tracks subscriptions and pushes prices on demand"""
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+        self.connections = {}
+        self.connects = 0
+        self.accepting = True
+        self.server = self._call(self._serve())
+
+    @property
+    def url(self):
+        return f"ws://127.0.0.1:{self.server.sockets[0].getsockname()[1]}"
+
+    def streams(self):
+        """Streams subscribed on the current connections"""
+        return set().union(*self.connections.values()) if self.connections else set()
+
+    def push(self, symbol, price):
+        data = {'e': '24hrMiniTicker', 'E': int(time.time() * 1000), 's': f"{symbol}USDT", 'c': str(price)}
+        message = json.dumps({'stream': f"{symbol.lower()}usdt@miniTicker", 'data': data})
+        self._call(self._broadcast(message))
+
+    def drop(self):
+        """Close every connection, as Binance does at its 24 hour limit"""
+        self._call(self._close_all())
+
+    def stop(self):
+        self.drop()
+        self.server.close()
+        self._call(self.server.wait_closed())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+    def _call(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result(timeout=5)
+
+    async def _serve(self):
+        return await serve(self._handler, '127.0.0.1', 0)
+
+    async def _handler(self, ws):
+        if not self.accepting:
+            await ws.close()
+            return
+        self.connects += 1
+        self.connections[ws] = set()
+        try:
+            async for message in ws:
+                request = json.loads(message)
+                if request['method'] == 'SUBSCRIBE':
+                    self.connections[ws] |= set(request['params'])
+                else:
+                    self.connections[ws] -= set(request['params'])
+                await ws.send(json.dumps({'result': None, 'id': request['id']}))
+        finally:
+            self.connections.pop(ws, None)
+
+    async def _broadcast(self, message):
+        for ws in list(self.connections):
+            await ws.send(message)
+
+    async def _close_all(self):
+        for ws in list(self.connections):
+            await ws.close()
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("condition not reached in time")
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def server():
+    server = FakeBinance()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def feed(server):
+    feed = MarketFeed(url=server.url, stale_after=0.3, reconnect_delay=0.05, max_reconnect_delay=0.1).start()
+    yield feed
+    feed.stop()
+
+
+def test_prices_arrive_and_go_stale(server, feed):
+    feed.subscribe(['BTC'])
+    wait_for(lambda: 'btcusdt@miniTicker' in server.streams())
+
+    server.push('BTC', 65000.5)
+    wait_for(lambda: feed.price('BTC') == 65000.5)
+    assert feed.stats()['fresh'] == 1
+
+    time.sleep(0.4)
+    assert feed.price('BTC') is None
+    assert feed.age('BTC') > 0.3
+    assert feed.stats()['fresh'] == 0
+
+
+def test_reconnects_and_resubscribes_every_symbol(server, feed):
+    feed.subscribe(['BTC', 'ETH'])
+    wait_for(lambda: {'btcusdt@miniTicker', 'ethusdt@kline_1m'} <= server.streams())
+
+    server.drop()
+    wait_for(lambda: server.connects == 2 and feed.connected)
+    wait_for(lambda: server.streams() == {'btcusdt@miniTicker', 'btcusdt@kline_1m',
+                                          'ethusdt@miniTicker', 'ethusdt@kline_1m'})
+    assert feed.stats()['reconnects'] >= 1
+
+    server.push('ETH', 3200.0)
+    wait_for(lambda: feed.price('ETH') == 3200.0)
+
+
+def test_symbols_changed_while_disconnected_are_subscribed_on_reconnect(server, feed):
+    feed.subscribe(['BTC'])
+    wait_for(lambda: 'btcusdt@miniTicker' in server.streams())
+
+    server.accepting = False
+    server.drop()
+    wait_for(lambda: feed.stats()['reconnects'] >= 1)
+    feed.subscribe(['SOL'])
+    feed.unsubscribe(['BTC'])
+    server.accepting = True
+
+    wait_for(lambda: server.streams() == {'solusdt@miniTicker', 'solusdt@kline_1m'})
+
+
+def test_a_failing_listener_does_not_stop_the_feed(server, feed):
+    seen = []
+
+    def broken(symbol, price):
+        raise RuntimeError("listener bug")
+
+    feed.add_listener(broken)
+    feed.add_listener(lambda symbol, price: seen.append(price))
+    feed.subscribe(['BTC'])
+    wait_for(lambda: 'btcusdt@miniTicker' in server.streams())
+
+    server.push('BTC', 65000.0)
+    server.push('BTC', 65001.0)
+    wait_for(lambda: seen == [65000.0, 65001.0])
+    assert feed.connected and feed.stats()['reconnects'] == 0
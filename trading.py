@@ -0,0 +1,186 @@
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from ledger import ACTIONS, Ledger
+
+STARTING_CASH = 10000.0
+
+# Share of a position's notional it must keep as equity, or it is liquidated
+MAINTENANCE_MARGIN_RATE = 0.005
+
+# Overshooting a position by less than this much notional (USD) is rounding, not a reversal
+DUST_NOTIONAL = 0.01
+
+
+def new_portfolio(cash=STARTING_CASH, start_time=None):
+    """Create an empty paper-trading portfolio"""
+    return {
+        'cash': cash,
+        'positions': {},
+        'trade_history': Ledger(),
+        'pnl_history': [],
+        'start_value': cash,
+        'start_time': start_time or datetime.now()
+    }
+
+
+def epoch_ms(timestamp=None):
+    """Epoch milliseconds for a datetime (naive means UTC, like kline times), or for now
+
+    Integers are taken to be epoch milliseconds already.
+    """
+    if timestamp is None:
+        return int(time.time() * 1000)
+    if isinstance(timestamp, int):
+        return timestamp
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return int(timestamp.timestamp() * 1000)
+
+
+def liquidation_price(amount, entry_price, margin, rate=MAINTENANCE_MARGIN_RATE):
+    """Price at which an isolated position's equity falls to its maintenance margin
+
+    `amount` is negative for shorts. Works elementwise on arrays; a
+    position that cannot be liquidated (a 1x long) gets 0.
+    """
+    size = np.abs(amount)
+    side = np.sign(amount)
+    # Long:  margin + (p - entry) * size = rate * size * p
+    # Short: margin + (entry - p) * size = rate * size * p
+    with np.errstate(divide='ignore', invalid='ignore'):
+        price = (entry_price - side * margin / size) / (1 - side * rate)
+    return np.maximum(np.nan_to_num(price), 0.0)
+
+
+def mark_to_market(portfolio, get_price, rate=MAINTENANCE_MARGIN_RATE):
+    """Value every open position at `get_price(symbol)` in one vectorized pass
+
+    Positions without a price are marked at their entry price. Returns a
+    dict of arrays aligned with `symbols` (amount, entry_price, price,
+    margin, notional, unrealized_pnl, equity, maintenance,
+    liquidation_price and a `liquidate` mask) plus the account's total
+    `portfolio_value`, which is cash plus the equity of every position.
+    """
+    positions = portfolio['positions']
+    count = len(positions)
+    symbols = list(positions)
+    amount = np.fromiter((p['amount'] for p in positions.values()), float, count)
+    entry_price = np.fromiter((p['entry_price'] for p in positions.values()), float, count)
+    margin = np.fromiter((p['margin'] for p in positions.values()), float, count)
+    quoted = np.fromiter((get_price(symbol) or np.nan for symbol in symbols), float, count)
+    priced = ~np.isnan(quoted)
+    price = np.where(priced, quoted, entry_price)
+
+    notional = np.abs(amount) * price
+    unrealized_pnl = amount * (price - entry_price)
+    # Isolated margin: a position can lose its margin and no more
+    equity = np.maximum(margin + unrealized_pnl, 0.0)
+    maintenance = rate * notional
+    return {
+        'symbols': symbols,
+        'amount': amount,
+        'entry_price': entry_price,
+        'price': price,
+        'margin': margin,
+        'notional': notional,
+        'unrealized_pnl': unrealized_pnl,
+        'equity': equity,
+        'maintenance': maintenance,
+        'liquidation_price': liquidation_price(amount, entry_price, margin, rate),
+        'liquidate': priced & (equity <= maintenance),
+        'portfolio_value': float(portfolio['cash'] + equity.sum()),
+    }
+
+
+def calculate_portfolio_value(portfolio, get_price):
+    """Cash plus the margin equity of every position, priced with `get_price(symbol)`"""
+    return mark_to_market(portfolio, get_price)['portfolio_value']
+
+
+def liquidate(portfolio, get_price, timestamp=None, rate=MAINTENANCE_MARGIN_RATE):
+    """Close every position whose equity at `get_price` fell to its maintenance margin
+
+    Positions are closed at their liquidation price with an ordinary
+    fill, so the ledger and any replay of it see them. Returns one
+    message per liquidated position.
+    """
+    marks = mark_to_market(portfolio, get_price, rate)
+    messages = []
+    for i in np.flatnonzero(marks['liquidate']):
+        symbol, amount = marks['symbols'][i], marks['amount'][i]
+        action = 'SELL' if amount > 0 else 'BUY'
+        _, message = execute_trade(portfolio, action, symbol, abs(amount), float(marks['liquidation_price'][i]),
+                                   portfolio['positions'][symbol]['leverage'], timestamp)
+        messages.append(f"Liquidated {symbol}: {message}")
+    return messages
+
+
+def execute_trade(portfolio, action, symbol, amount, current_price, leverage=1.0, timestamp=None):
+    """Execute a trade (paper trading) against `portfolio` at `current_price`
+
+    Positions are netted per symbol with isolated margin. A trade first
+    reduces an opposite position, realizing its P&L and releasing its
+    margin, then opens or adds to a position in its own direction with
+    the rest, posting notional / `leverage` of cash as margin. Selling
+    more than a long position therefore opens a short, unless the excess
+    is under DUST_NOTIONAL, which just closes the position.
+    """
+    if action not in ACTIONS:
+        return False, "Invalid action"
+    if amount <= 0 or current_price <= 0:
+        return False, "Amount and price must be positive"
+    timestamp = epoch_ms(timestamp)
+    side = 1 if action == 'BUY' else -1
+    positions = portfolio['positions']
+    position = positions.get(symbol)
+    held = position['amount'] if position else 0.0
+    if held * side < 0 and 0 < (amount - abs(held)) * current_price < DUST_NOTIONAL:
+        # A USD amount converted to coins can overshoot the whole position by a rounding error
+        amount = abs(held)
+
+    closing = min(amount, abs(held)) if held * side < 0 else 0.0
+    opening = amount - closing
+    cost = profit = proceeds = np.nan
+    if closing:
+        released = position['margin'] * closing / abs(held)
+        proceeds = max(released + side * closing * (position['entry_price'] - current_price), 0.0)
+        profit = proceeds - released
+    if opening:
+        if leverage < 1:
+            return False, "Leverage must be at least 1x"
+        cost = opening * current_price / leverage
+        if cost > portfolio['cash'] + (proceeds if closing else 0.0):
+            return False, f"Insufficient funds: needs ${cost:,.2f} margin"
+
+    details = []
+    if closing:
+        portfolio['cash'] += proceeds
+        details.append(f"closed {closing:.6f} {'long' if held > 0 else 'short'}, P&L ${profit:,.2f}")
+        if closing == abs(held):
+            del positions[symbol]
+            position = None
+        else:
+            position['amount'] += side * closing
+            position['margin'] -= released
+    if opening:
+        portfolio['cash'] -= cost
+        details.append(f"{'long' if side > 0 else 'short'} {opening:.6f} at {leverage:g}x, margin ${cost:,.2f}")
+        if position is None:
+            positions[symbol] = {'amount': side * opening, 'entry_price': current_price,
+                                 'leverage': float(leverage), 'margin': cost}
+        else:
+            new_amount = position['amount'] + side * opening
+            position['entry_price'] = ((position['amount'] * position['entry_price'] +
+                                        side * opening * current_price) / new_amount)
+            position['amount'] = new_amount
+            position['margin'] += cost
+            # Adding at a different leverage blends the two
+            position['leverage'] = abs(new_amount) * position['entry_price'] / position['margin']
+
+    portfolio['trade_history'].append(timestamp, action, symbol, amount, current_price, float(leverage),
+                                      cost=cost, profit=profit, proceeds=proceeds)
+    verb = "Bought" if action == 'BUY' else "Sold"
+    return True, f"{verb} {amount:.6f} {symbol} at ${current_price:.2f} ({'; '.join(details)})"
@@ -0,0 +1,236 @@
+import asyncio
+import json
+import logging
+import random
+import threading
+import time
+
+import websockets
+
+BINANCE_WS = "wss://stream.binance.com:9443/stream"
+
+logger = logging.getLogger(__name__)
+
+# Binance drops connections that send more than 5 messages per second
+MAX_STREAMS_PER_MESSAGE = 200
+
+
+class MarketFeed:
+    """Background Binance WebSocket feed of last prices and current candles
+
+    Subscribes to the miniTicker and kline streams of every symbol asked
+    for and keeps the latest values in memory, so readers never touch the
+    network. The connection runs on its own thread and event loop; after
+    a drop it reconnects with jittered backoff and resubscribes. Values
+    older than `stale_after` seconds are reported as missing so callers
+    can fall back to REST. Listeners added with add_listener() are called
+    with (symbol, price) on the feed thread for every price update.
+    """
+
+    def __init__(self, url=BINANCE_WS, interval='1m', stale_after=10.0,
+                 reconnect_delay=1.0, max_reconnect_delay=30.0):
+        self.url = url
+        self.interval = interval
+        self.stale_after = stale_after
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.symbols = set()
+        self.prices = {}
+        self.candles = {}
+        self.lock = threading.Lock()
+        self.loop = None
+        self.thread = None
+        self.ws = None
+        self.stopping = False
+        self.connected = False
+        self.reconnects = 0
+        self.messages = 0
+        self.last_message = None
+        self.request_id = 0
+        self.listeners = []
+
+    def start(self):
+        """Start the connection thread; safe to call more than once"""
+        if self.thread is None or not self.thread.is_alive():
+            self.stopping = False
+            self.loop = asyncio.new_event_loop()
+            self.thread = threading.Thread(target=self.loop.run_until_complete, args=(self._run(),),
+                                           name='market-feed', daemon=True)
+            self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopping = True
+        if self.loop is not None and self.ws is not None:
+            asyncio.run_coroutine_threadsafe(self.ws.close(), self.loop)
+        if self.thread is not None:
+            self.thread.join(timeout=5)
+
+    def subscribe(self, symbols):
+        """Add symbols to the feed; already subscribed ones are ignored"""
+        with self.lock:
+            added = set(symbols) - self.symbols
+            self.symbols |= added
+        if added:
+            self._send('SUBSCRIBE', added)
+
+    def add_listener(self, callback):
+        """Call `callback(symbol, price)` on every price update; it must be quick
+
+        An exception from the callback is logged and does not stop the feed
+        or the other listeners.
+        """
+        self.listeners.append(callback)
+
+    def remove_listener(self, callback):
+        if callback in self.listeners:
+            self.listeners.remove(callback)
+
+    def unsubscribe(self, symbols):
+        with self.lock:
+            removed = set(symbols) & self.symbols
+            self.symbols -= removed
+            for symbol in removed:
+                self.prices.pop(symbol, None)
+                self.candles.pop(symbol, None)
+        if removed:
+            self._send('UNSUBSCRIBE', removed)
+
+    def price(self, symbol):
+        """Last traded price, or None if unknown or stale"""
+        with self.lock:
+            entry = self.prices.get(symbol)
+        if entry is None or self._age(entry) > self.stale_after:
+            return None
+        return entry['price']
+
+    def candle(self, symbol):
+        """Current (possibly still forming) candle as a dict, or None if unknown or stale"""
+        with self.lock:
+            entry = self.candles.get(symbol)
+        if entry is None or self._age(entry) > self.stale_after:
+            return None
+        return dict(entry)
+
+    def age(self, symbol):
+        """Seconds since the last price update for `symbol`, or None"""
+        with self.lock:
+            entry = self.prices.get(symbol)
+        return None if entry is None else self._age(entry)
+
+    def stats(self):
+        with self.lock:
+            ages = [self._age(entry) for entry in self.prices.values()]
+            subscribed = len(self.symbols)
+        return {
+            'connected': self.connected,
+            'symbols': subscribed,
+            'fresh': sum(age <= self.stale_after for age in ages),
+            'max_age': max(ages) if ages else None,
+            'messages': self.messages,
+            'reconnects': self.reconnects,
+        }
+
+    def _age(self, entry):
+        return time.monotonic() - entry['received']
+
+    def _streams(self, symbols):
+        streams = []
+        for symbol in sorted(symbols):
+            pair = f"{symbol.lower()}usdt"
+            streams += [f"{pair}@miniTicker", f"{pair}@kline_{self.interval}"]
+        return streams
+
+    def _send(self, method, symbols):
+        """Queue a (un)subscribe request on the feed's loop if it is connected
+
+        While disconnected nothing is sent; the next connection subscribes
+        to the full symbol set anyway.
+        """
+        if self.loop is not None and self.connected:
+            asyncio.run_coroutine_threadsafe(self._request(method, self._streams(symbols)), self.loop)
+
+    async def _request(self, method, streams):
+        ws = self.ws
+        if ws is None:
+            return
+        for i in range(0, len(streams), MAX_STREAMS_PER_MESSAGE):
+            self.request_id += 1
+            try:
+                await ws.send(json.dumps({'method': method, 'params': streams[i:i + MAX_STREAMS_PER_MESSAGE],
+                                          'id': self.request_id}))
+            except websockets.exceptions.WebSocketException:
+                return
+            await asyncio.sleep(0.25)
+
+    async def _run(self):
+        delay = self.reconnect_delay
+        while not self.stopping:
+            try:
+                async with websockets.connect(self.url, ping_interval=20, ping_timeout=20,
+                                              open_timeout=10) as ws:
+                    self.ws = ws
+                    self.connected = True
+                    delay = self.reconnect_delay
+                    with self.lock:
+                        symbols = set(self.symbols)
+                    await self._request('SUBSCRIBE', self._streams(symbols))
+                    async for message in ws:
+                        self._handle(message)
+            except (OSError, asyncio.TimeoutError, websockets.exceptions.WebSocketException):
+                pass
+            finally:
+                self.ws = None
+                self.connected = False
+
+            if self.stopping:
+                break
+            self.reconnects += 1
+            # Full jitter so many app instances do not reconnect in lockstep
+            await asyncio.sleep(random.uniform(0, delay))
+            delay = min(delay * 2, self.max_reconnect_delay)
+
+    def _handle(self, message):
+        try:
+            payload = json.loads(message)
+        except ValueError:
+            return
+        data = payload.get('data') if isinstance(payload, dict) else None
+        if not isinstance(data, dict) or not data.get('s', '').endswith('USDT'):
+            # Subscription acknowledgements and anything we did not ask for
+            return
+
+        symbol = data['s'][:-len('USDT')]
+        received = time.monotonic()
+        self.messages += 1
+        self.last_message = received
+        try:
+            if data.get('e') == '24hrMiniTicker':
+                entry = {'price': float(data['c']), 'event_time': data['E'], 'received': received}
+                with self.lock:
+                    self.prices[symbol] = entry
+                price = entry['price']
+            elif data.get('e') == 'kline':
+                k = data['k']
+                entry = {
+                    'timestamp': k['t'], 'close_time': k['T'],
+                    'open': float(k['o']), 'high': float(k['h']), 'low': float(k['l']),
+                    'close': float(k['c']), 'volume': float(k['v']), 'trades': k['n'],
+                    'closed': k['x'], 'received': received,
+                }
+                with self.lock:
+                    self.candles[symbol] = entry
+                    # A kline update also carries the latest trade price
+                    self.prices[symbol] = {'price': entry['close'], 'event_time': data['E'],
+                                           'received': received}
+                price = entry['close']
+            else:
+                return
+        except (KeyError, TypeError, ValueError):
+            return
+
+        for listener in list(self.listeners):
+            try:
+                listener(symbol, price)
+            except Exception:
+                logger.exception("Market feed listener %r failed on %s", listener, symbol)